@@ -73,6 +73,7 @@ def quit():
     """Close everything and exit nicely (ending the experiment)
     """
     # pygame.quit()  # safe even if pygame was never initialised
+    logging.stopBackgroundWriter()  # drains the queue (if there is one)
     logging.flush()
 
     for thisThread in threading.enumerate():
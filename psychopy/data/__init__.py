@@ -17,8 +17,8 @@ if sys.version_info.major == 3 and sys.version_info.minor >= 6:
 
 from .utils import (checkValidFilePath, isValidVariableName, importTrialTypes,
                     sliceFromString, indicesFromString, importConditions,
-                    createFactorialTrialList, bootStraps, functionFromStaircase,
-                    getDateStr)
+                    clearConditionsCache, createFactorialTrialList, bootStraps,
+                    functionFromStaircase, getDateStr)
 
 from .fit import (FitFunction, FitCumNormal, FitLogistic, FitNakaRushton,
                   FitWeibull)
@@ -25,7 +25,6 @@ from psychopy import logging
 from psychopy.tools.filetools import (openOutputFile, genDelimiter,
                                       genFilenameFromDelimiter, pathToString)
 from psychopy.tools.fileerrortools import handleFileCollision
-from psychopy.tools.arraytools import extendArr
 from .utils import _getExcelCellName
 
 try:
@@ -450,10 +449,14 @@ class DataHandler(_ComparisonMixin, dict):
     by users directly)
 
     Numeric data are stored as numpy masked arrays where the mask is set
-    True for missing entries. When any non-numeric data (string, list or
-    array) get inserted using DataHandler.add(val) the array is converted
-    to a standard (not masked) numpy array with dtype='O' and where missing
-    entries have value = "--".
+    True for missing entries. When text gets inserted using
+    DataHandler.add(val) into an array without values yet, the array is
+    converted to a standard (not masked) numpy array of fixed-width strings
+    (dtype 'U', widened as longer strings arrive) where missing entries have
+    value = "--". When other non-numeric data (list, array, None) get
+    inserted, or text and other values are mixed, the array is converted to
+    dtype='O' (with any numbers already stored as text, as before).
+    See :meth:`getMemoryUsage` for the storage used by each data type.
 
     Attributes:
         - ['key']=data arrays containing values for that key
@@ -541,28 +544,101 @@ class DataHandler(_ComparisonMixin, dict):
 
         # check whether data falls within bounds
         posArr = np.asarray(position)
-        shapeArr = np.asarray(self.dataShape)
+        shapeArr = np.asarray(self[thisType].shape)
         if not np.alltrue(posArr < shapeArr):
             # array isn't big enough
-            logging.warning('need a bigger array for: ' + thisType)
-            # not implemented yet!
-            self[thisType] = extendArr(self[thisType], posArr)
+            self._growColumn(thisType, posArr)
         # check for ndarrays with more than one value and for non-numeric data
         if (self.isNumeric[thisType] and
                 ((type(value) == np.ndarray and len(value) > 1) or
                      (type(value) not in [float, int]))):
-            self._convertToObjectArray(thisType)
+            if (isinstance(value, str) and
+                    np.ma.getmaskarray(self[thisType]).all()):
+                # no values yet, so it's a text column (for now)
+                self._convertToStringArray(thisType)
+            else:
+                self._convertToObjectArray(thisType)
+        if self[thisType].dtype.kind == 'U':
+            if not isinstance(value, str):
+                # no longer just text
+                self._convertToObjectArray(thisType)
+            elif len(value) > self[thisType].itemsize // 4:
+                self._widenStringArray(thisType, len(value))
         # insert the value
         self[thisType][position[0], int(position[1])] = value
 
+    def _growColumn(self, thisType, position):
+        """Make this datatype big enough to hold a value at `position`,
+        with the new entries missing (masked or "--"). Dimensions that are
+        too small at least double, so that adding values one beyond the end
+        only copies the array now and then
+        """
+        dat = self[thisType]
+        shape = np.asarray(dat.shape)
+        position = np.asarray(position)
+        newShape = np.where(position < shape, shape,
+                            np.maximum(position + 1, 2 * shape))
+        # data types added from now on get the new shape too
+        self.dataShape = [int(n) for n in
+                          np.maximum(self.dataShape, newShape)]
+        if self.isNumeric[thisType]:
+            newDat = np.ma.zeros(newShape, dat.dtype)
+            newDat.mask = True
+        else:
+            newDat = np.empty(newShape, dat.dtype)
+            newDat.fill('--')
+        newDat[tuple(slice(0, n) for n in dat.shape)] = dat
+        self[thisType] = newDat
+
+    def _convertToStringArray(self, thisType):
+        """Convert this datatype from masked numeric array with no values
+        yet to unmasked array of fixed-width strings (all "--")
+        """
+        dat = self[thisType]
+        self[thisType] = np.full(dat.shape, '--', dtype='U2')
+        self.isNumeric[thisType] = False
+
+    def _widenStringArray(self, thisType, minLength):
+        """Re-allocate a string datatype so that it can hold at least
+        `minLength` characters. The width at least doubles each time so
+        that a column of steadily longer strings is rarely copied
+        """
+        dat = self[thisType]
+        width = max(minLength, 2 * (dat.itemsize // 4))
+        self[thisType] = dat.astype('U%i' % width)
+
     def _convertToObjectArray(self, thisType):
-        """Convert this datatype from masked numeric array to unmasked
-        object array
+        """Convert this datatype from masked numeric array (or string array)
+        to unmasked object array
         """
         dat = self[thisType]
+        if dat.dtype.kind == 'U':
+            # already unmasked with "--" for missing vals
+            self[thisType] = dat.astype('O')
+            self.isNumeric[thisType] = False
+            return
         # create an array of Object type
         self[thisType] = np.array(dat.data, dtype='O')
         # masked vals should be "--", others keep data
         # we have to repeat forcing to 'O' or text gets truncated to 4chars
         self[thisType] = np.where(dat.mask, '--', dat).astype('O')
         self.isNumeric[thisType] = False
+
+    def getMemoryUsage(self):
+        """Returns a dict of the storage used by each data type
+
+        Each entry is a dict with the `dtype` of the array (e.g. 'float32'
+        for numeric data, '<U8' for text or 'object' for mixed values) and
+        `nbytes`, the memory used (including the Python objects referenced
+        by an object array).
+        """
+        usage = {}
+        for thisType in self.dataTypes:
+            dat = self[thisType]
+            nbytes = dat.nbytes
+            if isinstance(dat, np.ma.MaskedArray):
+                nbytes += np.ma.getmaskarray(dat).nbytes
+            if dat.dtype.kind == 'O':
+                nbytes += sum(sys.getsizeof(val) for val in dat.flat)
+            usage[thisType] = {'dtype': str(dat.dtype), 'nbytes': nbytes}
+        return usage
@@ -6,6 +6,7 @@ from __future__ import absolute_import, print_function
 # from future import standard_library
 # standard_library.install_aliases()
 from builtins import str
+import os
 import sys
 import copy
 import pickle
@@ -14,8 +15,10 @@ import atexit
 from psychopy import logging
 from psychopy.tools.filetools import (openOutputFile, genDelimiter,
                                       genFilenameFromDelimiter)
+from psychopy.tools.fileerrortools import handleFileCollision
 from .utils import checkValidFilePath
 from .base import _ComparisonMixin
+from .stream import EntryStream
 
 
 class ExperimentHandler(_ComparisonMixin):
@@ -29,7 +32,8 @@ class ExperimentHandler(_ComparisonMixin):
         exp = data.ExperimentHandler(name="Face Preference",version='0.1.0')
 
     """
-    
+    _stream = None  # an EntryStream, if streamEntries (also for old pickles)
+
     def __init__(self,
                  name='',
                  version='',
@@ -40,7 +44,8 @@ class ExperimentHandler(_ComparisonMixin):
                  saveWideText=True,
                  dataFileName='',
                  autoLog=True,
-                 appendFiles=False):
+                 appendFiles=False,
+                 streamEntries=False):
         """
         :parameters:
 
@@ -75,6 +80,14 @@ class ExperimentHandler(_ComparisonMixin):
             saveWideText : True (default) or False
 
             autoLog : True (default) or False
+
+            streamEntries : True or False (default)
+                If True (and a dataFileName is given) each entry is written
+                to `dataFileName + '_entries.jsonl'` as soon as it is
+                finished (see :mod:`psychopy.data.stream`) rather than being
+                kept in memory. The data survive a crash and memory use
+                doesn't grow with the number of trials. The file is removed
+                once the final data files have been saved from it.
         """
         self.loops = []
         self.loopsUnfinished = []
@@ -100,9 +113,16 @@ class ExperimentHandler(_ComparisonMixin):
             logging.warning('ExperimentHandler created with no dataFileName'
                             ' parameter. No data will be saved in the event '
                             'of a crash')
+            if streamEntries:
+                logging.warning('ExperimentHandler needs a dataFileName to '
+                                'stream entries; keeping them in memory')
         else:
             # fail now if we fail at all!
             checkValidFilePath(dataFileName, makeValid=True)
+            if streamEntries:
+                streamFileName = handleFileCollision(
+                    dataFileName + '_entries.jsonl', 'rename')
+                self._stream = EntryStream(streamFileName)
         atexit.register(self.close)
 
     def __del__(self):
@@ -233,7 +253,10 @@ class ExperimentHandler(_ComparisonMixin):
         # add the extraInfo dict to the data
         if type(self.extraInfo) == dict:
             this.update(self.extraInfo)
-        self.entries.append(this)
+        if self._stream is not None:
+            self._stream.append(this)
+        else:
+            self.entries.append(this)
         self.thisEntry = {}
 
     def getAllEntries(self):
@@ -241,13 +264,26 @@ class ExperimentHandler(_ComparisonMixin):
         if that exists. This allows entries to be saved even if nextEntry() is
         not yet called.
 
+        If entries are being streamed to disk they are read back from the
+        file.
+
         :return: copy (not pointer) to entries
         """
+        return list(self._iterAllEntries())
+
+    def _iterAllEntries(self):
+        """Iterate over all the entries (as getAllEntries) without making a
+        copy of the whole list
+        """
+        if self._stream is not None:
+            for entry in self._stream:
+                yield entry
+        else:
+            for entry in self.entries:
+                yield entry
         # check for orphan final data (not committed as a complete entry)
-        entries = copy.copy(self.entries)
         if self.thisEntry:  # thisEntry is not empty
-            entries.append(self.thisEntry)
-        return entries
+            yield self.thisEntry
 
     def saveAsWideText(self,
                        fileName,
@@ -335,7 +371,7 @@ class ExperimentHandler(_ComparisonMixin):
             f.write('\n')
 
         # write the data for each entry
-        for entry in self.getAllEntries():
+        for entry in self._iterAllEntries():
             for name in names:
                 if name in entry:
                     ename = str(entry[name])
@@ -380,6 +416,8 @@ class ExperimentHandler(_ComparisonMixin):
 
         origEntries = self.entries
         self.entries = self.getAllEntries()
+        # the stream holds an open file, and the entries are in the pickle
+        origStream = self.__dict__.pop('_stream', None)
 
         # otherwise use default location
         if not fileName.endswith('.psydat'):
@@ -393,18 +431,29 @@ class ExperimentHandler(_ComparisonMixin):
             logging.info('saved data to %s' % f.name)
 
         self.entries = origEntries  # revert list of completed entries post-save
+        if origStream is not None:
+            self._stream = origStream
         self.savePickle = savePickle
         self.saveWideText = saveWideText
         
     def close(self):
+        saved = False
         if self.dataFileName not in ['', None]:
             if self.autoLog:
                 msg = 'Saving data for %s ExperimentHandler' % self.name
                 logging.debug(msg)
             if self.savePickle:
                 self.saveAsPickle(self.dataFileName)
+                saved = True
             if self.saveWideText:
                 self.saveAsWideText(self.dataFileName + '.csv')
+                saved = True
+        if self._stream is not None:
+            self._stream.close()
+            if saved:
+                # the data are safely in the final files now
+                os.remove(self._stream.fileName)
+                del self._stream
         self.abort()
         self.autoLog = False
 
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Part of the PsychoPy library
+# Copyright (C) 2002-2018 Jonathan Peirce (C) 2019-2021 Open Science Tools Ltd.
+# Distributed under the terms of the GNU General Public License (GPL).
+
+"""Append-only storage of experiment entries on disk, so that the
+:class:`~psychopy.data.ExperimentHandler` doesn't need to keep every entry
+in memory and nothing is lost if the experiment crashes.
+
+The file is written as JSON lines. A line holding an object with a
+`columns` key adds new column names (in order of first appearance, so a
+column that only appears half way through a session simply gets added at
+that point). Every other line is one entry, mapping column index to value::
+
+    {"columns": ["trials.thisN", "resp.keys", "resp.rt"]}
+    {"0": 0, "1": "left", "2": 0.5012}
+    {"0": 1, "1": "right", "2": 0.6211}
+    {"columns": ["bonus"]}
+    {"0": 2, "1": "left", "2": 0.4478, "3": true}
+
+Tuples, dicts and NumPy values are stored as objects tagged with their type (e.g.
+``{"type": "numpy", "dtype": "<f4", "value": 0.5}``) so that they are read
+back as the same type, and give the same text in the data files as entries
+kept in memory.
+
+Each line is flushed as soon as it's written so the file is always complete
+up to the last finished entry.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from builtins import object
+from past.builtins import basestring
+import io
+import os
+import json
+import numbers
+
+import numpy as np
+
+from psychopy import logging
+from psychopy.tools.filetools import pathToString
+
+
+def _toJsonValue(value):
+    """Converts a value to one JSON can store, such that
+    :func:`_fromJsonValue` gives back a value of the same type (and so the
+    same text in the data files). Lists, tuples and dicts are stored item by
+    item, tuples, dicts and NumPy scalars and arrays as objects tagged with
+    their type.
+    Other values are stored as their string representation (which is what
+    ends up in the text data files)
+    """
+    if value is None or isinstance(value, (bool, basestring)):
+        return value
+    if isinstance(value, (np.bool_, np.number)) and value.dtype.kind in 'biuf':
+        return {'type': 'numpy', 'dtype': value.dtype.str,
+                'value': value.item()}
+    if isinstance(value, np.ndarray) and value.dtype.kind in 'biuf':
+        return {'type': 'ndarray', 'dtype': value.dtype.str,
+                'value': value.tolist()}
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        return float(value)
+    if type(value) is list:
+        return [_toJsonValue(item) for item in value]
+    if type(value) is tuple:
+        return {'type': 'tuple', 'value': [_toJsonValue(item)
+                                           for item in value]}
+    if type(value) is dict:
+        return {'type': 'dict', 'value': [[_toJsonValue(key),
+                                           _toJsonValue(item)]
+                                          for key, item in value.items()]}
+    return str(value)
+
+
+def _fromJsonValue(value):
+    """The value that was converted by :func:`_toJsonValue`
+    """
+    if isinstance(value, list):
+        return [_fromJsonValue(item) for item in value]
+    if isinstance(value, dict):
+        if value['type'] == 'tuple':
+            return tuple(_fromJsonValue(item) for item in value['value'])
+        if value['type'] == 'dict':
+            return dict((_fromJsonValue(key), _fromJsonValue(item))
+                        for key, item in value['value'])
+        dtype = np.dtype(value['dtype'])
+        if value['type'] == 'numpy':
+            return dtype.type(value['value'])
+        return np.array(value['value'], dtype=dtype)
+    return value
+
+
+class EntryStream(object):
+    """Writes entries (dicts of name: value) to an append-only file
+
+    :usage:
+
+        stream = EntryStream('participant1_entries.jsonl')
+        stream.append({'resp.keys': 'left', 'resp.rt': 0.5})
+        stream.close()
+        for entry in readEntries('participant1_entries.jsonl'):
+            print(entry)
+    """
+
+    def __init__(self, fileName, fsync=False):
+        """
+        :parameters:
+
+            fileName : string
+                the file to write (any existing file will be overwritten)
+
+            fsync : True or False (default)
+                if True the file is also synced to the disk after each
+                entry, which is safer against power loss but slower
+        """
+        self.fileName = pathToString(fileName)
+        self.fsync = fsync
+        self.columns = []
+        self._colIndex = {}
+        self.nEntries = 0
+        self._f = io.open(self.fileName, 'w', encoding='utf-8')
+
+    def __del__(self):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._f is None or self._f.closed
+
+    def append(self, entry):
+        """Write one entry (a dict of column name: value) to the file
+        """
+        lines = []
+        newColumns = [name for name in entry if name not in self._colIndex]
+        if newColumns:
+            for name in newColumns:
+                self._colIndex[name] = len(self.columns)
+                self.columns.append(name)
+            lines.append(json.dumps({'columns': newColumns}))
+        row = {}
+        for name, value in entry.items():
+            row[str(self._colIndex[name])] = _toJsonValue(value)
+        lines.append(json.dumps(row))
+        self._f.write(u'\n'.join(lines) + u'\n')
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+        self.nEntries += 1
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+
+    def __iter__(self):
+        if not self.closed:
+            self._f.flush()
+        return readEntries(self.fileName)
+
+
+def readEntries(fileName):
+    """Iterate over the entries in a file written by :class:`EntryStream`,
+    returning each as a dict of column name: value.
+
+    Use this to recover the data of an experiment that didn't finish, e.g.::
+
+        import pandas as pd
+        df = pd.DataFrame(list(readEntries('participant1_entries.jsonl')))
+
+    A final line that was only partly written (e.g. because the computer
+    crashed) is skipped with a warning.
+    """
+    columns = []
+    with io.open(pathToString(fileName), 'r', encoding='utf-8') as f:
+        for lineN, line in enumerate(f):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logging.warning("Skipping incomplete entry on line %i of %s"
+                                % (lineN + 1, fileName))
+                continue
+            if 'columns' in record:
+                columns.extend(record['columns'])
+                continue
+            yield dict((columns[int(ii)], _fromJsonValue(value))
+                       for ii, value in record.items())
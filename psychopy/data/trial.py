@@ -24,6 +24,23 @@ from .utils import importConditions
 from .base import _BaseTrialHandler, DataHandler
 
 
+def _occurrenceCounts(indices):
+    """For each element of `indices`, how many times that value has already
+    appeared earlier in the array (e.g. [2, 0, 2, 2, 0] -> [0, 0, 1, 2, 1])
+    """
+    indices = np.asarray(indices)
+    order = np.argsort(indices, kind='mergesort')  # stable
+    sortedIndices = indices[order]
+    isGroupStart = np.ones(len(indices), dtype=bool)
+    isGroupStart[1:] = sortedIndices[1:] != sortedIndices[:-1]
+    groupStarts = np.flatnonzero(isGroupStart)
+    groupSizes = np.diff(np.append(groupStarts, len(indices)))
+    ranks = np.arange(len(indices)) - np.repeat(groupStarts, groupSizes)
+    counts = np.empty(len(indices), dtype=int)
+    counts[order] = ranks
+    return counts
+
+
 class TrialType(dict):
     """This is just like a dict, except that you can access keys with obj.key
     """
@@ -654,83 +671,101 @@ class TrialHandler(_BaseTrialHandler):
         if self.extraInfo is not None:
             for key in self.extraInfo:
                 header.insert(0, key)
-        df = pd.DataFrame(columns=header)
-
-        # loop through each trial, gathering the actual values:
-        dataOut = []
-        trialCount = 0
-        # total number of trials = number of trialtypes * number of
-        # repetitions:
-
-        repsPerType = {}
-        for rep in range(self.nReps):
-            for trialN in range(len(self.trialList)):
-                # find out what trial type was on this trial
-                trialTypeIndex = self.sequenceIndices[trialN, rep]
-                # determine which repeat it is for this trial
-                if trialTypeIndex not in repsPerType:
-                    repsPerType[trialTypeIndex] = 0
-                else:
-                    repsPerType[trialTypeIndex] += 1
-                # what repeat are we on for this trial type?
-                trep = repsPerType[trialTypeIndex]
-
-                # create a dictionary representing each trial:
-                nextEntry = {}
-
-                # add a trial number so the original order of the data can
-                # always be recovered if sorted during analysis:
-                trialCount += 1
-
-                # now collect the value from each trial of vars in header:
-                for prmName in header:
-                    # the header includes both trial and data variables, so
-                    # need to check before accessing:
-                    tti = trialTypeIndex
-                    if self.trialList[tti] and prmName in self.trialList[tti]:
-                        nextEntry[prmName] = self.trialList[tti][prmName]
-                    elif prmName in self.data:
-                        nextEntry[prmName] = self.data[prmName][tti][trep]
-                    elif self.extraInfo != None and prmName in self.extraInfo:
-                        nextEntry[prmName] = self.extraInfo[prmName]
-                    else:
-                        # allow a null value if this parameter wasn't
-                        # explicitly stored on this trial:
-                        if prmName == "TrialNumber":
-                            nextEntry[prmName] = trialCount
-                        else:
-                            nextEntry[prmName] = ''
-
-                # store this trial's data
-                dataOut.append(nextEntry)
-                df = df.append(nextEntry, ignore_index=True)
+        # the trial type and the repeat of that type for every trial, in
+        # chronological order (the loop runs through all trialList entries
+        # for each rep, so sequenceIndices is read column by column)
+        trialTypes = np.asarray(self.sequenceIndices).T.ravel().astype(int)
+        typeReps = _occurrenceCounts(trialTypes)
+
+        # build each column as a whole (values and strings for the file)
+        columns = {}
+        strColumns = []
+        for prmName in header:
+            values, strings = self._getWideColumn(prmName, trialTypes,
+                                                  typeReps)
+            columns[prmName] = values
+            strColumns.append(strings)
+        # numeric columns become numeric dtypes rather than "object"
+        df = pd.DataFrame(columns, columns=header).infer_objects()
 
         if not matrixOnly:
             # write the header row:
-            nextLine = ''
-            for prmName in header:
-                nextLine = nextLine + prmName + delim
-            # remove the final orphaned tab character
-            f.write(nextLine[:-1] + '\n')
+            f.write(delim.join(header) + '\n')
 
-        # write the data matrix:
-        for trial in dataOut:
-            nextLine = ''
-            for prmName in header:
-                nextLine = nextLine + str(trial[prmName]) + delim
-            # remove the final orphaned tab character
-            nextLine = nextLine[:-1]
-            f.write(nextLine + '\n')
+        # write the data matrix, a chunk of rows at a time
+        chunkSize = 10000
+        for chunkStart in range(0, len(trialTypes), chunkSize):
+            chunk = [col[chunkStart:chunkStart + chunkSize]
+                     for col in strColumns]
+            f.write(''.join([delim.join(row) + '\n'
+                             for row in zip(*chunk)]))
 
         if f != sys.stdout:
             f.close()
             logging.info('saved wide-format data to %s' % f.name)
 
-        # Converts numbers to numeric, such as float64, boolean to bool.
-        # Otherwise they all are "object" type, i.e. strings
-        # df = df.convert_objects()
         return df
 
+    def _getWideColumn(self, prmName, trialTypes, typeReps):
+        """Gets the values of one wide-text column for every trial
+
+        Returns an object array of the values and a list of their string
+        versions for the text file. Values come from the trialList if the
+        trial type defines `prmName`, otherwise from the data, the
+        extraInfo, or are blank.
+        """
+        nTrials = len(trialTypes)
+        # which trial types define this parameter?
+        nTypes = max(len(self.trialList), 1)
+        typeHasPrm = np.zeros(nTypes, dtype=bool)
+        typeVals = np.empty(nTypes, dtype=object)
+        typeStrs = np.empty(nTypes, dtype=object)
+        for tti, thisType in enumerate(self.trialList):
+            if thisType and prmName in thisType:
+                typeHasPrm[tti] = True
+                typeVals[tti] = thisType[prmName]
+                typeStrs[tti] = str(thisType[prmName])
+        fromParams = typeHasPrm[trialTypes]
+
+        # the fallback for trials whose type doesn't define the parameter
+        if prmName in self.data:
+            dataVals = self.data[prmName][trialTypes, typeReps]
+            mask = np.ma.getmaskarray(dataVals)
+            rawVals = np.ma.getdata(dataVals)
+            values = rawVals.astype(object)
+            if rawVals.dtype.kind in 'biufU':
+                strings = rawVals.astype(str).astype(object)
+            else:
+                strings = np.array([str(v) for v in rawVals], dtype=object)
+            # (assigning the masked constant directly would unpack it)
+            maskedConst = np.empty(1, dtype=object)
+            maskedConst[0] = np.ma.masked
+            values[mask] = maskedConst
+            strings[mask] = str(np.ma.masked)
+        elif prmName == "TrialNumber" and not (
+                self.extraInfo != None and prmName in self.extraInfo):
+            # a trial number so the original order of the data can
+            # always be recovered if sorted during analysis:
+            trialNumbers = np.arange(1, nTrials + 1)
+            values = trialNumbers.astype(object)
+            strings = trialNumbers.astype(str).astype(object)
+        else:
+            if self.extraInfo != None and prmName in self.extraInfo:
+                fill = self.extraInfo[prmName]
+            else:
+                # allow a null value if this parameter wasn't
+                # explicitly stored on this trial:
+                fill = ''
+            values = np.empty(nTrials, dtype=object)
+            values.fill(fill)
+            strings = np.empty(nTrials, dtype=object)
+            strings.fill(str(fill))
+
+        if fromParams.any():
+            values[fromParams] = typeVals[trialTypes[fromParams]]
+            strings[fromParams] = typeStrs[trialTypes[fromParams]]
+        return values, list(strings)
+
     def saveAsJson(self,
                    fileName=None,
                    encoding='utf-8',
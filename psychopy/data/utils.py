@@ -15,9 +15,11 @@ from past.builtins import basestring
 import os
 import re
 import ast
+import copy
 import pickle
 import time
 import codecs
+import hashlib
 import numpy as np
 import pandas as pd
 
@@ -44,6 +46,12 @@ haveXlrd = False
 
 _nonalphanumeric_re = re.compile(r'\W')  # will match all bad var name chars
 
+# conditions already imported, keyed by file type and content hash, so that
+# loops using the same file don't parse it again (see importConditions)
+_conditionsCache = OrderedDict()
+_conditionsCacheSize = 32  # files, not conditions
+_conditionsCacheVersion = 1  # increment if the parsed format changes
+
 
 def checkValidFilePath(filepath, makeValid=True):
     """Checks whether file path location (e.g. is a valid folder)
@@ -201,7 +209,8 @@ def listFromString(val, excludeEmpties=False):
     return asList
 
 
-def importConditions(fileName, returnFieldNames=False, selection=""):
+def importConditions(fileName, returnFieldNames=False, selection="",
+                     diskCache=False):
     """Imports a list of conditions from an .xlsx, .csv, or .pkl file
 
     The output is suitable as an input to :class:`TrialHandler`
@@ -236,6 +245,14 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
         - slice(-10, 2, None)  # the same as above
         - random(5) * 8  # five random vals 0-7
 
+    Once a file has been imported, its conditions are kept in memory
+    (identified by a hash of the file contents) so importing the same file
+    again, e.g. for another loop, doesn't need to parse it again. If
+    `diskCache=True` the parsed conditions are also saved next to the file
+    (as `fileName + '.psycache'`) for use in later sessions. Either way the
+    cache is ignored as soon as the file changes. See also
+    :func:`clearConditionsCache`.
+
     """
 
     def _attemptImport(fileName, sep=',', dec='.'):
@@ -339,7 +356,12 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
             trialList.append(thisTrial)
         return trialList, fieldNames
 
-    if (fileName.endswith(('.csv', '.tsv'))
+    cacheKey = _conditionsCacheKey(fileName)
+    cached = _getCachedConditions(fileName, cacheKey, diskCache)
+    if cached is not None:
+        allConds, fieldNames = cached
+        _assertValidVarNames(fieldNames, fileName)
+    elif (fileName.endswith(('.csv', '.tsv'))
             or (fileName.endswith(('.xlsx', '.xls', '.xlsm')) and haveXlrd)):
         if fileName.endswith(('.csv', '.tsv', '.dlm')):  # delimited text file
             for sep, dec in [ (',', '.'), (';', ','),  # most common in US, EU
@@ -452,6 +474,9 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
     else:
         raise IOError('Your conditions file should be an '
                       'xlsx, csv, dlm, tsv or pkl file')
+    if cached is None:
+        allConds = trialList
+        _cacheConditions(fileName, cacheKey, allConds, fieldNames, diskCache)
 
     # if we have a selection then try to parse it
     if isinstance(selection, basestring) and len(selection) > 0:
@@ -466,14 +491,18 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
 
     # the selection might now be a slice or a series of indices
     if isinstance(selection, slice):
-        trialList = trialList[selection]
+        trialList = allConds[selection]
     elif len(selection) > 0:
-        allConds = trialList
         trialList = []
         print(selection)
         print(len(allConds))
         for ii in selection:
             trialList.append(allConds[int(ii)])
+    else:
+        trialList = allConds
+    # the cache keeps the originals, so the caller gets its own copies
+    trialList = [_copyCondition(thisCond) for thisCond in trialList]
+    fieldNames = list(fieldNames)
 
     logging.exp('Imported %s as conditions, %d conditions, %d params' %
                 (fileName, len(trialList), len(fieldNames)))
@@ -483,6 +512,82 @@ def importConditions(fileName, returnFieldNames=False, selection=""):
         return trialList
 
 
+def _conditionsCacheKey(fileName):
+    """The key for a conditions file in the cache: its type (which
+    determines how it's parsed) and a hash of its contents
+    """
+    contentHash = hashlib.sha1()
+    with open(fileName, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            contentHash.update(chunk)
+    return (os.path.splitext(fileName)[1].lower(), contentHash.hexdigest())
+
+
+def _getCachedConditions(fileName, cacheKey, diskCache=False):
+    """Returns (trialList, fieldNames) for this file from the memory cache
+    or the disk cache (if `diskCache`), or None if it hasn't been cached
+    """
+    if cacheKey in _conditionsCache:
+        # move it to the end, as the most recently used
+        _conditionsCache[cacheKey] = _conditionsCache.pop(cacheKey)
+        return _conditionsCache[cacheKey]
+    if not diskCache or not os.path.isfile(fileName + '.psycache'):
+        return None
+    try:
+        with open(fileName + '.psycache', 'rb') as f:
+            stored = pickle.load(f)
+        if (stored['version'] != _conditionsCacheVersion or
+                tuple(stored['key']) != cacheKey):
+            return None  # the file has changed since
+        cached = (stored['trialList'], stored['fieldNames'])
+    except Exception:
+        logging.warning(u"Ignoring unreadable conditions cache {}"
+                        .format(fileName + '.psycache'))
+        return None
+    logging.debug(u"Read conditions from cache: {}".format(fileName))
+    _storeInMemoryCache(cacheKey, cached)
+    return cached
+
+
+def _cacheConditions(fileName, cacheKey, trialList, fieldNames,
+                     diskCache=False):
+    """Keeps the parsed (and validated) conditions from this file
+    """
+    _storeInMemoryCache(cacheKey, (trialList, fieldNames))
+    if not diskCache:
+        return
+    stored = {'version': _conditionsCacheVersion, 'key': cacheKey,
+              'trialList': trialList, 'fieldNames': fieldNames}
+    try:
+        with open(fileName + '.psycache', 'wb') as f:
+            pickle.dump(stored, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except (IOError, OSError, pickle.PicklingError) as err:
+        logging.warning(u"Could not write conditions cache for {}: {}"
+                        .format(fileName, err))
+
+
+def _storeInMemoryCache(cacheKey, cached):
+    _conditionsCache[cacheKey] = cached
+    while len(_conditionsCache) > _conditionsCacheSize:
+        _conditionsCache.popitem(last=False)  # least recently used
+
+
+def _copyCondition(condition):
+    """A copy of one condition (dict) that can be modified without changing
+    the cache. Only mutable values (e.g. lists) need copying themselves
+    """
+    return type(condition)(
+        (key, copy.deepcopy(val) if isinstance(val, (list, dict)) else val)
+        for key, val in condition.items())
+
+
+def clearConditionsCache():
+    """Forget the conditions kept in memory by :func:`importConditions`
+    (files saved with `diskCache=True` are not removed)
+    """
+    _conditionsCache.clear()
+
+
 def createFactorialTrialList(factors):
     """Create a trialList by entering a list of factors with names (keys)
     and levels (values) it will return a trialList in which all factors
@@ -12,8 +12,10 @@ import time
 import subprocess
 import json
 import signal
+from operator import itemgetter
 from weakref import proxy
 
+import numpy as np
 import psutil
 
 try:
@@ -82,7 +84,10 @@ class DeviceRPC(object):
         elif 'as_type' in kwargs:
             asType = kwargs['as_type']
 
-        conversionMethod = self._returnarg
+        if asType == 'numpy':
+            conversionMethod = None
+        else:
+            conversionMethod = self._returnarg
         if asType == 'dict':
             conversionMethod = ioHubConnection.eventListToDict
         elif asType == 'object':
@@ -91,6 +96,8 @@ class DeviceRPC(object):
             conversionMethod = ioHubConnection.eventListToNamedTuple
 
         if self.device_class != 'Experiment':
+            if conversionMethod is None:
+                return ioHubConnection.eventListsToNumPy(r)
             return [conversionMethod(el) for el in r]
 
         EVT_TYPE_IX = DeviceEvent.EVENT_TYPE_ID_INDEX
@@ -103,6 +110,8 @@ class DeviceRPC(object):
                 ltext = l[self._log_text_index]
                 llevel = l[self._log_level_index]
                 psycho_logging.log(ltext, llevel, ltime)
+        if conversionMethod is None:
+            return ioHubConnection.eventListsToNumPy(r)
         return [conversionMethod(el) for el in r]
 
 
@@ -272,6 +281,8 @@ class ioHubConnection(object):
 
         # udp port setup
         self.udp_client = None
+        # shared memory event buffer, if enabled by the iohub config
+        self._shared_events = None
 
         # the dynamically generated object that contains an attribute for
         # each device registered for monitoring with the ioHub server so
@@ -353,6 +364,15 @@ class ioHubConnection(object):
             * 'dict': Each event converted to a dict object.
             * 'object': Each event is converted to a DeviceEvent subclass
                         based on the event's type.
+            * 'numpy': Instead of a list, a dict is returned with one numpy
+                       structured array for each event type id, using the
+                       NUMPY_DTYPE of the event class. Use this for
+                       vectorized analysis of many events (e.g. eye
+                       tracker samples), without creating an object for
+                       each event.
+
+        Device level getEvents() methods support the same types, using
+        their asType kwarg.
 
         Args:
             device_label (str): Name of device to retrieve events for.
@@ -365,8 +385,17 @@ class ioHubConnection(object):
             tuple: List of event objects; object type controlled by 'as_type'.
         """
         r = None
+        if as_type == 'numpy':
+            if device_label is not None:
+                return self.devices.getDevice(device_label).getEvents(
+                    asType='numpy')
+            if self._shared_events is not None:
+                return self._getSharedEventArrays()
         if device_label is None:
-            events = self._sendToHubServer(('GET_EVENTS',))[1]
+            if self._shared_events is not None:
+                events = self._getSharedEvents()
+            else:
+                events = self._sendToHubServer(('GET_EVENTS',))[1]
             if events is None:
                 r = self.allEvents
             else:
@@ -375,6 +404,11 @@ class ioHubConnection(object):
             self.allEvents = []
         else:
             r = self.devices.getDevice(device_label).getEvents()
+        return self._eventsAsType(r, as_type)
+
+    def _eventsAsType(self, r, as_type):
+        if as_type == 'numpy':
+            return self.eventListsToNumPy(r)
 
         if r:
             if as_type == 'list':
@@ -394,6 +428,91 @@ class ioHubConnection(object):
 
         return []
 
+    def waitForEvents(self, device_types=None, timeout=None,
+                      as_type='namedtuple'):
+        """Block until the ioHub Server has an event from one of the
+        device_types, or until timeout seconds have passed, then return the
+        events that have been collected, like getEvents() with no
+        device_label.
+
+        The ioHub Server holds the request and replies as soon as a matching
+        event has been processed, so the experiment process does not need to
+        poll getEvents() in a loop. With event_driven: True in the ioHub
+        config the wake-up latency is usually well under a msec.
+
+        Example, waiting up to 2 seconds for a response::
+
+            kb_events = io.waitForEvents(['keyboard'], timeout=2.0)
+
+        Args:
+            device_types (list): Device types (e.g. 'keyboard', 'mouse' or
+                DeviceConstants ids) to wait for an event from. None (the
+                default) returns once an event from any device is available.
+
+            timeout (float): Maximum sec.msec to wait. None waits until an
+                event arrives.
+
+            as_type (str): Returned event object type, see getEvents().
+
+        Returns:
+            list: All events received since the last getEvents() call, from
+            any device, which is empty if the timeout passed without an
+            event; object type controlled by 'as_type'.
+        """
+        if device_types is not None:
+            if isinstance(device_types, (basestring, int)):
+                device_types = [device_types, ]
+            device_types = [DeviceConstants.getID(d.upper())
+                            if isinstance(d, basestring) else d
+                            for d in device_types]
+
+        if self._shared_events is not None:
+            events = self._shared_events.read()
+            if events:
+                self.allEvents.extend(events)
+        if self._hasEventsFrom(self.allEvents, device_types):
+            return self.getEvents(as_type=as_type)
+
+        # the server holds the request for up to timeout sec., so the socket
+        # must not time out before the reply arrives
+        sock = self.udp_client.sock
+        sock_timeout = sock.gettimeout()
+        if sock_timeout is not None:
+            if timeout is None:
+                sock.settimeout(None)
+            else:
+                sock.settimeout(max(sock_timeout, timeout + 1.0))
+        try:
+            r = self._sendToHubServer(('WAIT_FOR_EVENTS', device_types,
+                                       timeout))
+        finally:
+            if sock_timeout is not None:
+                sock.settimeout(sock_timeout)
+        if r is None:
+            raise ioHubError('No WAIT_FOR_EVENTS reply from the ioHub Server')
+        if r[2]:
+            self.allEvents.extend(r[2])
+        if self._shared_events is not None:
+            return self.getEvents(as_type=as_type)
+        events = sorted(self.allEvents,
+                        key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
+        self.allEvents = []
+        return self._eventsAsType(events, as_type)
+
+    @staticmethod
+    def _hasEventsFrom(events, device_types):
+        """True if any of the events (in list format) are from one of the
+        device_types (DeviceConstants ids, or None for any device)."""
+        if device_types is None:
+            return len(events) > 0
+        for e in events:
+            event_class = EventConstants.getClass(
+                e[DeviceEvent.EVENT_TYPE_ID_INDEX])
+            parent = getattr(event_class, 'PARENT_DEVICE', None)
+            if getattr(parent, 'DEVICE_TYPE_ID', None) in device_types:
+                return True
+        return False
+
     def clearEvents(self, device_label='all'):
         """Clears unread events from the ioHub Server's Event Buffer(s)
         so that unneeded events are not discarded.
@@ -420,6 +539,9 @@ class ioHubConnection(object):
         if device_label.lower() == 'all':
             self.allEvents = []
             self._sendToHubServer(('RPC', 'clearEventBuffer', [True, ]))
+            # after the server has processed (and shared) pending events
+            if self._shared_events is not None:
+                self._shared_events.clear()
             try:
                 self.getDevice('keyboard')._clearLocalEvents()
             except:
@@ -427,6 +549,9 @@ class ioHubConnection(object):
         elif device_label in [None, '', False]:
             self.allEvents = []
             self._sendToHubServer(('RPC', 'clearEventBuffer', [False, ]))
+            # after the server has processed (and shared) pending events
+            if self._shared_events is not None:
+                self._shared_events.clear()
             try:
                 self.getDevice('keyboard')._clearLocalEvents()
             except:
@@ -797,6 +922,68 @@ class ioHubConnection(object):
         r = self._sendToHubServer(('RPC', 'flushIODataStoreFile'))
         return r
 
+    def getDataStoreWriteStats(self):
+        """Get information about how the ioDataStore is keeping up with
+        saving events. Events are held in a write buffer and saved in chunks;
+        the write_buffer_size and write_interval data_store settings control
+        how often the buffer is written.
+
+        Args:
+            None
+
+        Returns:
+            dict: with keys 'pending_events' (events currently waiting to be
+            saved), 'max_pending_events', 'write_count', 'events_written',
+            'last_write_duration', 'mean_write_duration' (of the last 100
+            writes) and 'max_write_duration' (sec.msec). None if the
+            ioDataStore is not enabled.
+        """
+        r = self._sendToHubServer(('RPC', 'getIODataStoreWriteStats'))
+        return r[2]
+
+    def getEventLatencyHistograms(self):
+        """Get histograms, by device class name, of the time between an
+        event occurring on a device (its time attribute) and the ioHub Server
+        forwarding it. With event_driven: True in the ioHub config this is
+        usually well under a msec; when the server processes events at a
+        fixed interval it can be up to that interval.
+
+        The latency is only recorded when the ioHub Server is started with
+        metrics: True in the ioHub config; these are the
+        'device.<class>.latency' histograms of getMetrics().
+
+        Args:
+            None
+
+        Returns:
+            dict: device class name: histogram dict as returned by
+            getMetrics(), or None if metrics are not enabled.
+        """
+        r = self._sendToHubServer(('RPC', 'getEventLatencyHistograms'))
+        return r[2]
+
+    def getMetrics(self, reset=False):
+        """Get the counters and timing histograms kept by the ioHub Server
+        when it is started with metrics: True in the ioHub config. Timing
+        histograms are named by what was timed, e.g.
+        'device.Keyboard.process_events', 'filter.<class>.process',
+        'datastore.write' or 'request.GET_EVENTS'. If the ioDataStore is
+        enabled, the metrics are also saved to the hdf5 file when the session
+        ends (see ExperimentDataAccessUtility.getSessionMetrics).
+
+        Args:
+            reset (bool): If True, counters and histograms are cleared after
+                they are returned.
+
+        Returns:
+            dict: with keys 'counters' (name: count) and 'histograms' (name:
+            dict of 'count', 'total', 'min', 'max' and 'mean', and 'p50',
+            'p90', 'p99' and 'p99.9' percentiles, all in sec.msec), or None
+            if metrics are not enabled.
+        """
+        r = self._sendToHubServer(('RPC', 'getMetrics', (reset,)))
+        return r[2]
+
     def startCustomTasklet(self, task_name, task_class_path, **class_kwargs):
         """
         Instruct the iohub server to start running a custom tasklet given
@@ -965,6 +1152,9 @@ class ioHubConnection(object):
         self.udp_client = UDPClientConnection(remote_port=server_udp_port)
         # <<<<< Done Creating open UDP port to ioHub Server
 
+        if self._iohub_server_config.get('shared_memory_event_buffer'):
+            self._openSharedEventBuffer()
+
         # <<<<< Done starting iohub subprocess
 
         ioHubConnection.ACTIVE_CONNECTION = proxy(self)
@@ -1075,6 +1265,51 @@ class ioHubConnection(object):
             printExceptionDetailsToStdErr()
         return None
 
+    def _openSharedEventBuffer(self):
+        """Open the shared memory event buffer created by the iohub server,
+        if it has one. Otherwise getEvents() keeps using UDP."""
+        from ..net import SharedEventBuffer
+        name = self._sendToHubServer(('RPC', 'getSharedEventBufferName'))[2]
+        if name is None or not SharedEventBuffer.isSupported():
+            return
+        try:
+            self._shared_events = SharedEventBuffer(name)
+        except Exception: # pylint: disable=broad-except
+            printExceptionDetailsToStdErr()
+
+    def _getSharedEvents(self):
+        """Read new events from the shared memory event buffer. Events that
+        the server could not put in the buffer are requested over UDP."""
+        shared = self._shared_events
+        events = shared.read()
+        if shared.hasMissedEvents():
+            missed = self._sendToHubServer(('GET_EVENTS',))[1]
+            if missed:
+                events.extend(missed)
+        events.sort(key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
+        return events or None
+
+    def _getSharedEventArrays(self):
+        """as_type='numpy' version of _getSharedEvents(), which gets the
+        arrays directly from the shared memory event buffer."""
+        shared = self._shared_events
+        arrays = shared.readArrays()
+        events = self.allEvents
+        self.allEvents = []
+        if shared.hasMissedEvents():
+            missed = self._sendToHubServer(('GET_EVENTS',))[1]
+            if missed:
+                events.extend(missed)
+        if events:
+            for etype, evt_array in self.eventListsToNumPy(events).items():
+                if etype in arrays:
+                    evt_array = np.concatenate((arrays[etype], evt_array))
+                    times = evt_array[evt_array.dtype.names[
+                        DeviceEvent.EVENT_HUB_TIME_INDEX]]
+                    evt_array = evt_array[np.argsort(times, kind='mergesort')]
+                arrays[etype] = evt_array
+        return arrays
+
     def _convertDict(self, d):
         r = {}
         for k, v in d.items():
@@ -1238,6 +1473,35 @@ class ioHubConnection(object):
         etype = evt_data[DeviceEvent.EVENT_TYPE_ID_INDEX]
         return EventConstants.getClass(etype).createEventAsNamedTuple(evt_data)
 
+    @staticmethod
+    def eventListsToNumPy(evt_data_list):
+        """Convert a list of ioHub events in list value format into a dict
+        holding one numpy structured array per event type id, using the
+        NUMPY_DTYPE of the event class. For example::
+
+            samples = events[EventConstants.BINOCULAR_EYE_SAMPLE]
+            mean_x = samples['left_gaze_x'].mean()
+
+        String fields are utf-8 encoded bytes, as in the ioDataStore."""
+        by_type = {}
+        for evt_data in evt_data_list:
+            etype = evt_data[DeviceEvent.EVENT_TYPE_ID_INDEX]
+            by_type.setdefault(etype, []).append(evt_data)
+
+        arrays = {}
+        for etype, events in by_type.items():
+            dtype = EventConstants.getClass(etype).NUMPY_DTYPE
+            evt_array = np.empty(len(events), dtype=dtype)
+            # filling one field at a time is faster than np.array() on a
+            # list of records
+            for name, values in zip(dtype.names, zip(*events)):
+                if dtype[name].kind == 'S':
+                    values = [v.encode('utf-8') if isinstance(v, unicode)
+                              else v for v in values]
+                evt_array[name] = values
+            arrays[etype] = evt_array
+        return arrays
+
     # client utility methods.
     def _getDeviceList(self):
         r = self._sendToHubServer(('EXP_DEVICE', 'GET_DEVICE_LIST'))
@@ -1253,6 +1517,9 @@ class ioHubConnection(object):
 
             self._shutdown_attempted = True
             TimeoutError = psutil.TimeoutExpired
+            if self._shared_events is not None:
+                self._shared_events.close()
+                self._shared_events = None
             try:
                 if self.udp_client:  # if it isn't already garbage-collected
                     self.udp_client.sendTo(('STOP_IOHUB_SERVER',))
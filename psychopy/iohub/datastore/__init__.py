@@ -7,12 +7,15 @@
 from __future__ import division, absolute_import, print_function
 
 import os
+import json
 import atexit
+from collections import deque
 import numpy as np
 from builtins import str
 from builtins import object
 from pkg_resources import parse_version
 from ..server import DeviceEvent
+from ..devices import Computer
 from ..constants import EventConstants
 from ..errors import ioHubError, printExceptionDetailsToStdErr, print2err
 
@@ -52,8 +55,14 @@ FILE_VERSION = '0.9.1.1'
 SCHEMA_AUTHORS = 'Sol Simpson'
 SCHEMA_MODIFIED_DATE = 'March 19th, 2021'
 
+getTime = Computer.getTime
+
 
 class DataStoreFile(object):
+    # event table columns that get a completely sorted index when the file
+    # is closed (see indexEventTables)
+    EVENT_TABLE_INDEX_COLUMNS = ('time', 'session_id', 'type')
+
     def __init__(self, fileName, folderPath, fmode='a', iohub_settings=None):
         self.fileName = fileName
         self.folderPath = folderPath
@@ -70,7 +79,24 @@ class DataStoreFile(object):
         self.flushCounter = self.settings.get('flush_interval', 32)
         self._eventCounter = 0
 
+        # Events are not appended to their table one at a time, but held in a
+        # write buffer, grouped by table, and appended in chunks.
+        self.writeBufferSize = self.settings.get('write_buffer_size', 512)
+        self.writeInterval = self.settings.get('write_interval', 0.1)
+        self._pendingEvents = dict()
+        self._pendingCount = 0
+        self._oldestPendingTime = None
+        self._queuedSinceIdleCheck = 0
+        self._maxPendingCount = 0
+        self._writeCount = 0
+        self._eventsWritten = 0
+        self._writeDurations = deque(maxlen=100)
+        self._maxWriteDuration = 0.0
+        # MetricsRegistry of the ioHub Server, if metrics are enabled
+        self.metrics = None
+
         self.TABLES = dict()
+        self._eventTableLabels = set()
         self._eventGroupMappings = dict()
         self.emrtFile = open_file(self.filePath, mode=fmode)
 
@@ -168,12 +194,32 @@ class DataStoreFile(object):
                                       title=egtitle)
             return datevts_node._f_get_child(evt_group_label)
 
+    def eventTableFilters(self):
+        """The tables.Filters used for event tables, given by the
+        compression_lib, compression_level and shuffle data_store settings."""
+        try:
+            return tables.Filters(
+                complevel=self.settings.get('compression_level', 0),
+                complib=self.settings.get('compression_lib', 'zlib'),
+                shuffle=self.settings.get('shuffle', False),
+                fletcher32=False)
+        except Exception:
+            print2err('Invalid ioDataStore compression settings; '
+                      'event tables will not be compressed.')
+            printExceptionDetailsToStdErr()
+            return tables.Filters(complevel=0, complib='zlib', shuffle=False,
+                                  fletcher32=False)
+
+    def eventTableExpectedRows(self, event_table_label):
+        """Number of rows an event table is expected to hold, given by the
+        expected_rows data_store setting. PyTables uses this to choose the
+        chunk size of the table."""
+        expected_rows = self.settings.get('expected_rows') or {}
+        return int(expected_rows.get(event_table_label,
+                                     expected_rows.get('default', 10000)))
+
     def updateDataStoreStructure(self, device_instance, event_class_dict):
-        dfilter = tables.Filters(
-            complevel=0,
-            complib='zlib',
-            shuffle=False,
-            fletcher32=False)
+        dfilter = self.eventTableFilters()
 
         for event_cls_name, event_cls in event_class_dict.items():
             if event_cls.IOHUB_DATA_TABLE:
@@ -187,7 +233,9 @@ class DataStoreFile(object):
                             title='%s Data' %
                             (device_instance.__class__.__name__,
                              ),
-                            filters=dfilter.copy())
+                            filters=dfilter.copy(),
+                            expectedrows=self.eventTableExpectedRows(
+                                event_table_label))
                         self.flush()
                     except tables.NodeError:
                         self.TABLES[event_table_label] = self.groupNodeForEvent(event_cls)._f_get_child(self.eventTableLabel2ClassName(event_table_label))
@@ -212,6 +260,10 @@ class DataStoreFile(object):
                         print2err('--------------------------------------')
 
                 if event_table_label in self.TABLES:
+                    self._eventTableLabels.add(event_table_label)
+                    # indexes are only updated by indexEventTables(), not
+                    # while events are being saved
+                    self.TABLES[event_table_label].autoindex = False
                     self.addClassMapping(event_cls,
                                          self.TABLES[event_table_label])
                 else:
@@ -369,46 +421,133 @@ class DataStoreFile(object):
                 return True
             return False
 
+    def _queueEvent(self, event):
+        etype = event[DeviceEvent.EVENT_TYPE_ID_INDEX]
+        table_label = EventConstants.getClass(etype).IOHUB_DATA_TABLE
+        if table_label not in self.TABLES:
+            raise ioHubError('No DataStore table for event type', etype)
+        event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX] = self.active_experiment_id
+        event[DeviceEvent.EVENT_SESSION_ID_INDEX] = self.active_session_id
+
+        pending = self._pendingEvents.get(table_label)
+        if pending is None:
+            pending = self._pendingEvents[table_label] = []
+        pending.append(tuple(event))
+        self._pendingCount += 1
+        self._queuedSinceIdleCheck += 1
+        if self._pendingCount > self._maxPendingCount:
+            self._maxPendingCount = self._pendingCount
+        if self._oldestPendingTime is None:
+            self._oldestPendingTime = getTime()
+
+    def _checkWriteThresholds(self):
+        if self._pendingCount >= self.writeBufferSize:
+            return self.writePendingEvents()
+        if self._oldestPendingTime is not None:
+            if getTime() - self._oldestPendingTime >= self.writeInterval:
+                return self.writePendingEvents()
+        return 0
+
     def _handleEvent(self, event):
         try:
             if self.checkForExperimentAndSessionIDs(event) is False:
                 return False
-            etype = event[DeviceEvent.EVENT_TYPE_ID_INDEX]
-            eventClass = EventConstants.getClass(etype)
-            etable = self.TABLES[eventClass.IOHUB_DATA_TABLE]
-            event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX] = self.active_experiment_id
-            event[DeviceEvent.EVENT_SESSION_ID_INDEX] = self.active_session_id
-
-            np_array = np.array([tuple(event), ], dtype=eventClass.NUMPY_DTYPE)
-            etable.append(np_array)
-            self.bufferedFlush()
+            self._queueEvent(event)
         except Exception:
             print2err("Error saving event: ", event)
             printExceptionDetailsToStdErr()
+        self._checkWriteThresholds()
 
     def _handleEvents(self, events):
-        try:
-            if self.checkForExperimentAndSessionIDs(len(events)) is False:
-                return False
-
-            event = events[0]
-
-            etype = event[DeviceEvent.EVENT_TYPE_ID_INDEX]
-            eventClass = EventConstants.getClass(etype)
-            etable = self.TABLES[eventClass.IOHUB_DATA_TABLE]
-
-            np_events = []
-            for event in events:
-                event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX] = self.active_experiment_id
-                event[DeviceEvent.EVENT_SESSION_ID_INDEX] = self.active_session_id
-                np_events.append(tuple(event))
+        if self.checkForExperimentAndSessionIDs(len(events)) is False:
+            return False
+        for event in events:
+            try:
+                self._queueEvent(event)
+            except Exception:
+                print2err("Error saving event: ", event)
+                printExceptionDetailsToStdErr()
+        self._checkWriteThresholds()
+
+    def writePendingEvents(self):
+        """Append the events held in the write buffer to their tables, using
+        one append per table. Returns the number of events written."""
+        if self._pendingCount == 0:
+            return 0
+        stime = getTime()
+        pending = self._pendingEvents
+        count = self._pendingCount
+        self._pendingEvents = dict()
+        self._pendingCount = 0
+        self._oldestPendingTime = None
+
+        metrics = self.metrics
+        for table_label, events in pending.items():
+            etable = self.TABLES[table_label]
+            try:
+                if metrics is None:
+                    etable.append(np.array(events, dtype=etable.dtype))
+                else:
+                    with metrics.timer('datastore.write.%s' % table_label):
+                        etable.append(np.array(events, dtype=etable.dtype))
+            except Exception:
+                # find and report the event(s) that could not be saved
+                for event in events:
+                    try:
+                        etable.append(np.array([event, ], dtype=etable.dtype))
+                    except Exception:
+                        print2err("Error saving event: ", event)
+                        printExceptionDetailsToStdErr()
 
-            np_array = np.array(np_events, dtype=eventClass.NUMPY_DTYPE)
-            etable.append(np_array)
-            self.bufferedFlush(len(np_events))
-        except ioHubError as e:
-            print2err(e)
+        duration = getTime() - stime
+        self._writeCount += 1
+        self._eventsWritten += count
+        self._writeDurations.append(duration)
+        if duration > self._maxWriteDuration:
+            self._maxWriteDuration = duration
+        if metrics is not None:
+            metrics.record('datastore.write', duration)
+            metrics.count('datastore.events_written', count)
+        self.bufferedFlush(count)
+        return count
+
+    def writePendingEventsIfIdle(self):
+        """Write the events held in the write buffer if no new events were
+        queued since the last time this was called. Called by the ioHub
+        Server between checks for new device events."""
+        queued = self._queuedSinceIdleCheck
+        self._queuedSinceIdleCheck = 0
+        if queued == 0:
+            return self.writePendingEvents()
+        return self._checkWriteThresholds()
+
+    def getWriteStats(self):
+        """Returns a dict with the current and maximum number of events
+        waiting in the write buffer and the number and duration (sec.msec) of
+        the appends done."""
+        durations = self._writeDurations
+        mean_duration = 0.0
+        if durations:
+            mean_duration = sum(durations) / len(durations)
+        return dict(pending_events=self._pendingCount,
+                    max_pending_events=self._maxPendingCount,
+                    write_count=self._writeCount,
+                    events_written=self._eventsWritten,
+                    last_write_duration=durations[-1] if durations else 0.0,
+                    mean_write_duration=mean_duration,
+                    max_write_duration=self._maxWriteDuration)
+
+    def saveMetrics(self, session_id, metrics):
+        """Save the dict of ioHub Server metrics (see
+        MetricsRegistry.asDict) for the session as JSON, in the
+        'metrics_session_<session_id>' attribute of the session meta data
+        table."""
+        try:
+            session_metadata = self.TABLES['SESSION_METADETA']
+            session_metadata.attrs['metrics_session_%d' % session_id] = \
+                json.dumps(metrics)
         except Exception:
+            print2err('Error saving metrics for session: ', session_id)
             printExceptionDetailsToStdErr()
 
     def bufferedFlush(self,eventCount=1):
@@ -431,14 +570,40 @@ class DataStoreFile(object):
     def flush(self):
         try:
             if self.emrtFile:
+                if self._pendingCount:
+                    self.writePendingEvents()
                 self.emrtFile.flush()
         except tables.ClosedFileError:
             pass
         except Exception:
             printExceptionDetailsToStdErr()
 
+    def indexEventTables(self):
+        """Create completely sorted indexes of the EVENT_TABLE_INDEX_COLUMNS
+        of each event table, or update them with the events saved since they
+        were created, so that events can be selected quickly once the
+        session has ended. Called by close() unless the index_event_tables
+        data_store setting is False."""
+        for table_label in self._eventTableLabels:
+            etable = self.TABLES[table_label]
+            try:
+                for cname in self.EVENT_TABLE_INDEX_COLUMNS:
+                    col = etable.cols._f_col(cname)
+                    if not col.is_indexed:
+                        col.create_csindex()
+                    elif col.index.dirty:
+                        col.reindex_dirty()
+            except Exception:
+                print2err('Error indexing event table: ', table_label)
+                printExceptionDetailsToStdErr()
+
     def close(self):
+        if not self.emrtFile.isopen:
+            return
         self.flush()
+        if self.settings.get('index_event_tables', True):
+            self.indexEventTables()
+            self.flush()
         self._activeRunTimeConditionVariableTable = None
         self.emrtFile.close()
 
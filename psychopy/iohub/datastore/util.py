@@ -14,6 +14,7 @@ from tables import *
 import os
 from collections import namedtuple
 import json
+import numpy as np
 
 from ..errors import print2err
 
@@ -35,6 +36,38 @@ else:
 
 _hubFiles = []
 
+# comparisons that can be used in a condition variable filter, as numpy
+# functions applied to a whole column at once
+_cvComparisons = {
+    '==': np.equal,
+    '!=': np.not_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    'in': np.isin,
+    'not in': lambda column, values: ~np.isin(column, values),
+}
+
+
+def _encodeForColumn(column, value):
+    # string columns hold bytes
+    if column.dtype.kind != 'S':
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_encodeForColumn(column, v) for v in value]
+    if isinstance(value, basestring) and not isinstance(value, bytes):
+        return value.encode('utf-8')
+    return value
+
+
+def _cvSessionID(cv):
+    # the session id column of a condition variable table is SESSION_ID
+    sessionID = getattr(cv, 'session_id', None)
+    if sessionID is None:
+        sessionID = cv.SESSION_ID
+    return sessionID
+
 def openHubFile(filepath, filename, mode):
     """
     Open an HDF5 DataStore file and register it so that it is closed even on interpreter crash.
@@ -90,6 +123,70 @@ def displayEventTableSelectionDialog(
 ########### Experiment / Experiment Session Based Data Access #################
 
 
+def repackHubFile(filePath, outputPath=None, complib='blosc', complevel=5,
+                  shuffle=True):
+    """
+    Copy a DataStore HDF5 file, compressing every table with the given filter
+    settings and choosing the chunk size of each table from the number of
+    rows it holds. Use this once a session has ended, to make the file
+    smaller and quicker to copy and read.
+
+    From the command line::
+
+        python -m psychopy.iohub.datastore.util events.hdf5 [output.hdf5]
+
+    Args:
+        filePath (str): The DataStore HDF5 file to repack.
+
+        outputPath (str): The file to create. If None, filePath is replaced by the repacked file.
+
+        complib (str): The compression library (see tables.Filters).
+
+        complevel (int): The compression level, 0 (none) to 9.
+
+        shuffle (bool): If True, the shuffle filter is used.
+
+    Returns:
+        tuple: The path of the repacked file, and the size of the file before and after repacking (in bytes).
+    """
+    filters = tables.Filters(complevel=complevel, complib=complib,
+                             shuffle=shuffle)
+    replace = outputPath is None
+    if replace:
+        outputPath = filePath + '.repack'
+    hubFile = open_file(filePath, 'r')
+    try:
+        packedFile = open_file(outputPath, 'w', title=hubFile.title)
+        try:
+            hubFile.root._v_attrs._f_copy(packedFile.root)
+            for group in getattr(hubFile, walk_groups)():
+                if group is hubFile.root:
+                    packedGroup = packedFile.root
+                else:
+                    packedGroup = packedFile.create_group(
+                        group._v_parent._v_pathname, group._v_name,
+                        title=group._v_title)
+                    group._v_attrs._f_copy(packedGroup)
+                for leaf in group._f_iter_nodes('Leaf'):
+                    if isinstance(leaf, tables.Table):
+                        # keep the indexes made by indexEventTables()
+                        leaf.copy(packedGroup, leaf.name, filters=filters,
+                                  chunkshape='auto', propindexes=True)
+                    else:
+                        leaf.copy(packedGroup, leaf.name, filters=filters,
+                                  chunkshape='auto')
+        finally:
+            packedFile.close()
+    finally:
+        hubFile.close()
+    originalSize = os.path.getsize(filePath)
+    if replace:
+        os.remove(filePath)
+        os.rename(outputPath, filePath)
+        outputPath = filePath
+    return outputPath, originalSize, os.path.getsize(outputPath)
+
+
 class ExperimentDataAccessUtility(object):
     """The ExperimentDataAccessUtility  provides a simple, high level, way to
     access data saved in an ioHub DataStore HDF5 file. Data access is done by
@@ -230,6 +327,16 @@ class ExperimentDataAccessUtility(object):
                     sessions.append(SessionMetaDataInstance(*rcpy))
             return sessions
 
+    def getSessionMetrics(self, session_id):
+        """Returns the ioHub Server metrics dict (see
+        ioHubConnection.getMetrics) saved at the end of the session, or None
+        if the ioHub Server did not have metrics enabled."""
+        if self.hdfFile:
+            attrs = self.hdfFile.root.data_collection.session_meta_data.attrs
+            metrics = getattr(attrs, 'metrics_session_%d' % session_id, None)
+            if metrics is not None:
+                return json.loads(metrics)
+
     def getTableForPath(self, path):
         """
         Given a valid table path within the DataStore file, return the accociated table.
@@ -267,7 +374,11 @@ class ExperimentDataAccessUtility(object):
                 return None
 
             result = []
-            where_cls = '(%s == b"%s") & (class_type_id == 1)'%(event_column, event_value)
+            if event_column == 'class_id':
+                where_cls = '(class_id == %d) & (class_type_id == 1)' % (
+                    event_value)
+            else:
+                where_cls = '(%s == b"%s") & (class_type_id == 1)'%(event_column, event_value)
             for row in klassTables.where(where_cls):
                 result.append(row.fetch_all_fields())
 
@@ -349,7 +460,12 @@ class ExperimentDataAccessUtility(object):
 
     def getConditionVariables(self, filter=None):
         """
-        **Docstr TBC.**
+        Returns the rows of the condition variables table that match filter,
+        as namedtuples.
+
+        Args:
+            filter (dict): condition variable name: (comparison, value), e.g. dict(block=('==', 2), trial=('<', 10)). The comparison can be ==, !=, <, <=, >, >=, in or not in. By default all rows of the sessions of the experiment are returned.
+
         """
         if filter is None:
             session_ids = []
@@ -357,34 +473,26 @@ class ExperimentDataAccessUtility(object):
                 session_ids.append(s.session_id)
             filter = dict(session_id=(' in ', session_ids))
 
-        ConditionSetInstance = None
-
+        ecvTable = self.getConditionVariablesTable()
+        if ecvTable is None:
+            return []
+        ConditionSetInstance = namedtuple('ConditionSetInstance',
+                                          ecvTable.colnames)
+        rows = ecvTable.read()
+        match = np.ones(len(rows), dtype=bool)
         for conditionVarName, conditionVarComparitor in filter.items():
             avComparison, value = conditionVarComparitor
-
-            cv_group = self.hdfFile.root.data_collection.condition_variables
-            cvrows = []
-            ecv = "EXP_CV_%d" % (self._experimentID,)
-            if ecv in cv_group._v_leaves:
-                ecvTable = cv_group._v_leaves[ecv]
-
-                if ConditionSetInstance is None:
-                    colnam = ecvTable.colnames
-                    ConditionSetInstance = namedtuple('ConditionSetInstance', colnam)
-
-                cvrows.extend(
-                    [
-                        ConditionSetInstance(
-                            *
-                            r[:]) for r in ecvTable if all(
-                            [
-                                eval(
-                                    '{0} {1} {2}'.format(
-                                        r[conditionVarName],
-                                        conditionVarComparitor[0],
-                                        conditionVarComparitor[1])) for conditionVarName,
-                                conditionVarComparitor in filter.items()])])
-        return cvrows
+            if conditionVarName not in rows.dtype.names:
+                conditionVarName = conditionVarName.upper()
+            column = rows[conditionVarName]
+            compare = _cvComparisons.get(avComparison.strip())
+            if compare is not None:
+                match &= compare(column, _encodeForColumn(column, value))
+            else:
+                match &= np.array([eval('{0} {1} {2}'.format(
+                    v, avComparison, value)) for v in column.tolist()],
+                    dtype=bool)
+        return [ConditionSetInstance(*r) for r in rows[match].tolist()]
 
     def getValuesForVariables(self, cv, value, cvNames):
         """
@@ -441,18 +549,9 @@ class ExperimentDataAccessUtility(object):
             Values for the specified event type and event attribute columns which match the provided experiment condition variable filter, starting condition filer, and ending condition filter criteria.
         """
         if self.hdfFile:
-            klassTables = self.hdfFile.root.class_table_mapping
-
-            deviceEventTable = None
-
-            result = [
-                row.fetch_all_fields() for row in klassTables.where(
-                    '(class_id == %d) & (class_type_id == 1)' %
-                    (event_type_id))]
-            if len(result) != 1:
+            deviceEventTable = self.getEventTable(event_type_id)
+            if deviceEventTable is None:
                 raise ExperimentDataAccessException("event_type_id passed to getEventAttribute should only return one row from CLASS_MAPPINGS.")
-            tablePathString = result[0][3]
-            deviceEventTable = getattr(self.hdfFile, get_node)(tablePathString)
 
             for ename in event_attribute_names:
                 if ename not in deviceEventTable.colnames:
@@ -480,13 +579,26 @@ class ExperimentDataAccessUtility(object):
 
                 cvNames = self.getConditionVariableNames()
 
+                # trials often share the same where clause (e.g. all trials
+                # of a session when there are no start or end conditions),
+                # so each clause is only read from the table once
+                resultsForClause = dict()
+
+                def readColumns(wclause):
+                    if wclause not in resultsForClause:
+                        resultsForClause[wclause] = [
+                            getattr(deviceEventTable, read_where)(wclause,
+                                                                  field=ename)
+                            for ename in event_attribute_names]
+                    return list(resultsForClause[wclause])
+
                 # no further where clause building needed; get reseults and
                 # return
                 if startConditions is None and endConditions is None:
                     for cv in filteredConditionVariableList:
 
                         wclause = '( experiment_id == {0} ) & ( session_id == {1} )'.format(
-                            self._experimentID, cv.session_id)
+                            self._experimentID, _cvSessionID(cv))
 
                         wclause += ' & ( type == {0} ) '.format(event_type_id)
 
@@ -494,10 +606,7 @@ class ExperimentDataAccessUtility(object):
                             wclause += '& ( filter_id == {0} ) '.format(
                                 filter_id)
 
-                        resultSetList.append([])
-
-                        for ename in event_attribute_names:
-                            resultSetList[-1].append(getattr(deviceEventTable, read_where)(wclause, field=ename))
+                        resultSetList.append(readColumns(wclause))
                         resultSetList[-1].append(wclause)
                         resultSetList[-1].append(cv)
 
@@ -509,10 +618,8 @@ class ExperimentDataAccessUtility(object):
 
                 #start or end conditions exist....
                 for cv in filteredConditionVariableList:
-                    resultSetList.append([])
-
                     wclause = '( experiment_id == {0} ) & ( session_id == {1} )'.format(
-                        self._experimentID, cv.session_id)
+                        self._experimentID, _cvSessionID(cv))
 
                     wclause += ' & ( type == {0} ) '.format(event_type_id)
 
@@ -543,8 +650,7 @@ class ExperimentDataAccessUtility(object):
                         wclause=wclause[:-3]
                         wclause += ' ) '
 
-                    for ename in event_attribute_names:
-                        resultSetList[-1].append(getattr(deviceEventTable, read_where)(wclause, field=ename))
+                    resultSetList.append(readColumns(wclause))
                     resultSetList[-1].append(wclause)
                     resultSetList[-1].append(cv)
 
@@ -556,6 +662,88 @@ class ExperimentDataAccessUtility(object):
 
             return None
 
+    def getEventsForTrials(self, event_type_id, startTimes, endTimes,
+                           sessionIDs=None, filter_id=None, fields=None):
+        """
+        Returns the events of one type that occurred within each of a set of
+        time windows, e.g. one for each trial, reading the event table only
+        once. The events are read into one array, sorted by session and
+        time, and the bounds of all windows are found with
+        numpy.searchsorted; the array returned for each window is a view
+        (slice) of that array, so no events are copied.
+
+        Selecting events by type and session uses the event table indexes
+        created when the ioDataStore file was closed.
+
+        Args:
+            event_type_id (int): The type of the events to return (see EventConstants).
+
+            startTimes (array): The start time (sec.msec) of each window.
+
+            endTimes (array): The end time of each window. Events at exactly the end time are included.
+
+            sessionIDs (int or array): The session id of each window, or one session id for all windows. If None, the events of all sessions are searched as one.
+
+            filter_id (int): If given, only events with this filter_id are returned.
+
+            fields (list): The event fields to return. By default all fields are returned.
+
+        Returns:
+            list: one numpy structured array of events for each window.
+        """
+        deviceEventTable = self.getEventTable(event_type_id)
+        if deviceEventTable is None:
+            raise ExperimentDataAccessException(
+                'getEventsForTrials: no table for event type {0}'.format(
+                    event_type_id))
+        startTimes = np.asarray(startTimes, dtype=np.float64)
+        endTimes = np.asarray(endTimes, dtype=np.float64)
+        if startTimes.shape != endTimes.shape or startTimes.ndim != 1:
+            raise ExperimentDataAccessException(
+                'getEventsForTrials: startTimes and endTimes must be 1D and '
+                'the same length')
+
+        wclause = '( experiment_id == {0} ) & ( type == {1} )'.format(
+            self._experimentID, event_type_id)
+        if filter_id is not None:
+            wclause += ' & ( filter_id == {0} )'.format(filter_id)
+        events = getattr(deviceEventTable, read_where)(wclause)
+
+        nWindows = len(startTimes)
+        starts = np.empty(nWindows, dtype=np.intp)
+        ends = np.empty(nWindows, dtype=np.intp)
+        if sessionIDs is None:
+            times = events['time']
+            if np.any(times[1:] < times[:-1]):
+                events = events[np.argsort(times, kind='mergesort')]
+                times = events['time']
+            starts[:] = np.searchsorted(times, startTimes, 'left')
+            ends[:] = np.searchsorted(times, endTimes, 'right')
+        else:
+            sessionIDs = np.broadcast_to(np.asarray(sessionIDs), (nWindows,))
+            events = events[np.isin(events['session_id'], sessionIDs)]
+            sessions = events['session_id']
+            times = events['time']
+            if not np.all((sessions[1:] > sessions[:-1]) | (
+                    (sessions[1:] == sessions[:-1]) &
+                    (times[1:] >= times[:-1]))):
+                events = events[np.lexsort((times, sessions))]
+                sessions = events['session_id']
+                times = events['time']
+            for sessionID in np.unique(sessionIDs):
+                first = np.searchsorted(sessions, sessionID, side='left')
+                last = np.searchsorted(sessions, sessionID, side='right')
+                sessionTimes = times[first:last]
+                windows = sessionIDs == sessionID
+                starts[windows] = first + np.searchsorted(
+                    sessionTimes, startTimes[windows], 'left')
+                ends[windows] = first + np.searchsorted(
+                    sessionTimes, endTimes[windows], 'right')
+
+        if fields is not None:
+            events = events[list(fields)]
+        return [events[start:end] for start, end in zip(starts, ends)]
+
     def getEventIterator(self, event_type):
         """
         **Docstr TBC.**
@@ -591,3 +779,20 @@ class ExperimentDataAccessUtility(object):
 
 class ExperimentDataAccessException(Exception):
     pass
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Repack an ioHub DataStore HDF5 file with compression.')
+    parser.add_argument('file', help='the .hdf5 file to repack')
+    parser.add_argument('output', nargs='?', default=None,
+                        help='the file to create (default: replace file)')
+    parser.add_argument('--complib', default='blosc')
+    parser.add_argument('--complevel', type=int, default=5)
+    parser.add_argument('--no-shuffle', dest='shuffle', action='store_false')
+    args = parser.parse_args()
+    output, before, after = repackHubFile(args.file, args.output,
+                                          args.complib, args.complevel,
+                                          args.shuffle)
+    print('%s: %d -> %d bytes' % (output, before, after))
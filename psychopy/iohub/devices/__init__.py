@@ -187,6 +187,9 @@ class Device(ioObject):
     _next_event_id = 1
     _display_device = None
     _iohub_server = None
+    # Set by the ioHub Server when it runs event driven; called (from any
+    # thread) each time a native event is added to a device buffer.
+    _native_events_ready = None
     next_filter_id = 1
     DEVICE_TYPE_ID = None
     DEVICE_TYPE_STRING = None
@@ -287,7 +290,7 @@ class Device(ioObject):
 
             clearEvents (int): Can be used to indicate if the events being returned should also be removed from the device event buffer. True (the default) indicates to remove events being returned. False results in events being left in the device event buffer.
 
-            asType (str): Optional kwarg giving the object type to return events as. Valid values are 'namedtuple' (the default), 'dict', 'list', or 'object'.
+            asType (str): Optional kwarg giving the object type to return events as. Valid values are 'namedtuple' (the default), 'dict', 'list', 'object', or 'numpy' (a dict of one numpy structured array per event type id).
 
         Returns:
             (list): New events that the ioHub has received since the last getEvents() or clearEvents() call to the device. Events are ordered by the ioHub time of each event, older event at index 0. The event object type is determined by the asType parameter passed to the method. By default a namedtuple object is returned for each event.
@@ -512,7 +515,13 @@ class Device(ioObject):
                     evt_filter_ids = event_filter.input_event_types.get(
                         event_type_id, [])
                     if input_evt_filter_id in evt_filter_ids:
-                        event_filter._addInputEvent(copy.deepcopy(e))
+                        metrics = getattr(self._iohub_server, 'metrics', None)
+                        if metrics is None:
+                            event_filter._addInputEvent(copy.deepcopy(e))
+                            continue
+                        with metrics.timer('filter.%s.process' %
+                                           event_filter.__class__.__name__):
+                            event_filter._addInputEvent(copy.deepcopy(e))
 
     def _getNativeEventBuffer(self):
         return self._native_event_buffer
@@ -520,6 +529,8 @@ class Device(ioObject):
     def _addNativeEventToBuffer(self, e):
         if self.isReportingEvents():
             self._native_event_buffer.append(e)
+            if Device._native_events_ready:
+                Device._native_events_ready()
 
     def _addEventListener(self, l, eventTypeIDs):
         for ei in eventTypeIDs:
@@ -630,6 +641,23 @@ class Device(ioObject):
         """
         pass
 
+    def _getSelectableFD(self):
+        """Devices that receive native events from a file descriptor or
+        socket can return it here. When the ioHub Server is running event
+        driven (event_driven: True in the iohub config), the device's
+        _poll() method is then called as soon as the file descriptor is
+        readable, instead of at each device_timer interval.
+
+        Args:
+            None
+
+        Returns:
+            int or None: the file descriptor, or None (default) if the
+            device must be polled at its device_timer interval.
+
+        """
+        return None
+
     def _handleNativeEvent(self, *args, **kwargs):
         """The _handleEvent method can be used by the native device interface
         (implemented by the ioHub Device class) to register new native device
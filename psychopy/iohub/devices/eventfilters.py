@@ -7,7 +7,10 @@ from __future__ import print_function
 
 from past.builtins import basestring
 from builtins import object
+import heapq
+import math
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 from collections import deque
 
 from ..util import NumPyRingBuffer
@@ -128,6 +131,103 @@ class DeviceEventFilter(object):
 ####################### Device Event Field Filter Types ##################
 
 
+class RunningMedian(object):
+    """Median of a changing collection of values, using two heaps: a max heap
+    with the smaller half of the values, and a min heap with the larger half.
+    Adding a value takes O(log n) time, and the median is always available
+    from the top of the heaps.
+
+    Removed values are only popped from a heap once they reach the top
+    (lazy deletion), so remove() must only be given values that were added
+    and have not been removed yet. NaN values are counted separately; the
+    median is NaN while any NaN value is in the collection.
+    """
+
+    def __init__(self):
+        self._low = []  # max heap, as negated values
+        self._high = []  # min heap
+        self._low_size = 0
+        self._high_size = 0
+        self._removed = dict()
+        self._nan_count = 0
+
+    def __len__(self):
+        return self._low_size + self._high_size + self._nan_count
+
+    def add(self, value):
+        value = float(value)
+        if value != value:
+            self._nan_count += 1
+            return
+        if self._low_size == 0 or value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_size += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_size += 1
+        self._balance()
+
+    def remove(self, value):
+        value = float(value)
+        if value != value:
+            self._nan_count -= 1
+            return
+        self._removed[value] = self._removed.get(value, 0) + 1
+        if value <= -self._low[0]:
+            self._low_size -= 1
+            if value == -self._low[0]:
+                self._prune(self._low, -1.0)
+        else:
+            self._high_size -= 1
+            if value == self._high[0]:
+                self._prune(self._high, 1.0)
+        self._balance()
+
+    def median(self):
+        if self._nan_count:
+            return np.nan
+        if self._low_size > self._high_size:
+            return -self._low[0]
+        if self._low_size == 0:
+            return np.nan
+        return (self._high[0] - self._low[0]) / 2.0
+
+    def clear(self):
+        self.__init__()
+
+    def _prune(self, heap, sign):
+        while heap:
+            value = sign * heap[0]
+            count = self._removed.get(value)
+            if not count:
+                return
+            if count == 1:
+                del self._removed[value]
+            else:
+                self._removed[value] = count - 1
+            heapq.heappop(heap)
+
+    def _balance(self):
+        # The low heap holds the middle value when the count is odd.
+        if self._low_size > self._high_size + 1:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_size -= 1
+            self._high_size += 1
+            self._prune(self._low, -1.0)
+        elif self._low_size < self._high_size:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._low_size += 1
+            self._high_size -= 1
+            self._prune(self._high, 1.0)
+
+
+def _windowView(values, length):
+    """2D read only view of each window of length values in values."""
+    stride = values.strides[0]
+    return as_strided(values, shape=(len(values) - length + 1, length),
+                      strides=(stride, stride), writeable=False)
+
+
 class MovingWindowFilter(object):
     """Maintains a moving window of size 'length', for a specific event field
     value, given by 'event_field_name'. knot_pos defines where in the window
@@ -142,11 +242,20 @@ class MovingWindowFilter(object):
     value is added to the MovingWindow using MovingWindow.add.
     None is returned until the MovingWindow is full.
 
+    add_batch can be used to filter a block of values or events at once.
+
     The base class implements a moving window averaging filter, no weights.
+    The sum of the window values is kept up to date as values are added, so
+    the cost of each value does not depend on the window length. Values that
+    are not finite (e.g. NaN for a missing sample) are counted rather than
+    summed, so the filtered value recovers once they have left the window.
     To change the filter used, extend this class and replace the filteredValue
-    method.
+    and filteredWindows methods.
 
     """
+    # Number of window lengths after which the running sum is recalculated,
+    # so that rounding errors can not accumulate.
+    resum_interval = 64
 
     def __init__(self, **kwargs):
         self._inplace = kwargs.get('inplace')
@@ -181,6 +290,9 @@ class MovingWindowFilter(object):
             self._events = deque(maxlen=length)
 
         self._filtering_buffer = NumPyRingBuffer(length)
+        self._window_sum = 0.0  # of the finite values in the window
+        self._nonfinite_count = 0
+        self._value_count = 0
 
     def filteredValue(self):
         """Returns a filtered value based on the data in the window.
@@ -191,7 +303,31 @@ class MovingWindowFilter(object):
         types can be created.
 
         """
-        return self._filtering_buffer.mean()
+        if self._nonfinite_count:
+            return float(np.mean(self._filtering_buffer.getElements(),
+                                 dtype=np.float64))
+        return self._window_sum / len(self._filtering_buffer)
+
+    def filteredWindows(self, values):
+        """Returns the filtered value of every full window in the values
+        array, i.e. the value filteredValue() would return after each of
+        values[length-1:] was added. Sub classes that implement their own
+        filteredValue method should implement this method as well, or return
+        None to have add_batch add values one at a time.
+
+        """
+        length = self._filtering_buffer.max_size
+        finite = np.isfinite(values)
+        sums = np.cumsum(np.where(finite, values, 0.0), dtype=np.float64)
+        sums[length:] -= sums[:-length].copy()
+        means = sums[length - 1:] / length
+        nonfinite = np.cumsum(~finite)
+        nonfinite[length:] -= nonfinite[:-length].copy()
+        bad = np.flatnonzero(nonfinite[length - 1:])
+        if len(bad):
+            means[bad] = np.mean(_windowView(values, length)[bad], axis=1,
+                                 dtype=np.float64)
+        return means
 
     def add(self, event):
         """Add the given iohub event ( in list form ) to the moving window. The
@@ -204,33 +340,132 @@ class MovingWindowFilter(object):
 
         """
         if isinstance(event, (list, tuple)):
-            self._filtering_buffer.append(event[self._event_field_index])
+            self._addValue(event[self._event_field_index])
             self._events.append(event)
             if self.isFull():
+                filtered_value = self.filteredValue()
                 if self._inplace:
                     self._events[
                         self._active_index][
-                        self._event_field_index] = self.filteredValue()
-                return self._events[self._active_index], self.filteredValue()
+                        self._event_field_index] = filtered_value
+                return self._events[self._active_index], filtered_value
         else:
-            self._filtering_buffer.append(event)
+            self._addValue(event)
             if self.isFull():
                 return None, self.filteredValue()
 
+    def add_batch(self, events):
+        """Add a block of values or iohub events (in list form) to the moving
+        window. This gives the same results as calling add() for each
+        value or event in turn, but the filtering is done with numpy.
+
+        If events is a numpy array of values, an array of the filtered values
+        is returned, one for each value added while the window was full.
+        If events is a list of iohub events, a list of the (event, filtered
+        value) results add() would have returned is returned.
+
+        """
+        values_only = isinstance(events, np.ndarray)
+        if values_only:
+            values = events
+        else:
+            values = [e[self._event_field_index] for e in events]
+
+        length = self._filtering_buffer.max_size
+        window = self._filtering_buffer.getElements()
+        # Values are filtered as they are stored in the window.
+        values = np.asarray(values, dtype=window.dtype)
+        history = np.concatenate(
+            (window[max(0, len(window) - length + 1):], values))
+        filtered = None
+        if len(history) >= length:
+            filtered = self.filteredWindows(history)
+            if filtered is None:
+                return self._addEach(events)
+            first_new = len(history) - len(values)
+            filtered = filtered[max(first_new - length + 1, 0):]
+        self._extendValues(values)
+
+        if values_only:
+            if filtered is None:
+                return values[:0]
+            return filtered
+        history_events = list(self._events) + list(events)
+        history_events = history_events[len(history_events) - len(history):]
+        self._events.extend(events)
+        results = []
+        if filtered is None:
+            return results
+        # Event at the knot position of each full window
+        first_event = len(history) - len(filtered) - length + 1 + \
+            self._active_index
+        for event, filtered_value in zip(history_events[first_event:],
+                                         filtered.tolist()):
+            if self._inplace:
+                event[self._event_field_index] = filtered_value
+            results.append((event, filtered_value))
+        return results
+
+    def _addEach(self, events):
+        results = [self.add(e) for e in events]
+        if isinstance(events, np.ndarray):
+            return np.asarray([r[1] for r in results if r])
+        return [r for r in results if r]
+
+    def _addValue(self, value):
+        """Adds value to the window, returning the (oldest) window value that
+        was removed to make room for it, or None if the window was not full.
+
+        """
+        buffer = self._filtering_buffer
+        removed = None
+        if buffer.isFull():
+            removed = float(buffer[0])
+            if math.isfinite(removed):
+                self._window_sum -= removed
+            else:
+                self._nonfinite_count -= 1
+        buffer.append(value)
+        added = float(buffer[-1])
+        if math.isfinite(added):
+            self._window_sum += added
+        else:
+            self._nonfinite_count += 1
+        self._value_count += 1
+        if self._value_count % (buffer.max_size * self.resum_interval) == 0:
+            self._resum()
+        return removed
+
+    def _extendValues(self, values):
+        """Adds an array of values to the window, as done by add_batch.
+
+        """
+        self._filtering_buffer.extend(values)
+        self._value_count += len(values)
+        self._resum()
+
+    def _resum(self):
+        window = self._filtering_buffer.getElements()
+        finite = np.isfinite(window)
+        self._window_sum = float(np.sum(window[finite], dtype=np.float64))
+        self._nonfinite_count = len(window) - int(np.count_nonzero(finite))
+
     def isFull(self):
         return self._filtering_buffer.isFull()
 
     def clear(self):
         self._filtering_buffer.clear()
+        self._window_sum = 0.0
+        self._nonfinite_count = 0
+        self._value_count = 0
         if self._events:
             self._events.clear()
+
 # ------
 
 
 class PassThroughFilter(MovingWindowFilter):
-    """Returns the median value of the moving window.
-
-    Length must be odd.
+    """Returns the value added to the window unchanged.
 
     """
 
@@ -242,6 +477,9 @@ class PassThroughFilter(MovingWindowFilter):
     def filteredValue(self):
         return self._filtering_buffer[0]
 
+    def filteredWindows(self, values):
+        return values
+
 # ------
 
 
@@ -250,13 +488,48 @@ class MedianFilter(MovingWindowFilter):
 
     Length must be odd.
 
+    The median is kept up to date with a RunningMedian as values are
+    added, rather than being calculated from the whole window each time.
+
     """
+    # Maximum number of window values that filteredWindows() processes at
+    # once. Longer windows are filtered one value at a time by add_batch,
+    # which is faster than the numpy median of each window.
+    block_size = 2 ** 20
+    max_batch_length = 255
 
     def __init__(self, **kwargs):
         MovingWindowFilter.__init__(self, **kwargs)
+        self._running_median = RunningMedian()
 
     def filteredValue(self):
-        return np.median(self._filtering_buffer.getElements())
+        return self._running_median.median()
+
+    def filteredWindows(self, values):
+        length = self._filtering_buffer.max_size
+        if length > self.max_batch_length:
+            return None
+        windows = _windowView(values, length)
+        rows = max(1, self.block_size // length)
+        return np.concatenate([np.median(windows[start:start + rows], axis=1)
+                               for start in range(0, len(windows), rows)])
+
+    def _addValue(self, value):
+        removed = MovingWindowFilter._addValue(self, value)
+        if removed is not None:
+            self._running_median.remove(removed)
+        self._running_median.add(self._filtering_buffer[-1])
+        return removed
+
+    def _extendValues(self, values):
+        MovingWindowFilter._extendValues(self, values)
+        self._running_median.clear()
+        for value in self._filtering_buffer.getElements().tolist():
+            self._running_median.add(value)
+
+    def clear(self):
+        MovingWindowFilter.clear(self)
+        self._running_median.clear()
 
 # ------
 
@@ -278,12 +551,15 @@ class WeightedAverageFilter(MovingWindowFilter):
         MovingWindowFilter.__init__(self, **kwargs)
         weights = np.asanyarray(weights)
         self._weights = weights / np.sum(weights)
+        # np.convolve reverses the weights
+        self._window_weights = self._weights[::-1].copy()
 
     def filteredValue(self):
-        return np.convolve(
-            self._filtering_buffer.getElements(),
-            self._weights,
-            'valid')
+        return float(np.dot(self._filtering_buffer.getElements(),
+                            self._window_weights))
+
+    def filteredWindows(self, values):
+        return np.convolve(values, self._weights, 'valid')
 
 
 # ------
@@ -320,9 +596,16 @@ class StampFilter(MovingWindowFilter):
             return self.sub_filter.filteredValue()
 
         e1, e2, e3 = self._filtering_buffer[0:3]
-        if not(e1 < e2 and e2 < e3) or not (e3 < e2 and e2 < e1):
-            return (e1 + e3) / 2.0
-        return e2
+        if (e1 < e2 and e2 < e3) or (e3 < e2 and e2 < e1):
+            return e2
+        return (e1 + e3) / 2.0
+
+    def filteredWindows(self, values):
+        if self.sub_filter:
+            return None
+        e1, e2, e3 = values[:-2], values[1:-1], values[2:]
+        monotonic = ((e1 < e2) & (e2 < e3)) | ((e3 < e2) & (e2 < e1))
+        return np.where(monotonic, e2, (e1 + e3) / 2.0)
 
     def add(self, event):
         if self.sub_filter:
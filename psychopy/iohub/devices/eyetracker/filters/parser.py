@@ -25,6 +25,9 @@ for a sample, the positions are averaged together. If only one of the two eyes
 has valid data, then that eye data is used for the sample. So the only case
 where a sample will be tagged as missing data is when both eyes do not have
 valid eye position / pupil size data.
+* Samples that have already been saved to the ioDataStore can be parsed again
+(e.g. with a different adaptive velocity threshold history) using
+BatchEyeEventParser, or parseSessions() to parse several sessions in parallel.
 
 POSITION_FILTER and VELOCITY_FILTER can be set to one of the following event
 field filter types. Example values for any input arguments are given. The filter
@@ -131,12 +134,17 @@ Data is filtered once, similar to what a 'normal' filter level would be in the
   eyelink<tm> system. Level = 2 would be similar to the 'extra' filter level
   setting of eyelink<tm>.
 """
+import multiprocessing
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 from ....constants import EventConstants
 from ....errors import print2err
 from ... import DeviceEvent, eventfilters
 from collections import OrderedDict
 from ....util.visualangle import VisualAngleCalc
+from ..eye_events import (MonocularEyeSampleEvent, FixationStartEvent,
+                          FixationEndEvent, SaccadeStartEvent,
+                          SaccadeEndEvent, BlinkStartEvent, BlinkEndEvent)
 
 MONOCULAR_EYE_SAMPLE = EventConstants.MONOCULAR_EYE_SAMPLE
 BINOCULAR_EYE_SAMPLE = EventConstants.BINOCULAR_EYE_SAMPLE
@@ -193,10 +201,10 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
             vel_filter_class, vel_filter_kwargs = eventfilters.PassThroughFilter, {}
 
         self.adaptive_x_vthresh_buffer = np.zeros(
-            self.vel_thresh_history_dur * sampling_rate)
+            int(self.vel_thresh_history_dur * sampling_rate))
         self.x_vthresh_buffer_index = 0
         self.adaptive_y_vthresh_buffer = np.zeros(
-            self.vel_thresh_history_dur * sampling_rate)
+            int(self.vel_thresh_history_dur * sampling_rate))
         self.y_vthresh_buffer_index = 0
 
         pos_filter_kwargs['event_type'] = MONOCULAR_EYE_SAMPLE
@@ -826,7 +834,7 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
                     'time')] - existing_start_event[self.io_event_ix('time')],
                 xDiff,
                 yDiff,
-                np.rad2deg(np.arctan(yDiff, xDiff)),
+                np.rad2deg(np.arctan2(yDiff, xDiff)),
                 existing_start_event[gx],
                 existing_start_event[gy],
                 0.0,
@@ -912,3 +920,377 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
                                         self.io_event_ix('time')] - existing_start_event[
                                             self.io_event_ix('time')], sample[
                                                 self.io_event_ix('status')]]
+
+
+################### Batch (offline) Parsing ##########################
+
+# Weight of the left eye data in a monocular sample, by binocular status
+_LEFT_EYE_WEIGHT = {0: 0.5, 2: 1.0, 20: 0.0, 22: 1.0}
+
+# Sample fields copied to the start_ / end_ fields of parser events
+_EVENT_SAMPLE_FIELDS = ('gaze_x', 'gaze_y', 'angle_x', 'angle_y', 'raw_x',
+                        'raw_y', 'pupil_measure1', 'pupil_measure1_type',
+                        'velocity_x', 'velocity_y', 'velocity_xy')
+_EVENT_HEADER_FIELDS = ('experiment_id', 'session_id', 'device_id',
+                        'event_id', 'device_time', 'logged_time', 'time',
+                        'eye')
+# Monocular samples are processed with double precision, like the live
+# parser does with the python floats of each sample.
+_SAMPLE_DTYPE = np.dtype(MonocularEyeSampleEvent.NUMPY_DTYPE)
+_SAMPLE_DTYPE = np.dtype([
+    (name, np.float64 if _SAMPLE_DTYPE[name].kind == 'f' else
+     _SAMPLE_DTYPE[name]) for name in _SAMPLE_DTYPE.names])
+
+
+def adaptiveVelocityThresholds(velocity, length, block_size=2 ** 20):
+    """Vectorized version of
+    EyeTrackerEventParser.addVelocityToAdaptiveThreshold() for all the
+    velocities of one axis.
+
+    Only velocities > 0 are added to the threshold history, and a threshold
+    is only calculated for a sample once more than `length` velocities have
+    been added to the history. Samples without a threshold are given NaN.
+
+    Args:
+        velocity (ndarray): Sample velocities, in sample order.
+        length (int): Number of velocities in the threshold history.
+        block_size (int): Maximum number of array elements processed at
+            once, which limits the memory used.
+
+    Returns:
+        ndarray: velocity threshold of each sample.
+    """
+    velocity = np.asarray(velocity, dtype=np.float64)
+    thresholds = np.empty(len(velocity))
+    thresholds.fill(np.nan)
+    positive_ix = np.flatnonzero(velocity > 0.0)
+    if length < 1 or len(positive_ix) <= length:
+        return thresholds
+    positive = np.ascontiguousarray(velocity[positive_ix])
+    # windows[k] holds the history after positive velocity k + length - 1
+    # was added to it.
+    stride = positive.strides[0]
+    windows = as_strided(positive,
+                         shape=(len(positive) - length + 1, length),
+                         strides=(stride, stride), writeable=False)[1:]
+    rows = max(1, block_size // length)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for start in range(0, len(windows), rows):
+            block = windows[start:start + rows]
+            pt = block.min(axis=1) + block.std(axis=1) * 3.0
+            ptd = np.empty(len(pt))
+            ptd.fill(2.0)
+            while True:
+                active = np.flatnonzero(ptd >= 1.0)
+                if not len(active):
+                    break
+                if len(active) == len(block):
+                    values = block
+                else:
+                    values = block[active]
+                below = values < pt[active, None]
+                count = below.sum(axis=1)
+                mean = np.where(below, values, 0.0).sum(axis=1) / count
+                var = np.where(below, (values - mean[:, None]) ** 2,
+                               0.0).sum(axis=1) / count
+                new_pt = mean + 3.0 * np.sqrt(var)
+                ptd[active] = np.abs(new_pt - pt[active])
+                pt[active] = new_pt
+            thresholds[positive_ix[length + start:
+                                   length + start + len(pt)]] = pt
+    return thresholds
+
+
+class BatchEyeEventParser(object):
+    """Parses fixation, saccade and blink events from an array of eye samples
+    that have already been recorded, e.g. read from the ioDataStore
+    BINOCULAR_EYE_SAMPLE or MONOCULAR_EYE_SAMPLE table.
+
+    The samples are classified the same way as by EyeTrackerEventParser,
+    which parses samples one at a time while they are being recorded, but
+    every step (monocular conversion, interpolation of missing data,
+    velocities, adaptive velocity thresholds and event segmentation) is
+    done for the whole array at once using numpy.
+
+    The kwargs are the same as for EyeTrackerEventParser. Only the
+    PassThroughFilter is supported as position_filter or velocity_filter.
+
+    Example::
+
+        parser = BatchEyeEventParser(display_device=dict(
+                                        mm_size=dict(width=500, height=280),
+                                        pixel_res=(1920, 1080),
+                                        eye_distance=550),
+                                     sampling_rate=1000,
+                                     adaptive_vel_thresh_history=2.0)
+        events = parser.parse(samples)
+        fixations = events[EventConstants.FIXATION_END]
+    """
+    filter_id = 23
+
+    def __init__(self, **kwargs):
+        self.vel_thresh_history_dur = kwargs.get(
+            'adaptive_vel_thresh_history', 3.0)
+        self.sampling_rate = kwargs.get('sampling_rate')
+        for filter_key in ('position_filter', 'velocity_filter'):
+            field_filter = kwargs.get(filter_key)
+            if field_filter and field_filter.get(
+                    'name', 'PassThroughFilter') != 'PassThroughFilter':
+                raise ValueError('BatchEyeEventParser only supports the '
+                                 'PassThroughFilter %s.' % filter_key)
+        display_device = kwargs.get('display_device')
+        mm_size = display_device.get('mm_size')
+        if mm_size:
+            mm_size = mm_size['width'], mm_size['height'],
+        self.visual_angle_calc = VisualAngleCalc(
+            mm_size, display_device.get('pixel_res'),
+            display_device.get('eye_distance'))
+        self.pix2deg = self.visual_angle_calc.pix2deg
+
+    @property
+    def history_length(self):
+        return int(self.vel_thresh_history_dur * self.sampling_rate)
+
+    def toMonocular(self, samples):
+        """Returns a monocular eye sample array for `samples` (with the
+        fields of MonocularEyeSampleEvent, but float fields as float64), and
+        a boolean array that is True for the samples with valid eye data.
+
+        Binocular samples are averaged the same way as by
+        EyeTrackerEventParser; the angle_x, angle_y and velocity fields have
+        not been calculated yet.
+        """
+        mono = np.zeros(len(samples), dtype=_SAMPLE_DTYPE)
+        status = samples['status']
+        if 'left_gaze_x' not in samples.dtype.names:
+            for field in mono.dtype.names:
+                mono[field] = samples[field]
+            return mono, status == 0
+
+        left_weight = np.ones(len(samples))
+        for status_value, weight in _LEFT_EYE_WEIGHT.items():
+            left_weight[status == status_value] = weight
+        for field in mono.dtype.names:
+            if field in samples.dtype.names:
+                mono[field] = samples[field]
+            elif field == 'eye':
+                mono[field] = LEFT_EYE
+            elif field.endswith('_type'):
+                mono[field] = samples['left_%s' % field]
+            else:
+                left = samples['left_%s' % field].astype(np.float64)
+                right = samples['right_%s' % field].astype(np.float64)
+                mono[field] = left * left_weight + right * (1.0 - left_weight)
+        mono['type'] = MONOCULAR_EYE_SAMPLE
+        return mono, status != 22
+
+    def processSamples(self, samples):
+        """Returns the monocular samples that would be parsed by
+        EyeTrackerEventParser for `samples`, with angles, velocities and
+        adaptive velocity thresholds (stored in raw_x and raw_y) calculated.
+
+        Missing data before the first and after the last valid sample is
+        dropped; missing data in between is linearly interpolated.
+
+        Returns:
+            tuple: (monocular eye sample array, valid sample mask)
+        """
+        mono, valid = self.toMonocular(samples)
+        valid_ix = np.flatnonzero(valid)
+        if not len(valid_ix):
+            return mono[:0], valid[:0]
+        first, last = valid_ix[0], valid_ix[-1]
+
+        ax, ay = self.pix2deg(mono['gaze_x'][valid], mono['gaze_y'][valid])
+        mono['angle_x'][valid] = ax
+        mono['angle_y'][valid] = ay
+        sample_ix = np.arange(first, last + 1)
+        for field in ('angle_x', 'angle_y', 'pupil_measure1'):
+            values = mono[field]
+            values[first:last + 1] = np.interp(sample_ix, valid_ix,
+                                               values[valid_ix])
+
+        # Velocities of the first sample that is parsed are calculated
+        # using the preceding (missing data) sample, as they are while
+        # recording.
+        start = max(first, 1)
+        dt = np.diff(mono['time'][start - 1:last + 1])
+        dx = np.abs(np.diff(mono['angle_x'][start - 1:last + 1])) / dt
+        dy = np.abs(np.diff(mono['angle_y'][start - 1:last + 1])) / dt
+        mono['velocity_x'][start:last + 1] = dx
+        mono['velocity_y'][start:last + 1] = dy
+        mono['velocity_xy'][start:last + 1] = np.hypot(dx, dy)
+
+        mono = mono[first:last + 1]
+        valid = valid[first:last + 1]
+        length = self.history_length
+        for vfield, tfield in (('velocity_x', 'raw_x'),
+                               ('velocity_y', 'raw_y')):
+            mono[tfield][valid] = adaptiveVelocityThresholds(
+                mono[vfield][valid], length)
+        return mono, valid
+
+    def sampleCategories(self, mono, valid):
+        """Returns the category of each processed sample: 'MIS', 'FIX' or
+        'SAC', like EyeTrackerEventParser.getSampleEventCategory().
+        """
+        with np.errstate(invalid='ignore'):
+            saccade = ((mono['velocity_x'] >= mono['raw_x']) |
+                       (mono['velocity_y'] >= mono['raw_y']))
+        categories = np.where(saccade, 'SAC', 'FIX')
+        categories[~valid] = 'MIS'
+        return categories
+
+    def parse(self, samples, as_type='numpy'):
+        """Parse the eye events of one recording of eye samples.
+
+        Args:
+            samples (ndarray): BinocularEyeSampleEvent or
+                MonocularEyeSampleEvent structured array, in time order.
+            as_type (str): 'numpy' (default) returns a dict of event type id:
+                structured array of events. 'list' returns a list of events,
+                each in list format, in the order EyeTrackerEventParser
+                would have created them.
+
+        Returns:
+            dict or list: the parsed events.
+
+        Event records are the same as those returned by the
+        EyeTrackerEventParser.create*EventArray() methods, except that
+        filter_id is set to the id of the parser. event_id is the id of the
+        sample the event was created for.
+        """
+        mono, valid = self.processSamples(samples)
+        categories = self.sampleCategories(mono, valid)
+        # Events start at every change of sample category; the samples
+        # before the first change are not part of any event.
+        starts = np.flatnonzero(categories[1:] != categories[:-1]) + 1
+        ends = starts[1:] - 1
+
+        events = OrderedDict()
+        positions = dict()
+        for category, start_class, end_class in (
+                ('FIX', FixationStartEvent, FixationEndEvent),
+                ('SAC', SaccadeStartEvent, SaccadeEndEvent),
+                ('MIS', BlinkStartEvent, BlinkEndEvent)):
+            cat_starts = starts[categories[starts] == category]
+            cat_closed = categories[starts[:-1]] == category
+            events[start_class.EVENT_TYPE_ID] = self._startEvents(
+                start_class, mono, cat_starts)
+            events[end_class.EVENT_TYPE_ID] = self._endEvents(
+                end_class, mono, starts[:-1][cat_closed], ends[cat_closed])
+            positions[start_class.EVENT_TYPE_ID] = cat_starts * 2 + 1
+            positions[end_class.EVENT_TYPE_ID] = (ends[cat_closed] + 1) * 2
+
+        if as_type == 'numpy':
+            return events
+        if as_type != 'list':
+            raise ValueError("as_type must be 'numpy' or 'list'.")
+        ordered = []
+        for event_type, event_array in events.items():
+            ordered.extend(zip(positions[event_type], event_array.tolist()))
+        ordered.sort(key=lambda pos_evt: pos_evt[0])
+        return [list(evt) for _pos, evt in ordered]
+
+    def _newEvents(self, event_class, mono, sample_ix):
+        events = np.zeros(len(sample_ix), dtype=event_class.NUMPY_DTYPE)
+        for field in _EVENT_HEADER_FIELDS:
+            events[field] = mono[field][sample_ix]
+        events['type'] = event_class.EVENT_TYPE_ID
+        events['filter_id'] = self.filter_id
+        events['status'] = mono['status'][sample_ix]
+        return events
+
+    def _startEvents(self, event_class, mono, start_ix):
+        events = self._newEvents(event_class, mono, start_ix)
+        if event_class is not BlinkStartEvent:
+            for field in _EVENT_SAMPLE_FIELDS:
+                events[field] = mono[field][start_ix]
+        return events
+
+    def _endEvents(self, event_class, mono, start_ix, end_ix):
+        events = self._newEvents(event_class, mono, end_ix)
+        events['duration'] = mono['time'][end_ix] - mono['time'][start_ix]
+        if event_class is BlinkEndEvent:
+            return events
+
+        for field in _EVENT_SAMPLE_FIELDS:
+            events['start_%s' % field] = mono[field][start_ix]
+            events['end_%s' % field] = mono[field][end_ix]
+
+        # Sums and peaks over the samples of each event. reduceat needs
+        # increasing indices, so each event is reduced from its own slice
+        # boundaries and every second result (the gap) is dropped.
+        bounds = np.column_stack((start_ix, end_ix + 1)).ravel()
+        if len(bounds) and bounds[-1] == len(mono):
+            bounds = bounds[:-1]
+        count = end_ix - start_ix + 1
+
+        def average(field):
+            return np.add.reduceat(mono[field].astype(np.float64),
+                                   bounds)[::2] / count
+
+        def peak(field):
+            return np.maximum.reduceat(mono[field], bounds)[::2]
+
+        if len(start_ix):
+            for field in ('velocity_x', 'velocity_y', 'velocity_xy'):
+                events['average_%s' % field] = average(field)
+                events['peak_%s' % field] = peak(field)
+            if event_class is FixationEndEvent:
+                for field in ('gaze_x', 'gaze_y', 'pupil_measure1'):
+                    events['average_%s' % field] = average(field)
+                events['average_pupil_measure1_type'] = mono[
+                    'pupil_measure1_type'][end_ix]
+        if event_class is SaccadeEndEvent:
+            x_diff = events['end_gaze_x'] - events['start_gaze_x']
+            y_diff = events['end_gaze_y'] - events['start_gaze_y']
+            events['amplitude_x'] = x_diff
+            events['amplitude_y'] = y_diff
+            events['angle'] = np.rad2deg(np.arctan2(y_diff, x_diff))
+        return events
+
+
+def _parseSession(args):
+    samples, parser_kwargs, as_type = args
+    return BatchEyeEventParser(**parser_kwargs).parse(samples, as_type)
+
+
+def parseSessions(samples, processes=None, as_type='numpy', **kwargs):
+    """Parse the eye events of each session in an array of eye samples,
+    such as all the rows of the ioDataStore BINOCULAR_EYE_SAMPLE table::
+
+        samples = hub_file.getEventTable(
+            EventConstants.BINOCULAR_EYE_SAMPLE).read()
+        session_events = parseSessions(samples, display_device=...,
+                                       sampling_rate=1000)
+
+    Args:
+        samples (ndarray): Eye sample structured array.
+        processes (int): Number of processes used to parse sessions in
+            parallel. Default is the number of cpu's; 1 parses every
+            session in the current process.
+        as_type (str): Passed to BatchEyeEventParser.parse().
+        kwargs: BatchEyeEventParser settings.
+
+    Returns:
+        dict: session_id: parsed events of the session.
+    """
+    session_ids = np.unique(samples['session_id'])
+    jobs = []
+    for session_id in session_ids:
+        session_samples = samples[samples['session_id'] == session_id]
+        order = np.argsort(session_samples['time'], kind='mergesort')
+        jobs.append((session_samples[order], kwargs, as_type))
+
+    if processes == 1 or len(jobs) < 2:
+        results = [_parseSession(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(
+            min(processes or multiprocessing.cpu_count(), len(jobs)))
+        try:
+            results = pool.map(_parseSession, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    return OrderedDict(zip(session_ids.tolist(), results))
@@ -453,6 +453,14 @@ class EyeTracker(EyeTrackerDevice):
         #print2err("CAL_RESULT: ",cal_result)
         return cal_result
         
+    def _getSelectableFD(self):
+        """The GP3 sends samples over its socket connection, so when the
+        ioHub Server runs event driven, _poll() is called when there is new
+        data to read."""
+        if self._gp3 and self.isRecordingEnabled():
+            return self._gp3.fileno()
+        return None
+
     def _poll(self):
         """This method is called by gp3 every n msec based on the polling
         interval set in the eye tracker config.
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Part of the psychopy.iohub library.
+# Copyright (C) 2012-2016 iSolver Software Solutions
+# Distributed under the terms of the GNU General Public License (GPL).
+"""Counters, timers and histograms that the ioHub Server can keep about its
+own performance, e.g. how long processing the events of each device, event
+filter processing, ioDataStore writes and experiment process requests take.
+
+Metrics are only collected when `metrics: True` is set in the ioHub config.
+They can be retrieved by the experiment process using
+ioHubConnection.getMetrics(), and are saved to the ioDataStore file (if
+enabled) when it is closed.
+"""
+from __future__ import division, absolute_import
+
+from builtins import object
+from .devices import Computer
+
+getTime = Computer.getTime
+
+
+class Histogram(object):
+    """High dynamic range histogram of values >= 0, in the style of
+    HdrHistogram: values are counted in buckets that are a constant fraction
+    of the value wide, so any value from `unit` up is recorded with a
+    relative error of less than 1 / 2 ** (sub_bucket_bits - 1) (0.8% by
+    default), using a few hundred buckets at most.
+
+    Args:
+        unit (float): Smallest value that can be distinguished from 0, in
+            the units of the recorded values. Default is 1 usec for
+            durations in sec.msec.
+        sub_bucket_bits (int): Number of bits of precision of each value.
+    """
+    PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+    def __init__(self, unit=1e-6, sub_bucket_bits=8):
+        self.unit = unit
+        self._sub_bucket_bits = sub_bucket_bits
+        self.reset()
+
+    def reset(self):
+        self._counts = dict()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        """Add value to the histogram. Negative values are counted as 0 but
+        are reported as the min."""
+        index = self._bucketIndex(max(int(value / self.unit), 0))
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def _bucketIndex(self, n):
+        bits = self._sub_bucket_bits
+        shift = n.bit_length() - bits
+        if shift <= 0:
+            return n
+        return (shift << bits) + (n >> shift)
+
+    def _bucketRange(self, index):
+        """Lowest and highest value counted in the bucket."""
+        bits = self._sub_bucket_bits
+        shift = index >> bits
+        if shift == 0:
+            low, high = index, index + 1
+        else:
+            mantissa = index & ((1 << bits) - 1)
+            low, high = mantissa << shift, (mantissa + 1) << shift
+        return low * self.unit, high * self.unit
+
+    def percentile(self, percent):
+        """Value that percent % of the recorded values are less than or
+        equal to (the middle of the bucket the value was counted in)."""
+        if not self.count:
+            return None
+        target = max(self.count * percent / 100.0, 1)
+        counted = 0
+        for index in sorted(self._counts):
+            counted += self._counts[index]
+            if counted >= target:
+                low, high = self._bucketRange(index)
+                return min(max((low + high) / 2.0, self.min), self.max)
+        return self.max
+
+    def asDict(self):
+        result = dict(count=self.count, total=self.total, min=self.min,
+                      max=self.max,
+                      mean=self.total / self.count if self.count else None)
+        for percent in self.PERCENTILES:
+            result['p%g' % percent] = self.percentile(percent)
+        return result
+
+
+class Timer(object):
+    """Records the duration (sec.msec) of a `with timer:` block in a
+    histogram. A new Timer is used for each block, so that blocks timed in
+    the same histogram can overlap (e.g. requests handled in different
+    greenlets)."""
+    __slots__ = ('histogram', '_start_time')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = getTime()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.record(getTime() - self._start_time)
+        return False
+
+
+class MetricsRegistry(object):
+    """Named counters and histograms. Names are dot separated, starting with
+    what is being measured, e.g. 'device.Keyboard.process_events',
+    'filter.EyeTrackerEventParser.process', 'datastore.write' or
+    'request.GET_EVENTS'.
+
+    Example::
+
+        metrics = MetricsRegistry()
+        metrics.count('datastore.events_written', 20)
+        with metrics.timer('datastore.write'):
+            table.append(rows)
+        print(metrics.asDict())
+    """
+
+    def __init__(self):
+        self._counters = dict()
+        self._histograms = dict()
+
+    def count(self, name, n=1):
+        self._counters[name] = self._counters.get(name, 0) + n
+
+    def histogram(self, name):
+        hist = self._histograms.get(name)
+        if hist is None:
+            hist = self._histograms[name] = Histogram()
+        return hist
+
+    def record(self, name, value):
+        self.histogram(name).record(value)
+
+    def timer(self, name):
+        """Returns a new Timer that records the duration of a `with` block
+        in the histogram name."""
+        return Timer(self.histogram(name))
+
+    def reset(self):
+        self._counters.clear()
+        for hist in self._histograms.values():
+            hist.reset()
+
+    def asDict(self):
+        """Returns a dict with a 'counters' dict of name: count and a
+        'histograms' dict of name: dict of count, total, min, max, mean and
+        p50, p90, p99 and p99.9 percentiles."""
+        return dict(counters=dict(self._counters),
+                    histograms=dict((name, hist.asDict())
+                                    for name, hist in self._histograms.items()
+                                    if hist.count))
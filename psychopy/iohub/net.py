@@ -4,9 +4,11 @@
 # Distributed under the terms of the GNU General Public License (GPL).
 from __future__ import division, absolute_import
 
+import os
 import struct
 from weakref import proxy
 
+import numpy as np
 from gevent import sleep, Greenlet
 import msgpack
 try:
@@ -17,7 +19,13 @@ except ImportError:
     print2err("Warning: msgpack_numpy could not be imported. ",
               "This may cause issues for iohub.")
 
-from .devices import Computer
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+from .constants import EventConstants
+from .devices import Computer, DeviceEvent
 from .errors import print2err, printExceptionDetailsToStdErr
 from .util import NumPyRingBuffer as RingBuffer
 
@@ -120,6 +128,205 @@ class UDPClientConnection(SocketConnection):
         self.sock.settimeout(timeout)
         self.sock.setblocking(blocking)
 
+##### SHARED MEMORY EVENT BUFFER ######
+
+
+class SharedEventBuffer(object):
+    """A single producer, single consumer ring buffer of device events held
+    in shared memory. The ioHub Server writes the events it collects and the
+    experiment process reads them, without a UDP request - reply and without
+    msgpack encoding.
+
+    Each slot holds one event: the event type id in the first byte and the
+    event values, packed using the NUMPY_DTYPE of the event class, from
+    byte 8 on. The header holds the number of events written (only changed by
+    the server), the number of events read (only changed by the experiment
+    process), the number of events that could not be written, the number of
+    slots, the slot size and the id of the process that created the buffer.
+
+    Events that could not be written (because the buffer was full, or because
+    an event does not fit the record layout of its class) are counted, and the
+    server puts them in its global event buffer instead, so the reader knows
+    when it also needs to get events over UDP.
+
+    Requires multiprocessing.shared_memory (Python 3.8+), see isSupported().
+    """
+    HEADER_SIZE = 64
+    DATA_OFFSET = 8
+    _WRITTEN, _READ, _NOT_WRITTEN, _SLOTS, _SLOT_SIZE, _PID = range(6)
+
+    def __init__(self, name=None, slots=4096, slot_size=256):
+        """Creates a new shared event buffer with the given number of slots
+        if name is None, otherwise opens the existing buffer called name."""
+        if shared_memory is None:
+            raise RuntimeError('SharedEventBuffer requires Python 3.8+')
+        self._owner = name is None
+        if self._owner:
+            size = self.HEADER_SIZE + slots * slot_size
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._header = np.ndarray((6,), np.uint64, buffer=self._shm.buf)
+        if self._owner:
+            self._header[:] = (0, 0, 0, slots, slot_size, os.getpid())
+        elif int(self._header[self._PID]) != os.getpid():
+            _untrackSharedMemory(self._shm)
+        self.slots = int(self._header[self._SLOTS])
+        self.slot_size = int(self._header[self._SLOT_SIZE])
+        self._slots = np.ndarray((self.slots, self.slot_size), np.uint8,
+                                 buffer=self._shm.buf,
+                                 offset=self.HEADER_SIZE)
+        self._notWritten = int(self._header[self._NOT_WRITTEN])
+        self._formats = {}
+
+    @staticmethod
+    def isSupported():
+        return shared_memory is not None
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def _format(self, etype):
+        fmt = self._formats.get(etype)
+        if fmt is None:
+            dtype = EventConstants.getClass(etype).NUMPY_DTYPE
+            strings = [i for i in range(len(dtype)) if dtype[i].kind == 'S']
+            fmt = self._formats[etype] = dtype, strings
+        return fmt
+
+    def write(self, event):
+        """Add an event (in list format) to the buffer. Returns False if the
+        event could not be written, in which case it must be sent some
+        other way."""
+        header = self._header
+        written = int(header[self._WRITTEN])
+        try:
+            if written - int(header[self._READ]) >= self.slots:
+                raise IndexError('SharedEventBuffer is full')
+            etype = event[DeviceEvent.EVENT_TYPE_ID_INDEX]
+            dtype, strings = self._format(etype)
+            end = self.DATA_OFFSET + dtype.itemsize
+            if end > self.slot_size:
+                raise ValueError('Event does not fit in a slot')
+            values = list(event)
+            for i in strings:
+                v = values[i]
+                if not isinstance(v, bytes):
+                    v = values[i] = v.encode('utf-8')
+                if len(v) > dtype[i].itemsize:
+                    raise ValueError('Event string value too long')
+            slot = self._slots[written % self.slots]
+            slot[self.DATA_OFFSET:end].view(dtype)[0] = tuple(values)
+            slot[0] = etype
+        except Exception:  # pylint: disable=broad-except
+            header[self._NOT_WRITTEN] += 1
+            return False
+        # only make the event visible to the reader once it is complete
+        header[self._WRITTEN] = written + 1
+        return True
+
+    def read(self):
+        """Remove and return all events in the buffer, in list format."""
+        header = self._header
+        read = int(header[self._READ])
+        written = int(header[self._WRITTEN])
+        events = []
+        for n in range(read, written):
+            slot = self._slots[n % self.slots]
+            dtype, strings = self._format(int(slot[0]))
+            end = self.DATA_OFFSET + dtype.itemsize
+            values = list(slot[self.DATA_OFFSET:end].view(dtype)[0].item())
+            for i in strings:
+                values[i] = values[i].decode('utf-8')
+            events.append(values)
+        header[self._READ] = written
+        return events
+
+    def readArrays(self):
+        """Remove all events from the buffer, returning a dict holding one
+        numpy structured array (using the NUMPY_DTYPE of the event class)
+        per event type id. No Python object is created for each event.
+
+        The arrays are copies of the events (so they stay valid when the
+        buffer is written to again), sorted by hub time, the order in which
+        ioHubConnection.getEvents() returns events."""
+        header = self._header
+        read = int(header[self._READ])
+        written = int(header[self._WRITTEN])
+        start = read % self.slots
+        end = start + written - read
+        if end <= self.slots:
+            block = self._slots[start:end]
+        else:
+            block = np.concatenate((self._slots[start:],
+                                    self._slots[:end - self.slots]))
+        arrays = {}
+        types = block[:, 0]
+        for etype in np.unique(types):
+            dtype, _ = self._format(int(etype))
+            end = self.DATA_OFFSET + dtype.itemsize
+            records = block[types == etype, self.DATA_OFFSET:end]
+            evt_array = records.view(dtype).ravel()
+            times = evt_array[dtype.names[DeviceEvent.EVENT_HUB_TIME_INDEX]]
+            if (times[1:] < times[:-1]).any():
+                evt_array = evt_array[np.argsort(times, kind='mergesort')]
+            arrays[int(etype)] = evt_array
+        header[self._READ] = written
+        return arrays
+
+    def unreadEventTypes(self):
+        """Event type ids of the events that have not been read yet,
+        without removing them from the buffer."""
+        header = self._header
+        read = int(header[self._READ])
+        written = int(header[self._WRITTEN])
+        return [int(self._slots[n % self.slots][0])
+                for n in range(read, written)]
+
+    def hasMissedEvents(self):
+        """True if events could not be written to the buffer since the last
+        time this was called."""
+        notWritten = int(self._header[self._NOT_WRITTEN])
+        if notWritten != self._notWritten:
+            self._notWritten = notWritten
+            return True
+        return False
+
+    def clear(self):
+        """Discard all unread events (call from the reading process)."""
+        self._header[self._READ] = self._header[self._WRITTEN]
+        self._notWritten = int(self._header[self._NOT_WRITTEN])
+
+    def close(self):
+        if self._shm is None:
+            return
+        # views of the shared memory must be released before closing it
+        self._header = self._slots = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+
+def _untrackSharedMemory(shm):
+    # On posix each process that opens a shared memory block registers it
+    # with the resource tracker, which unlinks it when that process ends.
+    # Only the creator (the ioHub Server) should do that.
+    if os.name != 'posix':
+        return
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')  # pylint: disable=protected-access
+    except Exception:  # pylint: disable=broad-except
+        pass
+
 ##### TIME SYNC CLASS ######
 
 
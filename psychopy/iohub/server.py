@@ -13,6 +13,8 @@ from collections import deque, OrderedDict
 
 import msgpack
 import gevent
+import gevent.event
+import gevent.select
 from gevent.server import DatagramServer
 from gevent import Greenlet
 
@@ -25,13 +27,14 @@ except ImportError:
 from past.builtins import basestring, unicode
 from . import IOHUB_DIRECTORY, EXP_SCRIPT_DIRECTORY, _DATA_STORE_AVAILABLE
 from .errors import print2err, printExceptionDetailsToStdErr, ioHubError
-from .net import MAX_PACKET_SIZE
+from .net import MAX_PACKET_SIZE, SharedEventBuffer
 from .util import convertCamelToSnake, win32MessagePump
 from .util import yload, yLoader
 from .constants import DeviceConstants, EventConstants
-from .devices import DeviceEvent, import_device
+from .devices import Device, DeviceEvent, import_device
 from .devices import Computer
 from .devices.deviceConfigValidation import validateDeviceConfiguration
+from .metrics import MetricsRegistry
 getTime = Computer.getTime
 
 MAX_PACKET_SIZE = 64 * 1024
@@ -76,6 +79,19 @@ class udpServer(DatagramServer):
         if not isinstance(request_type, unicode):
             request_type = unicode(request_type, 'utf-8') # convert bytes to string for compatibility
 
+        metrics = self.iohub.metrics
+        if metrics is None:
+            return self._handleRequest(request_type, request, replyTo)
+        label = request_type
+        if request_type == 'RPC' and request:
+            callable_name = request[0]
+            if isinstance(callable_name, bytes):
+                callable_name = callable_name.decode('utf-8')
+            label = 'RPC.%s' % callable_name
+        with metrics.timer('request.%s' % label):
+            return self._handleRequest(request_type, request, replyTo)
+
+    def _handleRequest(self, request_type, request, replyTo):
         if request_type == 'SYNC_REQ':
             self.sendResponse(['SYNC_REPLY', getTime()], replyTo)
             return True
@@ -89,6 +105,8 @@ class udpServer(DatagramServer):
             return True
         elif request_type == 'GET_EVENTS':
             return self.handleGetEvents(replyTo)
+        elif request_type == 'WAIT_FOR_EVENTS':
+            return self.handleWaitForEvents(request, replyTo)
         elif request_type == 'EXP_DEVICE':
             return self.handleExperimentDeviceRequest(request, replyTo)
         elif request_type == 'CUSTOM_TASK':
@@ -221,6 +239,31 @@ class udpServer(DatagramServer):
             self.sendResponse('IOHUB_GET_EVENTS_ERROR', replyTo)
             return False
 
+    def handleWaitForEvents(self, request, replyTo):
+        """Hold the request until an event from one of the requested device
+        types is available or the timeout has passed, then reply with the
+        events in the global event buffer (like handleGetEvents). Each
+        request is handled in its own greenlet, so events keep being
+        processed while the request waits."""
+        try:
+            device_types = request.pop(0)
+            timeout = request.pop(0)
+            found = self.iohub.waitForEvents(device_types, timeout)
+            currentEvents = list(self.iohub.eventBuffer)
+            self.iohub.eventBuffer.clear()
+            if currentEvents:
+                currentEvents = sorted(
+                    currentEvents, key=itemgetter(
+                        DeviceEvent.EVENT_HUB_TIME_INDEX))
+            self.sendResponse(('WAIT_FOR_EVENTS_RESULT', found,
+                               currentEvents or None), replyTo)
+            return True
+        except Exception:
+            print2err('IOHUB_WAIT_FOR_EVENTS_ERROR')
+            printExceptionDetailsToStdErr()
+            self.sendResponse('IOHUB_WAIT_FOR_EVENTS_ERROR', replyTo)
+            return False
+
     def handleExperimentDeviceRequest(self, request, replyTo):
         request_type = request.pop(0)
         if not isinstance(request_type, unicode):
@@ -484,13 +527,44 @@ class udpServer(DatagramServer):
     def setProcessAffinity(processorList):
         return Computer.setCurrentProcessAffinity(processorList)
 
+    def getSharedEventBufferName(self):
+        """Name of the shared memory event buffer, or None if events are
+        only available over UDP."""
+        if self.iohub.sharedEventBuffer:
+            return self.iohub.sharedEventBuffer.name
+        return None
+
     def flushIODataStoreFile(self):
         dsfile = self.iohub.dsfile
         if dsfile:
-            dsfile.emrtFile.flush()
+            dsfile.flush()
             return True
         return False
 
+    def getIODataStoreWriteStats(self):
+        dsfile = self.iohub.dsfile
+        if dsfile:
+            return dsfile.getWriteStats()
+        return None
+
+    def getEventLatencyHistograms(self):
+        metrics = self.iohub.metrics
+        if metrics is None:
+            return None
+        histograms = metrics.asDict()['histograms']
+        return {name[len('device.'):-len('.latency')]: hist
+                for name, hist in histograms.items()
+                if name.startswith('device.') and name.endswith('.latency')}
+
+    def getMetrics(self, reset=False):
+        metrics = self.iohub.metrics
+        if metrics is None:
+            return None
+        result = metrics.asDict()
+        if reset:
+            metrics.reset()
+        return result
+
     def shutDown(self):
         try:
             self.setPriority('normal')
@@ -504,10 +578,11 @@ class udpServer(DatagramServer):
 
 
 class DeviceMonitor(Greenlet):
-    def __init__(self, device, sleep_interval):
+    def __init__(self, device, sleep_interval, event_driven=False):
         Greenlet.__init__(self)
         self.device = device
         self.sleep_interval = sleep_interval
+        self.event_driven = event_driven
         self.running = False
 
     def _run(self):
@@ -516,8 +591,19 @@ class DeviceMonitor(Greenlet):
         while self.running is True:
             stime = ctime()
             self.device._poll()
-            i = self.sleep_interval - (ctime() - stime)
-            gevent.sleep(max(0,i))
+            fd = None
+            if self.event_driven:
+                fd = self.device._getSelectableFD()
+            if fd is None:
+                i = self.sleep_interval - (ctime() - stime)
+                gevent.sleep(max(0,i))
+            else:
+                # Poll again as soon as there is new data, or after at
+                # most SELECT_TIMEOUT so the device is still polled when
+                # the file descriptor changes.
+                gevent.select.select([fd], [], [], self.SELECT_TIMEOUT)
+
+    SELECT_TIMEOUT = 0.1
 
     def __del__(self):
         self.device = None
@@ -551,6 +637,22 @@ class ioServer(object):
         self._all_dev_conf_errors = []
         ebuf_sz = config.get('global_event_buffer', 2048)
         ioServer.eventBuffer = deque(maxlen=ebuf_sz)
+        self.sharedEventBuffer = None
+        shm_sz = config.get('shared_memory_event_buffer', 0)
+        if shm_sz:
+            self._initSharedEventBuffer(shm_sz)
+
+        self.metrics = None
+        if config.get('metrics', False):
+            self.metrics = MetricsRegistry()
+        self.eventDriven = config.get('event_driven', False)
+        self._eventsReady = None
+        self._eventsReadyWatcher = None
+        # (device type ids, gevent Event) of each waitForEvents() request
+        self._eventWaiters = []
+        self._eventDeviceTypes = dict()
+        if self.eventDriven:
+            self._initEventsReadySignal()
 
         self._running = True
         # start UDP service
@@ -561,6 +663,30 @@ class ioServer(object):
 
         self._addPubSubListeners()
 
+    def _initSharedEventBuffer(self, slots):
+        if not SharedEventBuffer.isSupported():
+            self.log('Shared memory event buffer requires Python 3.8+; '
+                     'events will be sent over UDP.', 'WARNING')
+            return
+        try:
+            self.sharedEventBuffer = SharedEventBuffer(slots=slots)
+            self.log('Shared memory event buffer: {}'.format(
+                self.sharedEventBuffer.name))
+        except Exception:
+            print2err('Error creating shared memory event buffer....')
+            printExceptionDetailsToStdErr()
+
+    def _initEventsReadySignal(self):
+        """In event driven mode, devices wake the event processing tasklet
+        each time they add a native event. A gevent async watcher is used
+        since some devices add events from their own threads."""
+        loop = gevent.get_hub().loop
+        new_watcher = getattr(loop, 'async_', None) or getattr(loop, 'async')
+        self._eventsReady = gevent.event.Event()
+        self._eventsReadyWatcher = new_watcher()
+        self._eventsReadyWatcher.start(self._eventsReady.set)
+        Device._native_events_ready = self._eventsReadyWatcher.send
+
     def _initDataStore(self, config, script_dir):
         try:
             # initial dataStore setup
@@ -835,7 +961,8 @@ class ioServer(object):
 
             if 'device_timer' in dev_conf:
                 interval = dev_conf['device_timer'].get('interval', 0.001)
-                dPoller = DeviceMonitor(dev_instance, interval)
+                dPoller = DeviceMonitor(dev_instance, interval,
+                                        self.eventDriven)
                 self.deviceMonitors.append(dPoller)
                 ltxt = '%s timer period: %.3f' % (dev_cls_name, interval)
                 self.log(ltxt)
@@ -883,53 +1010,137 @@ class ioServer(object):
             from .datastore import DataStoreFile
             self.closeDataStoreFile()
             self.dsfile = DataStoreFile(fname, fpath, fmode, iohub_settings)
+            self.dsfile.metrics = self.metrics
 
     def closeDataStoreFile(self):
         if self.dsfile:
             pytablesfile = self.dsfile
             self.dsfile = None
             pytablesfile.flush()
+            if self.metrics is not None and pytablesfile.active_session_id:
+                pytablesfile.saveMetrics(pytablesfile.active_session_id,
+                                         self.metrics.asDict())
             pytablesfile.close()
 
     def processEventsTasklet(self, sleep_interval):
+        """Process device events every sleep_interval sec.msec or, when
+        the server is event driven, as soon as a device has new events (and
+        at least every sleep_interval)."""
+        ready = self._eventsReady
         while self._running:
             stime = Computer.getTime()
             self.processDeviceEvents()
+            if self.dsfile:
+                # save buffered events while the devices are quiet
+                self.dsfile.writePendingEventsIfIdle()
+            if ready is not None:
+                ready.wait(sleep_interval)
+                ready.clear()
+                continue
             dur = sleep_interval - (Computer.getTime() - stime)
             gevent.sleep(max(0, dur))
 
     def processDeviceEvents(self):
+        metrics = self.metrics
         for device in self.devices:
-            evt = []
-            try:
-                events = device._getNativeEventBuffer()
-                while events:
-                    evt = device._getIOHubEventObject(events.popleft())
-                    if evt:
-                        etype = evt[DeviceEvent.EVENT_TYPE_ID_INDEX]
-                        for l in device._getEventListeners(etype):
-                            l._handleEvent(evt)
-
-                filtered_events = []
-                for efilter in device._filters.values():
-                    filtered_events.extend(efilter._removeOutputEvents())
-                for evt in filtered_events:
+            events = device._getNativeEventBuffer()
+            if metrics is None or not events:
+                self._processEvents(device)
+                continue
+            dname = device.__class__.__name__
+            metrics.count('device.%s.events' % dname, len(events))
+            with metrics.timer('device.%s.process_events' % dname):
+                self._processEvents(
+                    device, metrics.histogram('device.%s.latency' % dname))
+
+    def _processEvents(self, device, latency=None):
+        """Forward the native events of device. If latency is a metrics
+        Histogram, the time from each event's time to now is recorded in
+        it."""
+        evt = []
+        try:
+            events = device._getNativeEventBuffer()
+            if latency is not None:
+                now = getTime()
+            while events:
+                evt = device._getIOHubEventObject(events.popleft())
+                if evt:
                     etype = evt[DeviceEvent.EVENT_TYPE_ID_INDEX]
+                    if latency is not None:
+                        latency.record(
+                            now - evt[DeviceEvent.EVENT_HUB_TIME_INDEX])
                     for l in device._getEventListeners(etype):
                         l._handleEvent(evt)
 
-            except Exception:
-                print2err('Error in processDeviceEvents: ', device,
-                          ' : ', len(events))
-                if evt:
-                    etype = evt[DeviceEvent.EVENT_TYPE_ID_INDEX]
-                    ename = EventConstants.getName(etype)
-                    print2err('Event type ID: ', etype, ' : ', ename)
-                printExceptionDetailsToStdErr()
-                print2err('--------------------------------------')
+            filtered_events = []
+            for efilter in device._filters.values():
+                filtered_events.extend(efilter._removeOutputEvents())
+            for evt in filtered_events:
+                etype = evt[DeviceEvent.EVENT_TYPE_ID_INDEX]
+                for l in device._getEventListeners(etype):
+                    l._handleEvent(evt)
+
+        except Exception:
+            print2err('Error in processDeviceEvents: ', device,
+                      ' : ', len(events))
+            if evt:
+                etype = evt[DeviceEvent.EVENT_TYPE_ID_INDEX]
+                ename = EventConstants.getName(etype)
+                print2err('Event type ID: ', etype, ' : ', ename)
+            printExceptionDetailsToStdErr()
+            print2err('--------------------------------------')
 
     def _handleEvent(self, event):
-        self.eventBuffer.append(event)
+        shared = self.sharedEventBuffer
+        if shared is None or not shared.write(event):
+            self.eventBuffer.append(event)
+        if self._eventWaiters:
+            device_type = self._eventDeviceType(
+                event[DeviceEvent.EVENT_TYPE_ID_INDEX])
+            for device_types, ready in self._eventWaiters:
+                if device_types is None or device_type in device_types:
+                    ready.set()
+
+    def _eventDeviceType(self, event_type):
+        """DeviceConstants id of the device type that creates events of
+        event_type."""
+        device_type = self._eventDeviceTypes.get(event_type)
+        if device_type is None:
+            event_class = EventConstants.getClass(event_type)
+            parent = getattr(event_class, 'PARENT_DEVICE', None)
+            device_type = getattr(parent, 'DEVICE_TYPE_ID', None)
+            self._eventDeviceTypes[event_type] = device_type
+        return device_type
+
+    def waitForEvents(self, device_types=None, timeout=None):
+        """Block the calling greenlet until an event from one of the
+        device_types (DeviceConstants ids, None for any device) is waiting
+        to be sent to the experiment process, or until timeout sec.msec have
+        passed (None waits until an event arrives).
+
+        Returns:
+            bool: True if a matching event is available.
+        """
+        if device_types is not None:
+            device_types = set(device_types)
+        self.processDeviceEvents()
+        pending = [e[DeviceEvent.EVENT_TYPE_ID_INDEX]
+                   for e in self.eventBuffer]
+        if self.sharedEventBuffer is not None:
+            pending.extend(self.sharedEventBuffer.unreadEventTypes())
+        for event_type in pending:
+            if (device_types is None or
+                    self._eventDeviceType(event_type) in device_types):
+                return True
+        if timeout is not None and timeout <= 0:
+            return False
+
+        waiter = (device_types, gevent.event.Event())
+        self._eventWaiters.append(waiter)
+        try:
+            return waiter[1].wait(timeout)
+        finally:
+            self._eventWaiters.remove(waiter)
 
     def clearEventBuffer(self, call_proc_events=True):
         if call_proc_events is True:
@@ -974,11 +1185,24 @@ class ioServer(object):
             while self.deviceMonitors:
                 self.deviceMonitors.pop(0).running = False
 
+            # release any waitForEvents() requests
+            for _, ready in self._eventWaiters:
+                ready.set()
+
             if self.eventBuffer:
                 self.clearEventBuffer()
 
             self.closeDataStoreFile()
 
+            if self.sharedEventBuffer:
+                self.sharedEventBuffer.close()
+                self.sharedEventBuffer = None
+
+            if self._eventsReadyWatcher:
+                Device._native_events_ready = None
+                self._eventsReadyWatcher.stop()
+                self._eventsReadyWatcher = None
+
             while self.devices:
                 self.devices.pop(0)._close()
         except Exception:
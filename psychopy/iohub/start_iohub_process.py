@@ -59,13 +59,24 @@ def run(rootScriptPathDir, configFilePath):
         msgpump_interval = s.config.get('msgpump_interval', 0.001)
         glets = []
 
-        tlet = gevent.spawn(s.pumpMsgTasklet, msgpump_interval)
-        glets.append(tlet)
+        # The message pump is only needed on Windows when event driven
+        if not s.eventDriven or Computer.platform == 'win32':
+            tlet = gevent.spawn(s.pumpMsgTasklet, msgpump_interval)
+            glets.append(tlet)
         for m in s.deviceMonitors:
             m.start()
             glets.append(m)
 
-        tlet = gevent.spawn(s.processEventsTasklet, 0.01)
+        # without a shared memory event buffer, events are also processed
+        # whenever the experiment process asks for them
+        evt_interval = 0.01
+        if s.eventDriven:
+            # devices signal new events; the interval is only the longest
+            # time to wait when no device does.
+            evt_interval = 0.05
+        elif s.sharedEventBuffer:
+            evt_interval = msgpump_interval
+        tlet = gevent.spawn(s.processEventsTasklet, evt_interval)
         glets.append(tlet)
 
         if Computer.psychopy_process:
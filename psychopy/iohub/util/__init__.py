@@ -513,6 +513,24 @@ class NumPyRingBuffer(object):
         self._npa[(i % self.max_size) + self.max_size] = element
         self._index += 1
 
+    def extend(self, elements):
+        """Add each element of the elements array to the end of the
+        RingBuffer, in order. This has the same result as calling append()
+        for each element, but only the last max_size elements are copied.
+
+        :param numpy.array elements: Elements to add to the RingBuffer.
+        :returns None:
+
+        """
+        elements = numpy.asarray(elements, dtype=self._dtype)
+        count = len(elements)
+        elements = elements[-self.max_size:]
+        ix = (self._index + count - len(elements) +
+              numpy.arange(len(elements))) % self.max_size
+        self._npa[ix] = elements
+        self._npa[ix + self.max_size] = elements
+        self._index += count
+
     def getElements(self):
         """Return the numpy array being used by the RingBuffer, the length of
         which will be equal to the number of elements added to the list, or the
@@ -523,6 +541,8 @@ class NumPyRingBuffer(object):
         :returns numpy.array: The array of data elements that make up the Ring Buffer.
 
         """
+        if self._index < self.max_size:
+            return self._npa[:self._index]
         return self._npa[
             self._index %
             self.max_size:(
@@ -29,19 +29,23 @@ messages, (which PsychoPy doesn't use) using the commands::
 """
 
 # Much of the code below is based conceptually, if not syntactically, on the
-# python logging module but it's simpler (no threading) and maintaining a
-# stack of log entries for later writing (don't want files written while
-# drawing)
+# python logging module but it's simpler (no threading by default) and
+# maintaining a stack of log entries for later writing (don't want files
+# written while drawing). Optionally a background thread can do the writing
+# (see :func:`startBackgroundWriter`)
 
 from __future__ import absolute_import, print_function
 
 from builtins import object
 from past.builtins import basestring
 from os import path
+from collections import deque
 import atexit
 import sys
 import codecs
 import locale
+import threading
+import numpy
 from psychopy import clock
 from psychopy.constants import PY3
 
@@ -228,6 +232,181 @@ class LogFile(object):
             pass
 
 
+class _LogHistory(object):
+    """The entries that a :class:`_Logger` has already written.
+
+    Entries are held in a ring buffer alongside arrays of their times and
+    levels so that they can be selected (see :meth:`select`) without
+    looping over the entries themselves. By default everything is kept (as
+    in previous versions), but the history can be limited to the most
+    recent `maxEntries` and/or to entries no more than `maxAge` seconds
+    older than the most recent one.
+    """
+
+    def __init__(self, maxEntries=None, maxAge=None):
+        super(_LogHistory, self).__init__()
+        self.maxEntries = maxEntries
+        self.maxAge = maxAge
+        self.clear()
+
+    def clear(self):
+        """Remove all entries from the history
+        """
+        if self.maxEntries:
+            capacity = int(self.maxEntries)
+        else:
+            capacity = 256  # will grow as needed
+        self._t = numpy.zeros(capacity, dtype=numpy.float64)
+        self._level = numpy.zeros(capacity, dtype=numpy.int32)
+        self._entries = numpy.empty(capacity, dtype=object)
+        self._start = 0
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return iter(self._ordered(self._entries))
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return list(self._ordered(self._entries)[item])
+        if item < 0:
+            item += self._n
+        if not 0 <= item < self._n:
+            raise IndexError("log history index out of range")
+        return self._entries[(self._start + item) % len(self._entries)]
+
+    def __repr__(self):
+        return "<_LogHistory of %i entries>" % self._n
+
+    def _ordered(self, arr):
+        """Return the used part of a ring array `arr`, oldest first
+        """
+        stop = self._start + self._n
+        if stop <= len(arr):
+            return arr[self._start:stop]
+        return numpy.concatenate(
+            [arr[self._start:], arr[:stop - len(arr)]])
+
+    def _grow(self, needed):
+        capacity = len(self._t)
+        while capacity < needed:
+            capacity *= 2
+        for name in ('_t', '_level', '_entries'):
+            old = getattr(self, name)
+            new = numpy.empty(capacity, dtype=old.dtype)
+            new[:self._n] = self._ordered(old)
+            setattr(self, name, new)
+        self._start = 0
+
+    def extend(self, entries):
+        """Add a list of :class:`_LogEntry` to the history, discarding old
+        entries as needed to stay within the limits
+        """
+        nNew = len(entries)
+        if not nNew:
+            return
+        if self.maxEntries:
+            entries = entries[-int(self.maxEntries):]
+            nNew = len(entries)
+        elif self._n + nNew > len(self._t):
+            self._grow(self._n + nNew)
+        capacity = len(self._t)
+        # drop the oldest entries to make room (only if capacity is fixed)
+        nDrop = max(0, self._n + nNew - capacity)
+        self._start = (self._start + nDrop) % capacity
+        self._n -= nDrop
+        idx = (self._start + self._n + numpy.arange(nNew)) % capacity
+        self._t[idx] = [thisEntry.t for thisEntry in entries]
+        self._level[idx] = [thisEntry.level for thisEntry in entries]
+        self._entries[idx] = entries
+        self._n += nNew
+        if self.maxAge is not None:
+            self._evictOlderThan(self._t[idx[-1]] - self.maxAge)
+
+    def _evictOlderThan(self, tCutoff):
+        # times usually only increase, but not if the clock was reset (e.g.
+        # by setDefaultClock), so check all the entries
+        keep = self._ordered(self._t) >= tCutoff
+        if keep.all():
+            return
+        nKeep = int(keep.sum())
+        for name in ('_t', '_level', '_entries'):
+            arr = getattr(self, name)
+            arr[:nKeep] = self._ordered(arr)[keep]
+        self._entries[nKeep:] = None  # release refs
+        self._start = 0
+        self._n = nKeep
+
+    def select(self, level=None, minLevel=None, tStart=None, tStop=None):
+        """Return a list of the entries matching all the given criteria
+
+        :parameters:
+
+            - level:
+                only entries with exactly this level (e.g. `logging.DATA`)
+
+            - minLevel:
+                only entries with at least this level
+
+            - tStart, tStop:
+                only entries logged at or after `tStart` and before `tStop`
+        """
+        mask = numpy.ones(self._n, dtype=bool)
+        if level is not None or minLevel is not None:
+            levels = self._ordered(self._level)
+            if level is not None:
+                mask &= levels == level
+            if minLevel is not None:
+                mask &= levels >= minLevel
+        if tStart is not None or tStop is not None:
+            times = self._ordered(self._t)
+            if tStart is not None:
+                mask &= times >= tStart
+            if tStop is not None:
+                mask &= times < tStop
+        return list(self._ordered(self._entries)[mask])
+
+
+class _BackgroundWriter(threading.Thread):
+    """A thread that formats and writes queued log entries for a
+    :class:`_Logger` so that the main (drawing) thread never waits on disk.
+
+    Don't create these directly, use :func:`startBackgroundWriter`.
+    """
+
+    def __init__(self, logger, queue, interval=0.1):
+        threading.Thread.__init__(self, name='PsychoPyLogWriter')
+        self.daemon = True
+        self.logger = logger
+        self.queue = queue
+        self.interval = interval
+        self.wakeEvent = threading.Event()  # set to request a write now
+        self.writtenEvent = threading.Event()  # set after each batch
+        # NB: we deliberately don't use the names `stop`/`running` because
+        # core.quit() treats threads with those attributes as event threads
+        self._keepWriting = True
+
+    def run(self):
+        while self._keepWriting:
+            self.wakeEvent.wait(self.interval)
+            self.wakeEvent.clear()
+            self.logger._writeQueued(self.queue)
+            self.writtenEvent.set()
+        # final drain of anything logged while we were shutting down
+        self.logger._writeQueued(self.queue)
+        self.writtenEvent.set()
+
+    def finish(self, timeout=None):
+        """Stop the thread after writing everything left in the queue
+        """
+        self._keepWriting = False
+        self.wakeEvent.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout)
+
+
 class _Logger(object):
     """Maintains a set of log targets (text streams such as files of stdout)
 
@@ -242,12 +421,20 @@ class _Logger(object):
         """
         super(_Logger, self).__init__()
         self.targets = []
-        self.flushed = []
+        self.flushed = _LogHistory()
         self.toFlush = []
         self.format = format
         self.lowestTarget = 50
+        # background writing (off by default, see startBackgroundWriter)
+        self._writer = None
+        self._queue = None
+        self._maxQueueSize = 0
+        self._overflow = 'block'
+        self._writeLock = threading.RLock()
+        self.nDropped = 0  # entries discarded by the overflow policy
 
     def __del__(self):
+        self.stopBackgroundWriter()
         self.flush()
         # unicode logged to coder output window can cause logger failure, with
         # error message pointing here. this is despite it being ok to log to
@@ -272,6 +459,70 @@ class _Logger(object):
         for target in self.targets:
             self.lowestTarget = min(self.lowestTarget, target.level)
 
+    def setHistoryLimits(self, maxEntries=None, maxAge=None):
+        """Limit how many already-written entries are kept in memory.
+        See :func:`psychopy.logging.setHistoryLimits`.
+        """
+        with self._writeLock:
+            entries = list(self.flushed)
+            self.flushed = _LogHistory(maxEntries=maxEntries, maxAge=maxAge)
+            self.flushed.extend(entries)
+
+    def getHistory(self, level=None, minLevel=None, tStart=None,
+                   tStop=None):
+        """Return the already-written entries that match the criteria.
+        See :meth:`_LogHistory.select`.
+        """
+        with self._writeLock:
+            return self.flushed.select(level=level, minLevel=minLevel,
+                                       tStart=tStart, tStop=tStop)
+
+    @property
+    def backgroundWriting(self):
+        """`True` if entries are being written by a background thread
+        """
+        return self._writer is not None
+
+    def startBackgroundWriter(self, maxQueueSize=10000, overflow='block',
+                              interval=0.1):
+        """Write log entries from a background thread rather than during
+        :meth:`flush`. See :func:`psychopy.logging.startBackgroundWriter`.
+        """
+        if overflow not in ('block', 'dropNewest', 'dropOldest'):
+            raise ValueError("overflow should be one of 'block', "
+                             "'dropNewest' or 'dropOldest', not %r"
+                             % (overflow,))
+        if self._writer is not None:
+            self.stopBackgroundWriter()
+        self._maxQueueSize = int(maxQueueSize)
+        self._overflow = overflow
+        # deque.append and deque.popleft are atomic so log() needs no lock
+        self._queue = deque(self.toFlush)
+        self.toFlush = []
+        self._writer = _BackgroundWriter(self, self._queue, interval=interval)
+        self._writer.start()
+
+    def stopBackgroundWriter(self, timeout=None):
+        """Write any queued entries, stop the background thread and return
+        to writing entries synchronously on :meth:`flush`.
+        """
+        writer = self._writer
+        if writer is None:
+            return
+        # new entries go onto the synchronous stack from now on, and the
+        # writer drains what was queued before
+        with self._writeLock:
+            queue, self._queue = self._queue, None
+        writer.finish(timeout=timeout)
+        self._writer = None
+        # anything the writer didn't get to (if it timed out) goes back onto
+        # the synchronous stack
+        try:
+            while queue:
+                self.toFlush.append(queue.popleft())
+        except IndexError:  # the writer emptied it meanwhile
+            pass
+
     def log(self, message, level, t=None, obj=None):
         """Add the `message` to the log stack at the appropriate `level`
 
@@ -285,28 +536,97 @@ class _Logger(object):
         if t is None:
             global defaultClock
             t = defaultClock.getTime()
-        # add message to list
-        self.toFlush.append(
-            _LogEntry(t=t, level=level, message=message, obj=obj))
+        entry = _LogEntry(t=t, level=level, message=message, obj=obj)
+        queue = self._queue
+        if queue is None:
+            # add message to list
+            self.toFlush.append(entry)
+            return
+        if self._maxQueueSize and len(queue) >= self._maxQueueSize:
+            self._handleOverflow(queue)
+            if self._overflow == 'dropNewest':
+                self.nDropped += 1
+                return
+        queue.append(entry)
+        if self._queue is not queue:
+            # the writer was stopped meanwhile, and may have drained the
+            # queue already, so make sure the entry isn't lost
+            try:
+                queue.remove(entry)
+            except ValueError:  # it was written (or is being written)
+                return
+            self.toFlush.append(entry)
+
+    def _handleOverflow(self, queue):
+        """Apply the back-pressure policy when the background queue is full
+        """
+        writer = self._writer
+        if self._overflow == 'dropOldest':
+            try:
+                queue.popleft()
+                self.nDropped += 1
+            except IndexError:  # the writer emptied it meanwhile
+                pass
+        elif (self._overflow == 'block' and writer is not None
+              and writer is not threading.current_thread()):
+            # wake the writer and wait until it has made some room
+            while len(queue) >= self._maxQueueSize and writer.is_alive():
+                writer.writtenEvent.clear()
+                writer.wakeEvent.set()
+                writer.writtenEvent.wait(writer.interval)
+
+    def _writeQueued(self, queue):
+        """Write everything currently in the background queue (called from
+        the writer thread)
+        """
+        if not queue:
+            return
+        entries = []
+        try:
+            for ii in range(len(queue)):
+                entries.append(queue.popleft())
+        except IndexError:
+            pass
+        self._writeEntries(entries)
+
+    def _writeEntries(self, entries):
+        """Format `entries` and send them to each target, then keep them
+        in self.flushed
+        """
+        if not entries:
+            return
+        with self._writeLock:
+            # loop through targets then entries so that each target gets a
+            # single write (and stream.flush) per batch
+            formatted = {}  # keep a dict - so only do the formatting once
+            for target in list(self.targets):
+                lines = []
+                for thisEntry in entries:
+                    if thisEntry.level >= target.level:
+                        if not thisEntry in formatted:
+                            # convert the entry into a formatted string
+                            formatted[thisEntry] = (
+                                self.format % thisEntry.__dict__)
+                        lines.append(formatted[thisEntry] + '\n')
+                if lines:
+                    target.write(''.join(lines))
+                if hasattr(target.stream, 'flush'):
+                    target.stream.flush()
+            # finished processing entries - move them to self.flushed
+            self.flushed.extend(entries)
 
     def flush(self):
         """Process all current messages to each target
+
+        If a background writer is running this only asks it to write
+        now, without waiting for the disk.
         """
-        # loop through targets then entries in toFlush
-        # so that stream.flush can be called just once
-        formatted = {}  # keep a dict - so only do the formatting once
-        for target in self.targets:
-            for thisEntry in self.toFlush:
-                if thisEntry.level >= target.level:
-                    if not thisEntry in formatted:
-                        # convert the entry into a formatted string
-                        formatted[thisEntry] = self.format % thisEntry.__dict__
-                    target.write(formatted[thisEntry] + '\n')
-            if hasattr(target.stream, 'flush'):
-                target.stream.flush()
-        # finished processing entries - move them to self.flushed
-        self.flushed.extend(self.toFlush)
+        if self._writer is not None:
+            self._writer.wakeEvent.set()
+            return
+        toFlush = self.toFlush
         self.toFlush = []  # a new empty list
+        self._writeEntries(toFlush)
 
 root = _Logger()
 console = LogFile()
@@ -321,6 +641,92 @@ def flush(logger=root):
 atexit.register(flush)
 
 
+def startBackgroundWriter(logger=root, maxQueueSize=10000, overflow='block',
+                          interval=0.1):
+    """Format and write log entries from a background thread.
+
+    By default log entries are held in memory and written to each target
+    when :func:`flush` is called (e.g. at the end of each Routine in a
+    Builder script). That writing happens in the calling thread and can
+    take long enough to drop frames when many messages are being logged
+    (e.g. using `win.logOnFlip` every frame). With a background writer the
+    entries are passed to a separate thread that writes them in batches,
+    and :func:`flush` simply asks that thread to write soon.
+
+    :parameters:
+
+        - logger:
+            the logger whose entries should be written in the background
+
+        - maxQueueSize:
+            the maximum number of entries waiting to be written (0 for
+            no limit)
+
+        - overflow: 'block', 'dropNewest' or 'dropOldest'
+            what to do when the queue is full. 'block' makes the logging
+            call wait until the writer has caught up, the others discard
+            an entry (counted in `logger.nDropped`)
+
+        - interval:
+            the maximum time (s) the writer sleeps between batches
+
+    The queue is written out and the thread stopped by
+    :func:`stopBackgroundWriter`, which is also called by `core.quit()` and
+    when Python exits.
+    """
+    logger.startBackgroundWriter(maxQueueSize=maxQueueSize,
+                                 overflow=overflow, interval=interval)
+
+
+def stopBackgroundWriter(logger=root, timeout=None):
+    """Write any entries waiting in the background queue and stop the
+    writer thread. Afterwards entries are written on :func:`flush` again.
+    """
+    logger.stopBackgroundWriter(timeout=timeout)
+
+atexit.register(stopBackgroundWriter)
+
+
+def setHistoryLimits(maxEntries=None, maxAge=None, logger=root):
+    """Limit the history of written log entries kept in memory.
+
+    Every entry that has been written to the targets is kept (in
+    `logger.flushed`) so that it can be inspected later. For a long session
+    with messages logged on every frame that can use a lot of memory, so
+    the history can be limited to:
+
+    - maxEntries:
+        the most recent `maxEntries` entries (a ring buffer)
+
+    - maxAge:
+        entries logged no more than `maxAge` seconds before the most
+        recent one
+
+    Setting both to `None` (the default) keeps everything. Entries are
+    still written to the log files as usual; this only affects what is
+    held in memory.
+    """
+    logger.setHistoryLimits(maxEntries=maxEntries, maxAge=maxAge)
+
+
+def getHistory(level=None, minLevel=None, tStart=None, tStop=None,
+               logger=root):
+    """Return a list of the log entries already written that match the
+    given criteria, e.g. the DATA entries from the last 10 s::
+
+        from psychopy import logging, core
+        now = core.getTime()
+        entries = logging.getHistory(level=logging.DATA, tStart=now - 10)
+        for entry in entries:
+            print(entry.t, entry.message)
+
+    Entries that haven't been written yet (see :func:`flush`) are not
+    included.
+    """
+    return logger.getHistory(level=level, minLevel=minLevel, tStart=tStart,
+                             tStop=tStop)
+
+
 def critical(msg, t=None, obj=None):
     """log.critical(message)
     Send the message to any receiver of logging info (e.g. a LogFile)
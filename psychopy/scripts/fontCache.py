@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Part of the PsychoPy library
+# Copyright (C) 2002-2018 Jonathan Peirce (C) 2019-2021 Open Science Tools Ltd.
+# Distributed under the terms of the GNU General Public License (GPL).
+
+"""Pre-warm the TextBox2 glyph cache for a set of experiments, so that the
+glyphs of their fonts don't need to be rendered when the experiments start.
+
+Examples::
+
+    python -m psychopy.scripts.fontCache stroop.psyexp rating.psyexp
+    python -m psychopy.scripts.fontCache --font "Noto Sans CJK JP" --size 32 --all-glyphs
+"""
+
+import sys
+import ast
+import string
+import argparse
+import xml.etree.ElementTree as xml
+
+parser = argparse.ArgumentParser(
+    description='Pre-warm the TextBox2 glyph cache of the fonts used by '
+                'experiments')
+parser.add_argument('experiments', nargs='*',
+                    help='psyexp files to cache the Textbox fonts of')
+parser.add_argument('--font', '-f', action='append', default=[],
+                    help='Extra font name to cache (can be repeated)')
+parser.add_argument('--size', '-s', action='append', default=[], type=int,
+                    help='Letter height in pixels to cache fonts at, for '
+                         'fonts given with --font and for experiments in '
+                         'units other than pix or height (can be repeated)')
+parser.add_argument('--chars', '-c', default='',
+                    help='Extra characters to cache (the printable ASCII '
+                         'characters and the constant text of the '
+                         'experiments are always cached)')
+parser.add_argument('--all-glyphs', '-a', action='store_true',
+                    help='Cache every glyph of the fonts')
+parser.add_argument('--cache-dir', default=None,
+                    help='Folder to save the cache in (defaults to the '
+                         'fontCache folder of the user prefs)')
+
+
+def _pixelSizes(letterHeight, units, winSize, sizes):
+    """Letter heights in pixels that a TextBox2 will request its font at, or
+    the sizes given on the command line if that depends on the monitor"""
+    try:
+        letterHeight = float(letterHeight)
+    except ValueError:  # set by code
+        return list(sizes)
+    if units in ('pix', 'pixels'):
+        return [int(round(letterHeight))]
+    if units == 'height' and winSize is not None:
+        return [int(round(letterHeight * winSize[1]))]
+    return list(sizes)
+
+
+def getExperimentFonts(filename, sizes=()):
+    """Get the fonts, letter heights (in pixels) and constant text of the
+    Textbox components of a psyexp file.
+
+    Parameters
+    ----------
+    filename: str
+        The psyexp file
+    sizes: list of int
+        Letter heights (pixels) for components in units (e.g. deg or cm) that
+        need the monitor to be converted to pixels
+
+    Returns
+    -------
+    dict of (font, size, bold, italic): set of characters
+    """
+    root = xml.parse(filename).getroot()
+
+    def params(node):
+        return {p.get('name'): p.get('val') for p in node.findall('Param')}
+
+    settings = root.find('Settings')
+    expParams = params(settings) if settings is not None else {}
+    expUnits = expParams.get('Units', 'height')
+    try:
+        winSize = ast.literal_eval(expParams.get('Window size (pixels)'))
+    except (ValueError, SyntaxError):
+        winSize = None
+
+    fonts = {}
+    for comp in root.iter('TextboxComponent'):
+        compParams = params(comp)
+        font = compParams.get('font', 'Open Sans')
+        if font.startswith('$'):  # set by code
+            continue
+        units = compParams.get('units', 'from exp settings')
+        if units == 'from exp settings':
+            units = expUnits
+        if 'deg' in units:
+            units = 'deg'
+        bold = compParams.get('bold') == 'True'
+        italic = compParams.get('italic') == 'True'
+        text = compParams.get('text', '')
+        if text.startswith('$'):
+            text = ''
+        for size in _pixelSizes(compParams.get('letterHeight', ''), units,
+                                winSize, sizes):
+            fonts.setdefault((font, size, bold, italic), set()).update(text)
+    return fonts
+
+
+def warmFontCache(fonts, cacheDir=None, allGlyphs=False, chars=''):
+    """Render the glyphs of the fonts and save them to the glyph cache.
+
+    Parameters
+    ----------
+    fonts: dict
+        (font, size, bold, italic): characters, as from getExperimentFonts()
+    cacheDir: str
+        Folder to save the cache in (defaults to the fontCache folder of the
+        user prefs)
+    allGlyphs: bool
+        Cache every glyph of the fonts, not only the characters given
+    chars: str
+        Characters to cache for every font (added to the printable ASCII
+        characters)
+    """
+    from psychopy.visual.textbox2.fontmanager import FontManager
+    FontManager.useGlyphCache = False  # we load from cacheDir ourselves
+    fontManager = FontManager()
+    for (font, size, bold, italic), fontChars in sorted(fonts.items()):
+        try:
+            glFont = fontManager.getFont(font, size, bold=bold, italic=italic)
+        except Exception as err:  # e.g. failed to get it from Google Fonts
+            glFont = None
+            print("Error getting font {}: {}".format(font, err))
+        if not glFont:
+            print("Font {} was not found".format(font))
+            continue
+        glFont.loadFromCache(cacheDir)
+        if allGlyphs:
+            glFont.preload()
+        else:
+            glFont.fetch(set(string.printable) | set(chars) | set(fontChars))
+        if glFont._nNewGlyphs:
+            path = glFont.saveToCache(cacheDir)
+            print("Cached {} at {}px: {}".format(glFont.info, size, path))
+        else:
+            print("Cache of {} at {}px is up to date".format(glFont.info, size))
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    fonts = {}
+    for filename in args.experiments:
+        for key, chars in getExperimentFonts(filename, args.size).items():
+            fonts.setdefault(key, set()).update(chars)
+    for font in args.font:
+        for size in args.size:
+            fonts.setdefault((font, size, False, False), set())
+    if not fonts:
+        parser.print_usage()
+        sys.exit("No fonts to cache (use --size for fonts given with --font "
+                 "or used in experiments in units other than pix or height)")
+    warmFontCache(fonts, args.cache_dir, args.all_glyphs, args.chars)
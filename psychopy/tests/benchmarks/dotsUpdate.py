@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark for the per-frame update of DotStim dynamics.
+
+For every combination of `signalDots` and `noiseDots` this reports the time
+taken to update the dots for one frame, and the peak memory allocated while
+doing so, for the in-place update in DotStim and for the previous approach
+(which created new arrays for every intermediate result). Conversion of the
+dots to pixels is not included. Not run as part of the test suite; it needs
+a display to open a (small) window. From the command line use::
+
+    python psychopy/tests/benchmarks/dotsUpdate.py [nDots ...]
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from psychopy import visual, logging
+
+_piOver180 = np.pi / 180.
+_2pi = 2 * np.pi
+
+
+def previousUpdate(dots):
+    """The previous implementation of DotStim._update_dotsXY (without the
+    final conversion to pixels)
+    """
+    if dots.dotLife > 0:
+        dots._dotsLife -= 1
+        dots._deadDots[:] = (dots._dotsLife <= 0)
+        dots._dotsLife[dots._deadDots] = dots.dotLife
+    else:
+        dots._deadDots[:] = False
+
+    if dots.signalDots == 'different':
+        np.random.shuffle(dots._dotsDir)
+        dots._signalDots = (dots._dotsDir == (dots.dir * _piOver180))
+
+    reshape = np.reshape
+    if dots.noiseDots == 'walk':
+        sig = np.random.rand(np.sum(~dots._signalDots))
+        dots._dotsDir[~dots._signalDots] = sig * _2pi
+        cosDots = reshape(np.cos(dots._dotsDir), (dots.nDots,))
+        sinDots = reshape(np.sin(dots._dotsDir), (dots.nDots,))
+        dots._verticesBase[:, 0] += dots.speed * cosDots
+        dots._verticesBase[:, 1] += dots.speed * sinDots
+    elif dots.noiseDots == 'direction':
+        cosDots = reshape(np.cos(dots._dotsDir), (dots.nDots,))
+        sinDots = reshape(np.sin(dots._dotsDir), (dots.nDots,))
+        dots._verticesBase[:, 0] += dots.speed * cosDots
+        dots._verticesBase[:, 1] += dots.speed * sinDots
+    elif dots.noiseDots == 'position':
+        sd = dots._signalDots
+        sdSum = dots._signalDots.sum()
+        cosDots = reshape(np.cos(dots._dotsDir[sd]), (sdSum,))
+        sinDots = reshape(np.sin(dots._dotsDir[sd]), (sdSum,))
+        dots._verticesBase[sd, 0] += dots.speed * cosDots
+        dots._verticesBase[sd, 1] += dots.speed * sinDots
+        dots._deadDots[:] = dots._deadDots + (~dots._signalDots)
+
+    if dots.fieldShape in (None, 'square', 'sqr'):
+        out0 = (np.abs(dots._verticesBase[:, 0]) > .5 * dots.fieldSize[0])
+        out1 = (np.abs(dots._verticesBase[:, 1]) > .5 * dots.fieldSize[1])
+        outofbounds = out0 + out1
+    else:
+        normXY = dots._verticesBase / .5 / dots.fieldSize
+        outofbounds = np.hypot(normXY[:, 0], normXY[:, 1]) > 1.
+
+    nDead = dots._deadDots.sum()
+    if nDead:
+        dots._verticesBase[dots._deadDots, :] = dots._newDotsXY(nDead)
+    nOutOfBounds = outofbounds.sum()
+    if nOutOfBounds:
+        dots._verticesBase[outofbounds, :] = dots._newDotsXY(nOutOfBounds)
+
+
+def peakAllocated(func, nFrames=10):
+    """Largest amount of memory (bytes) allocated by `func` at any one time
+    """
+    func()  # warm up
+    tracemalloc.start()
+    try:
+        for ii in range(nFrames):
+            func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(nDotsList=(1000, 10000, 100000), nFrames=200):
+    logging.console.setLevel(logging.ERROR)
+    win = visual.Window(size=(200, 200), units='pix', allowGUI=False)
+    print("%8s %9s %10s %14s %14s %12s %12s" % (
+        'nDots', 'signal', 'noise', 'previous (us)', 'in place (us)',
+        'prev. (kB)', 'in pl. (kB)'))
+    try:
+        for nDots in nDotsList:
+            for signalDots in ('same', 'different'):
+                for noiseDots in ('direction', 'position', 'walk'):
+                    dots = visual.DotStim(
+                        win, nDots=nDots, fieldSize=200, fieldShape='circle',
+                        dotLife=20, speed=2, coherence=0.5,
+                        signalDots=signalDots, noiseDots=noiseDots,
+                        autoLog=False)
+                    dots._updateVertices = lambda: None  # dynamics only
+                    old = lambda: previousUpdate(dots)
+                    new = dots._update_dotsXY
+                    tOld = min(timeit.repeat(old, number=nFrames, repeat=3))
+                    tNew = min(timeit.repeat(new, number=nFrames, repeat=3))
+                    print("%8i %9s %10s %14.1f %14.1f %12.1f %12.1f" % (
+                        nDots, signalDots, noiseDots,
+                        tOld / nFrames * 1e6, tNew / nFrames * 1e6,
+                        peakAllocated(old) / 1024.,
+                        peakAllocated(new) / 1024.))
+    finally:
+        win.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run([int(n) for n in sys.argv[1:]])
+    else:
+        run()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark of ioDataStore write throughput versus file size, for several
+compression settings of the event tables.
+
+Simulated binocular eye samples (a slowly moving gaze position with some
+noise) are saved to a new DataStore file for each setting, the same way the
+ioHub Server saves events. The file is then repacked with repackHubFile()
+to show the size that can be reached once the session has ended. No ioHub
+Server or eye tracker is needed. From the command line use::
+
+    python psychopy/tests/benchmarks/iohubDataStoreFilters.py [nSamples]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+
+import numpy as np
+
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.datastore import DataStoreFile
+from psychopy.iohub.datastore.util import repackHubFile
+from psychopy.iohub.devices.eyetracker import EyeTrackerDevice
+from psychopy.iohub.devices.eyetracker.eye_events import \
+    BinocularEyeSampleEvent
+
+SETTINGS = [
+    ('none', dict(compression_level=0)),
+    ('zlib 1', dict(compression_lib='zlib', compression_level=1)),
+    ('zlib 5 shuffle', dict(compression_lib='zlib', compression_level=5,
+                            shuffle=True)),
+    ('blosc 5 shuffle', dict(compression_lib='blosc', compression_level=5,
+                             shuffle=True)),
+    ('blosc:lz4 5 shuffle', dict(compression_lib='blosc:lz4',
+                                 compression_level=5, shuffle=True)),
+    ('blosc:zstd 5 shuffle', dict(compression_lib='blosc:zstd',
+                                  compression_level=5, shuffle=True)),
+]
+
+
+def makeSamples(nSamples, rate=1000.0):
+    """Binocular eye sample events in list format
+    """
+    dtype = BinocularEyeSampleEvent.NUMPY_DTYPE
+    rng = np.random.RandomState(1)
+    t = np.arange(nSamples) / rate
+    gaze = np.cumsum(rng.normal(0, 2, (nSamples, 2)), axis=0)
+    samples = []
+    for n in range(nSamples):
+        evt = [0] * len(dtype)
+        evt[3] = n
+        evt[4] = BinocularEyeSampleEvent.EVENT_TYPE_ID
+        evt[5] = evt[6] = evt[7] = t[n]
+        for eye in ('left', 'right'):
+            evt[dtype.names.index(eye + '_gaze_x')] = gaze[n, 0]
+            evt[dtype.names.index(eye + '_gaze_y')] = gaze[n, 1]
+            evt[dtype.names.index(eye + '_pupil_measure1')] = 4.0
+        samples.append(evt)
+    return samples
+
+
+def writeSamples(folder, samples, settings):
+    settings = dict(settings)
+    settings['expected_rows'] = {'BINOCULAR_EYE_SAMPLE': len(samples)}
+    dsfile = DataStoreFile('events.hdf5', folder, 'w', settings)
+    dsfile.updateDataStoreStructure(
+        EyeTrackerDevice.__new__(EyeTrackerDevice),
+        {'BinocularEyeSampleEvent': BinocularEyeSampleEvent})
+    dsfile.createOrUpdateExperimentEntry([0, 'benchmark', '', '', ''])
+    dsfile.createExperimentSessionEntry(dict(code='s1', name='', comments='',
+                                             user_variables='{}'))
+    t0 = timeit.default_timer()
+    for evt in samples:
+        dsfile._handleEvent(list(evt))
+    dsfile.close()
+    return timeit.default_timer() - t0, os.path.join(folder, 'events.hdf5')
+
+
+def run(nSamples=100000):
+    EventConstants.addClassMappings(
+        [BinocularEyeSampleEvent.EVENT_TYPE_ID],
+        {'BinocularEyeSampleEvent': BinocularEyeSampleEvent})
+    samples = makeSamples(nSamples)
+    print("%22s %14s %11s %14s" % ('setting', 'samples / sec', 'size (MB)',
+                                   'repacked (MB)'))
+    for label, settings in SETTINGS:
+        folder = tempfile.mkdtemp()
+        try:
+            duration, filePath = writeSamples(folder, samples, settings)
+            _, size, packedSize = repackHubFile(
+                filePath, os.path.join(folder, 'packed.hdf5'))
+            print("%22s %14.0f %11.2f %14.2f" % (
+                label, nSamples / duration, size / 1e6, packedSize / 1e6))
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark for converting ioHub events, as returned by the ioHub Server,
+into namedtuples (the default for getEvents()) or into numpy structured
+arrays (getEvents(as_type='numpy')).
+
+Binocular eye samples are generated for one trial at each sample rate, then
+converted and the mean gaze position is calculated from the result. The
+numpy conversion is timed both for events received over UDP (as lists) and
+for events read from the shared memory event buffer, if supported. No ioHub
+Server or eye tracker is needed. From the command line use::
+
+    python psychopy/tests/benchmarks/iohubEventsNumPy.py [trialDuration]
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+
+import numpy as np
+
+from psychopy.iohub.client import ioHubConnection
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.devices.eyetracker.eye_events import \
+    BinocularEyeSampleEvent
+from psychopy.iohub.net import SharedEventBuffer
+
+
+def makeSamples(nSamples):
+    """Binocular eye sample events in list format, as sent by the server
+    """
+    EventConstants.addClassMappings(
+        [BinocularEyeSampleEvent.EVENT_TYPE_ID],
+        {'BinocularEyeSampleEvent': BinocularEyeSampleEvent})
+    dtype = BinocularEyeSampleEvent.NUMPY_DTYPE
+    samples = []
+    for n in range(nSamples):
+        evt = [0] * len(dtype)
+        evt[3] = n
+        evt[4] = BinocularEyeSampleEvent.EVENT_TYPE_ID
+        evt[5] = evt[6] = evt[7] = n * 0.001
+        evt[dtype.names.index('left_gaze_x')] = float(n % 200)
+        evt[dtype.names.index('right_gaze_x')] = float(n % 300)
+        samples.append(evt)
+    return samples
+
+
+def meanGazeNamedTuple(samples):
+    events = [ioHubConnection.eventListToNamedTuple(e) for e in samples]
+    return (sum(e.left_gaze_x for e in events) / len(events),
+            sum(e.right_gaze_x for e in events) / len(events))
+
+
+def meanGazeNumPy(samples):
+    events = ioHubConnection.eventListsToNumPy(samples)
+    events = events[EventConstants.BINOCULAR_EYE_SAMPLE]
+    return events['left_gaze_x'].mean(), events['right_gaze_x'].mean()
+
+
+def meanGazeShared(shared):
+    events = shared.readArrays()[EventConstants.BINOCULAR_EYE_SAMPLE]
+    return events['left_gaze_x'].mean(), events['right_gaze_x'].mean()
+
+
+def timeShared(samples, number=5, repeat=3):
+    shared = SharedEventBuffer(slots=len(samples))
+    try:
+        times = []
+        for ii in range(repeat):
+            t = 0.0
+            for jj in range(number):
+                for evt in samples:
+                    shared.write(evt)
+                t0 = timeit.default_timer()
+                meanGazeShared(shared)
+                t += timeit.default_timer() - t0
+            times.append(t / number)
+        return min(times)
+    finally:
+        shared.close()
+
+
+def timeIt(func, samples, number=5, repeat=3):
+    return min(timeit.repeat(lambda: func(samples), number=number,
+                             repeat=repeat)) / number
+
+
+def run(trialDuration=5.0, rates=(500, 1000, 2000)):
+    useShared = SharedEventBuffer.isSupported()
+    print("%6s %9s %16s %12s %19s" % ('Hz', 'samples', 'namedtuple (ms)',
+                                      'numpy (ms)', 'numpy shared (ms)'))
+    for rate in rates:
+        samples = makeSamples(int(rate * trialDuration))
+        assert np.allclose(meanGazeNamedTuple(samples), meanGazeNumPy(samples))
+        tNamed = timeIt(meanGazeNamedTuple, samples)
+        tNumPy = timeIt(meanGazeNumPy, samples)
+        tShared = timeShared(samples) * 1000 if useShared else np.nan
+        print("%6i %9i %16.2f %12.2f %19.2f" % (
+            rate, len(samples), tNamed * 1000, tNumPy * 1000, tShared))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(float(sys.argv[1]))
+    else:
+        run()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark for drawing many TextBox2 labels.
+
+For each number of labels this reports the time taken to draw them all (until
+the graphics card has finished) by calling draw() for each of them and by
+drawing them with a TextBox2Batch. The labels have no border or fill, as in a
+rating form. Not run as part of the test suite; it needs a display to open a
+window. From the command line use::
+
+    python psychopy/tests/benchmarks/textbox2Batch.py [nLabels ...]
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+
+from pyglet import gl
+
+from psychopy import visual, logging
+
+
+def timeDraw(win, draw, nFrames):
+    """Median time (s) of draw() over nFrames"""
+    times = []
+    for ii in range(nFrames):
+        gl.glFinish()
+        t0 = timeit.default_timer()
+        draw()
+        gl.glFinish()
+        times.append(timeit.default_timer() - t0)
+        win.flip()
+    times.sort()
+    return times[len(times) // 2]
+
+
+def run(nLabelsList=(10, 50, 200), nFrames=60):
+    logging.console.setLevel(logging.ERROR)
+    win = visual.Window(size=(800, 600), units='height', allowGUI=False)
+    print("%8s %18s %18s" % ('nLabels', 'single (ms)', 'batch (ms)'))
+    try:
+        for nLabels in nLabelsList:
+            nCols = 5
+            labels = [visual.TextBox2(
+                win, "label number %i" % n, 'Open Sans',
+                pos=(-0.5 + (n % nCols) * 0.25, 0.45 - (n // nCols) * 0.9 /
+                     max(nLabels // nCols, 1)),
+                size=(0.24, None), letterHeight=0.02, autoLog=False)
+                for n in range(nLabels)]
+            batch = visual.TextBox2Batch(win, labels)
+
+            def drawSingle():
+                for label in labels:
+                    label.draw()
+
+            tSingle = timeDraw(win, drawSingle, nFrames)
+            tBatch = timeDraw(win, batch.draw, nFrames)
+            print("%8i %18.3f %18.3f" % (nLabels, tSingle * 1e3,
+                                         tBatch * 1e3))
+    finally:
+        win.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run([int(n) for n in sys.argv[1:]])
+    else:
+        run()
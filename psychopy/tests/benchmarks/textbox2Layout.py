@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark for the keystroke-to-render latency of an editable TextBox2.
+
+For texts of each length this reports the time taken from a key press (a char
+added at, or deleted left of, a random caret position) until the box is ready
+to draw, i.e. the layout plus the update of the vertices, for the incremental
+layout that TextBox2 does after an edit and for laying out the whole text (as
+was done before). Not run as part of the test suite; it needs a display to
+open a (small) window. From the command line use::
+
+    python psychopy/tests/benchmarks/textbox2Layout.py [nChars ...]
+"""
+
+from __future__ import print_function
+
+import sys
+import random
+import timeit
+
+import numpy as np
+
+from psychopy import visual, logging
+
+_words = ("the quick brown fox jumps over a lazy dog - "
+          "antidisestablishmentarianism\n").split(' ')
+
+
+def makeText(nChars, seed=0):
+    """Random words (and some newlines) of about nChars in total"""
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < nChars:
+        words.append(rng.choice(_words))
+        length += len(words[-1]) + 1
+    return ' '.join(words)[:nChars]
+
+
+def keystrokes(box, nKeys, fullLayout=False, seed=0):
+    """Times (s) of nKeys alternating key presses and backspaces at random
+    caret positions, leaving the text as it was"""
+    rng = random.Random(seed)
+    times = []
+    for ii in range(nKeys):
+        if ii % 2 == 0:
+            box.caret.index = rng.randint(0, len(box._text))
+        t0 = timeit.default_timer()
+        if ii % 2 == 0:
+            box.addCharAtCaret('a')
+        else:
+            box.deleteCaretLeft()
+        if fullLayout:
+            box._layout()
+        box._updateVertices()
+        times.append(timeit.default_timer() - t0)
+    return times
+
+
+def run(nCharsList=(1000, 10000, 50000), nKeys=40):
+    logging.console.setLevel(logging.ERROR)
+    win = visual.Window(size=(200, 200), units='pix', allowGUI=False)
+    print("%8s %18s %18s %18s" % (
+        'nChars', 'full median (ms)', 'incr. median (ms)', 'incr. max (ms)'))
+    try:
+        for nChars in nCharsList:
+            box = visual.TextBox2(win, makeText(nChars), 'Open Sans',
+                                  letterHeight=12, size=(600, None),
+                                  editable=True, autoLog=False)
+            # the incremental layout is done anyway, so the full layout times
+            # include it (though it is much faster)
+            full = keystrokes(box, max(nKeys // 4, 2), fullLayout=True)
+            incremental = keystrokes(box, nKeys)
+            print("%8i %18.2f %18.2f %18.2f" % (
+                nChars, np.median(full) * 1e3, np.median(incremental) * 1e3,
+                np.max(incremental) * 1e3))
+    finally:
+        win.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run([int(n) for n in sys.argv[1:]])
+    else:
+        run()
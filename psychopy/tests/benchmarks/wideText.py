@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark for TrialHandler.saveAsWideText with large trial lists.
+
+Compares the column-wise writer in TrialHandler against the previous
+row-by-row approach (one dict per trial, one cell at a time). Not run as
+part of the test suite; from the command line use::
+
+    python psychopy/tests/benchmarks/wideText.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import timeit
+from tempfile import mkdtemp
+
+import numpy as np
+
+from psychopy import data, logging
+
+
+def makeTrials(nTypes, nReps):
+    conds = [{'ori': ii % 360, 'word': 'w%i' % ii} for ii in range(nTypes)]
+    trials = data.TrialHandler(conds, nReps=nReps, method='random', seed=1,
+                               extraInfo={'participant': 'bench'},
+                               autoLog=False)
+    rng = np.random.RandomState(1)
+    rts = rng.rand(nTypes * nReps)
+    for ii, trial in enumerate(trials):
+        trials.addData('resp.rt', rts[ii])
+        trials.addData('resp.keys', 'left' if rts[ii] > 0.5 else 'right')
+    return trials
+
+
+def rowByRow(trials, fileName, delim=','):
+    """The previous implementation: one dict per trial, built cell by cell
+    """
+    header = list(trials.trialList[0].keys())
+    header.extend(trials.data.dataTypes)
+    header.insert(0, "TrialNumber")
+    for key in trials.extraInfo:
+        header.insert(0, key)
+    dataOut = []
+    trialCount = 0
+    repsPerType = {}
+    for rep in range(trials.nReps):
+        for trialN in range(len(trials.trialList)):
+            tti = trials.sequenceIndices[trialN, rep]
+            repsPerType[tti] = repsPerType.get(tti, -1) + 1
+            trep = repsPerType[tti]
+            trialCount += 1
+            nextEntry = {}
+            for prmName in header:
+                if prmName in trials.trialList[tti]:
+                    nextEntry[prmName] = trials.trialList[tti][prmName]
+                elif prmName in trials.data:
+                    nextEntry[prmName] = trials.data[prmName][tti][trep]
+                elif prmName in trials.extraInfo:
+                    nextEntry[prmName] = trials.extraInfo[prmName]
+                elif prmName == "TrialNumber":
+                    nextEntry[prmName] = trialCount
+                else:
+                    nextEntry[prmName] = ''
+            dataOut.append(nextEntry)
+    with open(fileName, 'w') as f:
+        f.write(delim.join(header) + '\n')
+        for trial in dataOut:
+            nextLine = ''
+            for prmName in header:
+                nextLine = nextLine + str(trial[prmName]) + delim
+            f.write(nextLine[:-1] + '\n')
+
+
+def run(nTrialsList=(1000, 10000, 100000), nTypes=100, repeats=3):
+    logging.console.setLevel(logging.ERROR)
+    tmpDir = mkdtemp(prefix='psychopy-bench-wideText')
+    print("%10s %14s %14s %8s" % ('nTrials', 'rowByRow (s)', 'columns (s)',
+                                  'speedup'))
+    try:
+        for nTrials in nTrialsList:
+            trials = makeTrials(nTypes, nTrials // nTypes)
+            oldFile = os.path.join(tmpDir, 'old.csv')
+            newFile = os.path.join(tmpDir, 'new')
+            tOld = min(timeit.repeat(lambda: rowByRow(trials, oldFile),
+                                     number=1, repeat=repeats))
+            tNew = min(timeit.repeat(
+                lambda: trials.saveAsWideText(
+                    newFile, delim=',', appendFile=False,
+                    fileCollisionMethod='overwrite'),
+                number=1, repeat=repeats))
+            print("%10i %14.3f %14.3f %7.1fx" % (nTrials, tOld, tNew,
+                                                 tOld / tNew))
+    finally:
+        shutil.rmtree(tmpDir)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run([int(n) for n in sys.argv[1:]])
+    else:
+        run()
@@ -165,6 +165,29 @@ class _baseVisualTest(object):
             stim.updateNoise()
             stim.draw()
 
+    def test_NoiseStim_bank(self, tmpdir):
+        stim = visual.NoiseStim(win=self.win, noiseType='filtered',
+                                size=(32, 32), units='pix')
+        fileName = str(tmpdir.join('noiseBank.npz'))
+        stim.buildNoiseBank(3, fileName=fileName)
+        first = stim.tex
+        assert stim._bankIndex == 0
+        for ii in range(3):
+            stim.updateNoise()  # just cycles through the bank
+            assert stim._bankIndex == (ii + 1) % 3
+            assert numpy.array_equal(stim.tex,
+                                     stim._noiseBankSamples[stim._bankIndex])
+            stim.draw()
+        assert numpy.array_equal(stim.tex, first)
+        # a saved bank with the same parameters gets reused
+        saved = stim._noiseBankSamples
+        stim.buildNoiseBank(3, fileName=fileName)
+        assert numpy.array_equal(stim._noiseBankSamples, saved)
+        # changing the parameters discards the bank
+        stim.noiseClip = 2.0
+        stim.draw()
+        assert stim._noiseBank == []
+
     def test_NoiseStim_defaults_image(self):
         noiseType = 'image'
 
@@ -464,6 +487,32 @@ class _baseVisualTest(object):
             utils.compareScreenshot('text2_%s.png' %self.contextName,
                                     win, crit=20)
 
+    def test_text_cache(self):
+        win = self.win
+        stim = visual.TextStim(win, text='red', pos=[0, 0.5])
+        cache = stim.textCache
+        stim.prewarm([dict(word='green'), dict(word='blue')], 'word')
+        assert stim.text == 'red'
+        misses = cache.misses
+        stim.text = 'green'  # rendered by prewarm
+        stim.text = 'red'  # rendered when the stim was created
+        assert cache.misses == misses
+        # other TextStims with the same settings share the cache
+        other = visual.TextStim(win, text='blue', pos=[0, -0.5])
+        misses = cache.misses
+        other.text = 'green'
+        assert cache.misses == misses
+        stim.draw()
+        other.draw()
+        win.flip()
+        # least recently used texts are dropped to stay under maxBytes
+        cache.maxBytes = cache.nBytes
+        stim.prewarm(['yellow'])
+        texts = [key[1] for key in cache._items]
+        assert 'yellow' in texts and 'green' in texts
+        assert cache.nBytes <= cache.maxBytes
+        cache.maxBytes = visual.TextStim.textCacheMaxBytes
+
     def test_text_with_add(self):
         # pyglet text will reset the blendMode to 'avg' so check that we are
         # getting back to 'add' if we want it
@@ -663,6 +712,62 @@ class _baseVisualTest(object):
         assert not numpy.alltrue(prevVerticesPix==dots.verticesPix), \
             "dots.verticesPix failed to change after dots.setPos()"
 
+    def test_dotsSeeded(self):
+        # seeding numpy.random before a trial reproduces the dot motion
+        for signalDots in ('same', 'different'):
+            for noiseDots in ('walk', 'direction', 'position'):
+                dots = visual.DotStim(self.win, nDots=200, dotLife=3,
+                                      fieldShape='circle',
+                                      fieldSize=1*self.scaleFactor,
+                                      speed=0.05*self.scaleFactor,
+                                      signalDots=signalDots,
+                                      noiseDots=noiseDots, coherence=0.5)
+                state = [dots._verticesBase.copy(), dots._dotsLife.copy(),
+                         dots._dotsDir.copy(), dots._signalDots.copy()]
+                positions = []
+                for rep in range(2):
+                    dots._verticesBase[:] = state[0]
+                    dots._dotsLife[:] = state[1]
+                    dots._dotsDir[:] = state[2]
+                    dots._signalDots[:] = state[3]
+                    numpy.random.seed(2)
+                    for frameN in range(10):
+                        dots._update_dotsXY()
+                    positions.append(dots._verticesBase.copy())
+                assert numpy.array_equal(positions[0], positions[1])
+                assert not numpy.array_equal(positions[0], state[0])
+
+    def test_dotsNewPositions(self):
+        # new positions are drawn from numpy.random like they always were
+        for fieldShape in ('sqr', 'circle'):
+            dots = visual.DotStim(self.win, nDots=100, fieldShape=fieldShape,
+                                  fieldSize=1*self.scaleFactor)
+            numpy.random.seed(3)
+            expected = dots._newDotsXY(50)
+            numpy.random.seed(3)
+            newXY = numpy.zeros((50, 2), order='F')
+            dots._newDotsXYInPlace(newXY)
+            assert numpy.array_equal(newXY, expected)
+
+    def test_dotsInstanced(self):
+        # the instanced path should look the same as the classic one
+        win = self.win
+        frames = []
+        for instanced in (False, True):
+            numpy.random.seed(1)
+            dots = visual.DotStim(win, color=(1.0, 1.0, 1.0), dotSize=5,
+                                  nDots=1000, fieldShape='circle',
+                                  fieldSize=1*self.scaleFactor,
+                                  instanced=instanced)
+            dots.draw()
+            frames.append(numpy.asarray(win._getFrame(buffer='back'),
+                                        dtype=float))
+            win.flip()
+        if not dots.instanced:
+            pytest.skip("Instanced drawing isn't supported here")
+        # allow for float32 vs float64 positions landing on different pixels
+        assert numpy.abs(frames[0] - frames[1]).mean() < 1.0
+
     def test_element_array(self):
         win = self.win
         if not win._haveShaders:
@@ -688,6 +793,33 @@ class _baseVisualTest(object):
         utils.compareScreenshot('elarray1_%s.png' %(self.contextName), win)
         win.flip()
 
+    def test_element_array_vbos(self):
+        # drawing from buffers should match drawing from client arrays,
+        # including after changing some of the values
+        win = self.win
+        if not win._haveShaders:
+            pytest.skip("ElementArray requires shaders, which aren't available")
+        thetas = numpy.arange(0, 360, 10)
+        radii = numpy.linspace(0, 1.0, len(thetas))*self.scaleFactor
+        x, y = pol2cart(theta=thetas, radius=radii)
+        frames = []
+        for useVBOs in (False, True):
+            spiral = visual.ElementArrayStim(
+                    win, nElements=len(thetas), sizes=0.5*self.scaleFactor,
+                    sfs=1.0, xys=numpy.array([x, y]).transpose(),
+                    oris=-thetas, useVBOs=useVBOs)
+            spiral.draw()
+            win.flip()
+            spiral.phases = 0.25
+            spiral.opacities = 0.5
+            spiral.draw()
+            frames.append(numpy.asarray(win._getFrame(buffer='back'),
+                                        dtype=float))
+            win.flip()
+        if not spiral.useVBOs:
+            pytest.skip("ElementArrayStim can't use VBOs here")
+        assert numpy.abs(frames[0] - frames[1]).mean() < 1.0
+
     def test_aperture(self):
         win = self.win
         if not win.allowStencil:
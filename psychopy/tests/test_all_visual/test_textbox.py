@@ -1,6 +1,8 @@
 from builtins import object
 from pathlib import Path
 
+import numpy as np
+
 from psychopy import visual, event
 from psychopy.alerts._errorHandler import _BaseErrorHandler
 from psychopy.visual import Window
@@ -133,7 +135,74 @@ class Test_textbox(object):
     def test_something(self):
         # to-do: test visual display, char position, etc
         pass
-            
+
+    def test_incremental_layout(self):
+        # editing the text only lays out the changed lines again, which should
+        # give the same layout as laying out all of it
+        def layout(box):
+            return (box._rawVerts.copy(), list(box._lineNs),
+                    list(box._lineTops), list(box._lineBottoms),
+                    list(box._lineWidths), list(box._lineLenChars))
+
+        def assertFullLayout(box):
+            incremental = layout(box)
+            box._layout()
+            for got, expected in zip(incremental, layout(box)):
+                assert len(got) == len(expected)
+                assert np.allclose(got, expected)
+
+        self.textbox.text = "The quick brown fox jumps over the lazy dog. " * 20
+        edits = [(0, 'A'), (30, ' '), (31, '\n'), (200, 'x'), (None, '-'),
+                 (100, None), (31, None), (5, None), (0, '\n'), (1, '\n'),
+                 (2, None), (None, '\n')]
+        for index, char in edits:
+            if index is None:
+                index = len(self.textbox._text)
+            self.textbox.caret.index = index
+            if char is None:
+                self.textbox.deleteCaretLeft()
+            else:
+                self.textbox.addCharAtCaret(char)
+            assertFullLayout(self.textbox)
+        # setting text with the same start and end
+        self.textbox.text = self.textbox._text[:50] + "jumps" + \
+            self.textbox._text[60:]
+        assertFullLayout(self.textbox)
+        # deleting all the text
+        self.textbox.text = "\nfox"
+        self.textbox.caret.index = 4
+        for n in range(4):
+            self.textbox.deleteCaretLeft()
+            assertFullLayout(self.textbox)
+        assert self.textbox._lineTops == []
+        self.textbox.text = ""
+
+    def test_batch(self):
+        boxes = [TextBox2(self.win, "box %i" % n, "Noto Sans",
+                          pos=(0, 0.4 - n * 0.2), size=(1, 0.2),
+                          units='height', letterHeight=0.08)
+                 for n in range(5)]
+        self.win.clearBuffer()
+        for box in boxes:
+            box.draw()
+        single = np.asarray(self.win._getFrame(buffer='back'), dtype=int)
+        self.win.clearBuffer()
+        batch = visual.TextBox2Batch(self.win, boxes)
+        batch.draw()
+        batched = np.asarray(self.win._getFrame(buffer='back'), dtype=int)
+        self.win.clearBuffer()
+        assert np.abs(single - batched).max() < 2
+        # the boxes share one buffer, only updated where they changed
+        atlas = batch._atlases[boxes[0].glFont]
+        assert atlas.nVerts == sum(len(box._text) for box in boxes) * 4
+        boxes[2].pos = (0.1, 0)
+        batch.draw()
+        assert atlas.versions == [box._vertexVersion for box in boxes]
+        batch.remove(boxes[0])
+        batch.draw()
+        assert atlas.boxes == boxes[1:]
+        self.win.clearBuffer()
+
     def test_alerts(self):
         noFontTextbox = TextBox2(self.win, "", font="Raleway Dots", bold=True)
         assert (self.error.alerts[0].code == 4325)
@@ -152,6 +221,31 @@ def test_font_manager():
         assert bool(mgr.getFontNamesSimilar("Hanalei"))
 
 
+def test_glyph_cache(tmpdir):
+    from psychopy.visual.textbox2.fontmanager import GLFont
+    mgr = FontManager()
+    fontInfo = mgr.getFontsMatching("Open Sans")[0]
+    glFont = GLFont(fontInfo.path, 24)
+    glFont.fetch(u"Cached glyphs")
+    path = glFont.saveToCache(str(tmpdir))
+    assert Path(path + ".json").exists()
+
+    cached = GLFont(fontInfo.path, 24)
+    assert cached.loadFromCache(str(tmpdir))
+    # glyphs are made from the cache when first used, not rendered again
+    cached.fetch(u"glyphs Cached")
+    assert cached._nNewGlyphs == 0
+    for char, glyph in glFont.glyphs.items():
+        assert cached[char].texcoords == glyph.texcoords
+        assert cached[char].advance == glyph.advance
+    assert (cached.atlas.data == glFont.atlas.data).all()
+    # new glyphs are added to the cached atlas
+    cached.fetch(u"xkz")
+    assert cached._nNewGlyphs == 3
+    # a cache of a different size is not used
+    assert not GLFont(fontInfo.path, 25).loadFromCache(str(tmpdir))
+
+
 @pytest.mark.uax14
 class Test_uax14_textbox(Test_textbox):
     """Runs the same tests as for Test_textbox, but with the textbox set to uax14 line breaking"""
@@ -91,6 +91,106 @@ class Test_WinFlipTiming(object):
         if self.testOutputs:
             assert abs(diff) < self.win.monitorFramePeriod/2.0
 
+    def test_frameTiming(self, tmpdir):
+        """the FrameTimingRecorder records every flip in its ring buffer and
+        summarizes the intervals and dropped frames"""
+        recorder = visual.FrameTimingRecorder(self.win, bufferSize=8)
+        self.win.frameTiming = recorder
+        try:
+            flipTimes = []
+            called = []
+            for frameN in range(12):
+                self.win.callOnFlip(called.append, frameN)
+                flipTimes.append(self.win.flip())
+        finally:
+            self.win.frameTiming = None
+        assert called == list(range(12))
+        assert recorder.nFrames == 12
+        data = recorder.getData()
+        # only the last 8 frames are kept, oldest first
+        assert list(data['frameN']) == list(range(4, 12))
+        assert np.allclose(data['flipTime'], flipTimes[4:])
+        assert np.allclose(data['interval'], np.diff(flipTimes)[3:])
+        for name in ('drawTime', 'swapTime', 'callbackTime'):
+            assert np.all(data[name] >= 0)
+        assert np.all(np.isnan(data['gpuTime']))
+
+        # dropped frames, from the intervals
+        data['interval'] = [0.016, 0.05, 0.04, 0.016, 0.016, 0.1, 0.016,
+                            np.nan]
+        recorder.refreshThreshold = 0.02
+        runs = recorder.droppedFrameRuns(data)
+        assert runs.tolist() == [[5, 2], [9, 1]]
+
+        summary = recorder.summary(percentiles=(50, 99))
+        assert summary['nFrames'] == 8
+        assert summary['interval.p50'] > 0
+        assert np.isnan(summary['gpuTime.p99'])
+
+        fileName = str(tmpdir.join('frameTiming.tsv'))
+        recorder.saveAsText(fileName)
+        saved = np.genfromtxt(fileName, delimiter='\t', names=True)
+        assert list(saved['frameN']) == list(range(4, 12))
+
+        recorder.reset()
+        assert len(recorder.getData()) == 0
+        assert recorder.summary()['nDropped'] == 0
+
+
+def test_frameTimingGpuQueries(monkeypatch):
+    """each frame gets the GPU time of the query begun for it, also after
+    reset() and pause()/resume()"""
+    from psychopy.tools import gltools
+    gpu = {'ns': 0, 'results': {}, 'nQueries': 0}
+
+    def createQueryObject():
+        gpu['nQueries'] += 1
+        return gpu['nQueries']
+
+    def beginQuery(query):
+        gpu['results'][query] = None
+
+    def endQuery(query):
+        gpu['results'][query] = gpu['ns']
+
+    def getQuery(query):
+        assert gpu['results'].get(query) is not None
+        return gpu['results'][query]
+
+    for func in (createQueryObject, beginQuery, endQuery, getQuery):
+        monkeypatch.setattr(gltools, func.__name__, func)
+
+    class _Win(object):
+        refreshThreshold = 0.02
+
+    recorder = visual.FrameTimingRecorder(_Win(), bufferSize=16, gpu=True)
+
+    def flip(frameN, record=True):
+        gpu['ns'] = (frameN + 1) * 1e6  # GPU time of drawing the frame
+        if record:
+            t = frameN * 0.016
+            recorder._beforeSwap()
+            recorder._record(t, t - 0.01, t - 0.001, t)
+
+    for frameN in range(3):
+        flip(frameN)
+    # no query for the first frame, the last one hasn't been read yet
+    assert np.allclose(recorder.getData()['gpuTime'], [np.nan, 0.002, np.nan],
+                       equal_nan=True)
+    recorder.reset()
+    for frameN in range(3, 6):
+        flip(frameN)
+    assert np.allclose(recorder.getData()['gpuTime'], [0.004, 0.005, np.nan],
+                       equal_nan=True)
+    recorder.pause()
+    flip(6, record=False)
+    recorder.resume()
+    for frameN in range(7, 10):
+        flip(frameN)
+    assert np.allclose(recorder.getData()['gpuTime'],
+                       [0.004, 0.005, 0.006, np.nan, 0.009, np.nan],
+                       equal_nan=True)
+
 
 if __name__ == "__main__":
     pytest.main(__file__)
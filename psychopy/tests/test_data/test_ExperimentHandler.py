@@ -101,6 +101,89 @@ class TestExperimentHandler(object):
             contents = f.read()
         assert contents == "mutable,\n[1],\n[9999],\n"
 
+    def test_streamEntries(self):
+        # streamed entries should give the same files as in-memory ones
+        contents = []
+        for stream in [False, True]:
+            fileName = os.path.join(self.tmpDir, 'stream%s' % stream)
+            exp = data.ExperimentHandler(
+                name='testExp',
+                extraInfo={'participant': 'jwp'},
+                savePickle=False,
+                saveWideText=False,
+                dataFileName=fileName,
+                streamEntries=stream
+            )
+            trials = data.TrialHandler(
+                trialList=[{'ori': 0}, {'ori': 90}], nReps=3,
+                method='sequential', name='trials')
+            exp.addLoop(trials)
+            for trial in trials:
+                exp.addData('resp.rt', 0.5 + trials.thisN / 10.0)
+                exp.addData('resp.keys', [u'left', u'ü'])
+                if trials.thisN > 2:
+                    # a column that only appears part way through
+                    exp.addData('late', (1, 2))
+                exp.nextEntry()
+            assert len(exp.entries) == (0 if stream else 6)
+            assert len(exp.getAllEntries()) == 6
+            exp.saveAsWideText(fileName + '.csv', delim=',')
+            with io.open(fileName + '.csv', 'r', encoding='utf-8-sig') as f:
+                contents.append(f.read())
+            exp.abort()
+            exp.close()
+        assert contents[0] == contents[1]
+        # the stream was kept because nothing was saved by close()
+        assert os.path.isfile(os.path.join(self.tmpDir,
+                                           'streamTrue_entries.jsonl'))
+
+    def test_streamEntries_values(self):
+        # values JSON can't store are read back as they were added
+        values = {'f32': np.float32(0.1), 'f64': np.float64(1 / 3.0),
+                  'i16': np.int16(-3), 'b': np.bool_(False), 'int': 7,
+                  'float': 0.25, 'none': None, 'text': u'a, "b"',
+                  'list': [1, 2.5, u'x', np.float32(0.2)],
+                  'tuple': (1, (2, 3), [4]), 'array': np.arange(3.0),
+                  'dict': {'a': 1, 2: (np.int32(3), None)}}
+        contents = []
+        for stream in [False, True]:
+            fileName = os.path.join(self.tmpDir, 'values%s' % stream)
+            exp = data.ExperimentHandler(savePickle=False, saveWideText=False,
+                                         dataFileName=fileName,
+                                         streamEntries=stream)
+            for name, value in values.items():
+                exp.addData(name, value)
+            exp.nextEntry()
+            entry = exp.getAllEntries()[0]
+            for name, value in values.items():
+                assert type(entry[name]) is type(value)
+                assert str(entry[name]) == str(value)
+            exp.saveAsWideText(fileName + '.csv', delim=',')
+            with io.open(fileName + '.csv', 'r', encoding='utf-8-sig') as f:
+                contents.append(f.read())
+            exp.abort()
+            exp.close()
+        assert contents[0] == contents[1]
+        assert '\n0.1,' in contents[1]
+
+    def test_streamEntries_recovery(self):
+        fileName = os.path.join(self.tmpDir, 'crashed')
+        exp = data.ExperimentHandler(savePickle=False, saveWideText=True,
+                                     dataFileName=fileName,
+                                     streamEntries=True)
+        for ii in range(5):
+            exp.addData('n', ii)
+            exp.nextEntry()
+        streamFileName = exp._stream.fileName
+        # simulate a crash part way through writing the next entry
+        with io.open(streamFileName, 'a', encoding='utf-8') as f:
+            f.write(u'{"0": 5')
+        entries = list(data.stream.readEntries(streamFileName))
+        assert entries == [{'n': ii} for ii in range(5)]
+        exp.close()
+        assert not os.path.isfile(streamFileName)
+        assert os.path.isfile(fileName + '.csv')
+
     def test_unicode_conditions(self):
         fileName = self.tmpDir + 'unicode_conds'
 
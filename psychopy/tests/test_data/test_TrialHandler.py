@@ -335,6 +335,97 @@ class TestTrialHandlerOutput(object):
 
         assert header == expected_header
 
+    def test_output_dataframe(self):
+        _, path = mkstemp(dir=self.temp_dir, suffix='.csv')
+        self.trials.extraInfo = {'participant': 'jwp'}
+        df = self.trials.saveAsWideText(path, delim=',')
+        self.trials.extraInfo = None
+
+        assert len(df) == 15
+        assert list(df['TrialNumber']) == list(range(1, 16))
+        assert (df['participant'] == 'jwp').all()
+        # each response matches the trial type of its own row
+        assert list(df['resp']) == ['resp%i' % tt for tt in df['trialType']]
+        assert df['rand'].dtype.kind == 'f'
+
+        with io.open(path, 'r', encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+        assert len(lines) == 16
+        assert lines[1].split(',')[:2] == ['jwp', '1']
+
+
+class TestDataHandler(object):
+    def setup_method(self, method):
+        self.dat = data.DataHandler(dataShape=[2, 3])
+
+    def test_numeric(self):
+        self.dat.add('rt', 0.5, position=[0, 0])
+        self.dat.add('rt', 1, position=[1, 2])
+        assert isinstance(self.dat['rt'], np.ma.MaskedArray)
+        assert self.dat['rt'].dtype == np.float32
+        assert self.dat['rt'].mask.sum() == 4
+
+    def test_text(self):
+        self.dat.add('resp', 'left', position=[0, 0])
+        assert self.dat['resp'].dtype.kind == 'U'
+        assert self.dat['resp'][1, 1] == '--'
+        # longer text widens the column rather than being truncated
+        self.dat.add('resp', 'a much longer response', position=[1, 1])
+        assert self.dat['resp'].dtype.kind == 'U'
+        assert self.dat['resp'][1, 1] == 'a much longer response'
+        assert self.dat['resp'][0, 0] == 'left'
+
+    def test_textWidened(self):
+        # the column starts as wide as "--" so the first value widens it
+        self.dat.add('resp', 'resp1', position=[0, 0])
+        self.dat.add('resp', 'resp10', position=[0, 1])
+        self.dat.add('resp', 'r', position=[1, 0])
+        assert list(self.dat['resp'][0]) == ['resp1', 'resp10', '--']
+        assert list(self.dat['resp'][1]) == ['r', '--', '--']
+
+    def test_mixed(self):
+        self.dat.add('resp', 0.5, position=[0, 0])
+        self.dat.add('resp', 'left', position=[0, 1])
+        assert self.dat['resp'].dtype.kind == 'O'
+        self.dat.add('resp', 'right', position=[0, 2])
+        self.dat.add('resp', ['left', 'right'], position=[1, 0])
+        assert self.dat['resp'].dtype.kind == 'O'
+        assert list(self.dat['resp'][0]) == ['0.5', 'left', 'right']
+        assert self.dat['resp'][1, 0] == ['left', 'right']
+
+    def test_grow(self):
+        self.dat.add('rt', 0.5, position=[1, 4])
+        assert self.dat['rt'].shape == (2, 6)
+        assert self.dat['rt'][1, 4] == 0.5
+        assert self.dat['rt'].mask.sum() == 11
+        assert self.dat.dataShape == [2, 6]
+        # growing one past the end at least doubles the size
+        self.dat.add('rt', 0.6, position=[1, 6])
+        assert self.dat['rt'].shape == (2, 12)
+        self.dat.add('resp', 'left', position=[1, 12])
+        assert self.dat['resp'].shape == (2, 24)
+        assert self.dat['resp'][1, 12] == 'left'
+        assert self.dat['resp'][0, 0] == '--'
+
+    def test_getMemoryUsage(self):
+        self.dat.add('rt', 0.5, position=[0, 0])
+        self.dat.add('resp', 'left', position=[0, 0])
+        self.dat.add('keys', ['a', 'b'], position=[0, 0])
+        usage = self.dat.getMemoryUsage()
+        assert usage['rt']['dtype'] == 'float32'
+        assert usage['rt']['nbytes'] == 6 * 4 + 6  # values + mask
+        assert usage['resp']['dtype'] == '<U4'
+        assert usage['keys']['dtype'] == 'object'
+        assert usage['keys']['nbytes'] > self.dat['keys'].nbytes
+
+
+def test_occurrenceCounts():
+    from psychopy.data.trial import _occurrenceCounts
+    indices = np.array([2, 0, 2, 2, 0, 1, 0])
+    counts = _occurrenceCounts(indices)
+    assert list(counts) == [0, 0, 1, 2, 1, 0, 2]
+    assert len(_occurrenceCounts([])) == 0
+
 
 if __name__ == '__main__':
     pytest.main()
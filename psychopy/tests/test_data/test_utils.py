@@ -2,8 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import os
+import shutil
+import pickle
 import pytest
 import numpy as np
+from tempfile import mkdtemp
+from psychopy import exceptions
 from psychopy.data import utils
 from psychopy.constants import PY3
 from os.path import join
@@ -142,6 +146,65 @@ class Test_utilsClass:
         assert len(conds) == 6
         assert len(list(conds[0].keys())) == 6
 
+class TestConditionsCache:
+
+    def setup_method(self, method):
+        self.tmpDir = mkdtemp(prefix='psychopy-tests-conditions')
+        self.fileName = join(self.tmpDir, 'conds.csv')
+        with open(self.fileName, 'w') as f:
+            f.write('word,pos\nred,"[0, 1]"\ngreen,"[1, 0]"\nblue,"[1, 1]"\n')
+        utils.clearConditionsCache()
+
+    def teardown_method(self, method):
+        utils.clearConditionsCache()
+        shutil.rmtree(self.tmpDir)
+
+    def test_memoryCache(self, monkeypatch):
+        first = utils.importConditions(self.fileName)
+        assert first[1]['word'] == 'green'
+        # a second import mustn't parse the file again
+        def _fail(*args, **kwargs):
+            raise AssertionError("conditions file was parsed again")
+        monkeypatch.setattr(utils.pd, 'read_csv', _fail)
+        second, fieldNames = utils.importConditions(self.fileName,
+                                                    returnFieldNames=True)
+        assert second == first
+        assert fieldNames == ['word', 'pos']
+        assert utils.importConditions(self.fileName, selection='1:') == \
+            first[1:]
+        assert utils.importConditions(self.fileName, selection=[2, 0]) == \
+            [first[2], first[0]]
+        # each import gets its own copy
+        second[0]['pos'].append(99)
+        second[0]['word'] = 'changed'
+        third = utils.importConditions(self.fileName)
+        assert third[0] == {'word': 'red', 'pos': [0, 1]}
+
+    def test_fileChanged(self):
+        utils.importConditions(self.fileName)
+        with open(self.fileName, 'w') as f:
+            f.write('word,pos\nyellow,"[0, 1]"\n')
+        conds = utils.importConditions(self.fileName)
+        assert len(conds) == 1
+        assert conds[0]['word'] == 'yellow'
+
+    def test_invalidNamesNotCached(self):
+        fileName = join(self.tmpDir, 'conds.pkl')
+        with open(fileName, 'wb') as f:
+            pickle.dump([['bad name', 'pos'], ['red', 1]], f)
+        for attempt in range(2):
+            with pytest.raises(exceptions.ConditionsImportError):
+                utils.importConditions(fileName)
+
+    def test_diskCache(self, monkeypatch):
+        first = utils.importConditions(self.fileName, diskCache=True)
+        assert os.path.isfile(self.fileName + '.psycache')
+        utils.clearConditionsCache()  # as in a new session
+        monkeypatch.setattr(utils.pd, 'read_csv', None)
+        second = utils.importConditions(self.fileName, diskCache=True)
+        assert second == first
+
+
 def test_listFromString():
     assert ['yes', 'no'] == utils.listFromString("yes, no")
     assert ['yes', 'no'] == utils.listFromString("[yes, no]")
@@ -0,0 +1,203 @@
+"""Tests for saving events in the ioDataStore (hdf5) file."""
+import pytest
+
+tables = pytest.importorskip('tables')
+
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.datastore import DataStoreFile
+from psychopy.iohub.devices.experiment import Experiment, MessageEvent
+
+
+def _messageEvent(n, text):
+    return [0, 0, 0, n, MessageEvent.EVENT_TYPE_ID, 1.0 + n, 1.0 + n, 1.0 + n,
+            0.0, 0.0, 0, 0.0, u'cat', text]
+
+
+def _makeDataStore(tmpdir, **settings):
+    EventConstants.addClassMappings([MessageEvent.EVENT_TYPE_ID],
+                                    {'MessageEvent': MessageEvent})
+    dsfile = DataStoreFile('events.hdf5', str(tmpdir), 'w', settings)
+    dsfile.updateDataStoreStructure(Experiment.__new__(Experiment),
+                                    {'MessageEvent': MessageEvent})
+    dsfile.createOrUpdateExperimentEntry([0, 'exp', '', '', ''])
+    dsfile.createExperimentSessionEntry(dict(code='s1', name='', comments='',
+                                             user_variables='{}'))
+    return dsfile
+
+
+def _messageTable(dsfile):
+    return dsfile.TABLES[MessageEvent.IOHUB_DATA_TABLE]
+
+
+def test_writeBuffer(tmpdir):
+    dsfile = _makeDataStore(tmpdir, write_buffer_size=10, write_interval=60)
+    try:
+        for n in range(25):
+            dsfile._handleEvent(_messageEvent(n, u'msg %d' % n))
+        # written in chunks of 10 events
+        assert _messageTable(dsfile).nrows == 20
+        stats = dsfile.getWriteStats()
+        assert stats['pending_events'] == 5
+        assert stats['write_count'] == 2
+        assert stats['events_written'] == 20
+        assert stats['max_pending_events'] == 10
+
+        # nothing new since the last idle check was queued, so write
+        dsfile.writePendingEventsIfIdle()
+        assert _messageTable(dsfile).nrows == 20
+        dsfile.writePendingEventsIfIdle()
+        assert _messageTable(dsfile).nrows == 25
+
+        dsfile._handleEvents([_messageEvent(n, u'batch') for n in range(3)])
+        dsfile.flush()
+        rows = _messageTable(dsfile).read()
+        assert len(rows) == 28
+        assert list(rows['event_id'][:25]) == list(range(25))
+        assert rows['text'][3] == b'msg 3'
+        assert (rows['session_id'] == dsfile.active_session_id).all()
+    finally:
+        dsfile.close()
+
+
+def test_badEventNotLost(tmpdir):
+    dsfile = _makeDataStore(tmpdir, write_buffer_size=4, write_interval=60)
+    try:
+        events = [_messageEvent(n, u'ok') for n in range(4)]
+        events[1][5] = 'not a time'  # can not be saved
+        for e in events:
+            dsfile._handleEvent(e)
+        rows = _messageTable(dsfile).read()
+        assert list(rows['event_id']) == [0, 2, 3]
+    finally:
+        dsfile.close()
+
+
+def test_compressionAndRepack(tmpdir):
+    from psychopy.iohub.datastore.util import repackHubFile
+    dsfile = _makeDataStore(tmpdir, compression_lib='zlib',
+                            compression_level=3, shuffle=True,
+                            expected_rows={'default': 100,
+                                           'MESSAGE': 100000})
+    try:
+        table = _messageTable(dsfile)
+        assert table.filters.complevel == 3
+        assert table.filters.shuffle
+        small = dsfile.eventTableExpectedRows('KEYBOARD_INPUT')
+        assert small == 100
+        for n in range(2000):
+            dsfile._handleEvent(_messageEvent(n, u'msg %d' % (n % 10)))
+    finally:
+        dsfile.close()
+
+    filePath = str(tmpdir.join('events.hdf5'))
+    outPath, before, after = repackHubFile(filePath,
+                                           str(tmpdir.join('packed.hdf5')),
+                                           complib='zlib', complevel=9)
+    assert after < before
+    packed = tables.open_file(outPath, 'r')
+    try:
+        assert packed.title == 'ioHub DataStore - Experiment Data File.'
+        table = packed.get_node('/data_collection/events/experiment/MessageEvent')
+        assert table.filters.complevel == 9
+        assert table.nrows == 2000
+        assert table[5]['text'] == b'msg 5'
+    finally:
+        packed.close()
+
+
+def test_repackKeepsIndexes(tmpdir):
+    from psychopy.iohub.datastore.util import repackHubFile
+    dsfile = _makeDataStore(tmpdir, write_buffer_size=100)
+    for n in range(500):
+        dsfile._handleEvent(_messageEvent(n, u'msg'))
+    dsfile.close()  # indexes the event tables
+
+    filePath = str(tmpdir.join('events.hdf5'))
+    outPath, _, _ = repackHubFile(filePath, complib='zlib', complevel=5)
+    assert outPath == filePath
+    packed = tables.open_file(outPath, 'r')
+    try:
+        table = packed.get_node(
+            '/data_collection/events/experiment/MessageEvent')
+        assert table.nrows == 500
+        for cname in DataStoreFile.EVENT_TABLE_INDEX_COLUMNS:
+            col = table.cols._f_col(cname)
+            assert col.is_indexed
+            assert col.index.is_csi
+        rows = table.read_where('(time >= 10) & (time < 20)')
+        assert len(rows) == 10
+    finally:
+        packed.close()
+
+
+def test_indexedTrialQueries(tmpdir):
+    from psychopy.iohub.datastore.util import ExperimentDataAccessUtility
+    dsfile = _makeDataStore(tmpdir, write_buffer_size=100)
+    dsfile.initConditionVariableTable(dsfile.active_experiment_id,
+                                      dsfile.active_session_id,
+                                      [('trial', 'i4'), ('start', 'f8'),
+                                       ('stop', 'f8'), ('label', 'S8')])
+    for n in range(1000):
+        dsfile._handleEvent(_messageEvent(n, u'msg'))
+    for trial in range(10):
+        dsfile.extendConditionVariableTable(
+            dsfile.active_experiment_id, dsfile.active_session_id,
+            [trial, trial * 100 + 1.0, trial * 100 + 50.0,
+             'odd' if trial % 2 else 'even'])
+    sessionID = dsfile.active_session_id
+    dsfile.close()
+
+    dataAccess = ExperimentDataAccessUtility(str(tmpdir), 'events.hdf5')
+    try:
+        table = dataAccess.getEventTable(MessageEvent.EVENT_TYPE_ID)
+        for cname in DataStoreFile.EVENT_TABLE_INDEX_COLUMNS:
+            assert table.colindexes[cname].is_csi
+
+        cvs = dataAccess.getConditionVariables(
+            dict(label=('==', 'odd'), trial=('>', 4)))
+        assert [cv.trial for cv in cvs] == [5, 7, 9]
+
+        starts = [cv.start for cv in cvs]
+        stops = [cv.stop for cv in cvs]
+        trials = dataAccess.getEventsForTrials(MessageEvent.EVENT_TYPE_ID,
+                                               starts, stops, sessionID)
+        allEvents = table.read()
+        for trialEvents, start, stop in zip(trials, starts, stops):
+            expected = allEvents[(allEvents['time'] >= start) &
+                                 (allEvents['time'] <= stop)]
+            assert (trialEvents == expected).all()
+            assert len(trialEvents) == 50
+        # views of the same array
+        assert trials[0].base is not None
+        assert trials[0].base is trials[1].base
+
+        times = dataAccess.getEventsForTrials(MessageEvent.EVENT_TYPE_ID,
+                                              [0.0], [10.0], fields=['time'])
+        assert times[0].dtype.names == ('time',)
+        assert len(times[0]) == 10
+    finally:
+        dataAccess.close()
+
+
+def test_sessionMetrics(tmpdir):
+    from psychopy.iohub.datastore.util import ExperimentDataAccessUtility
+    from psychopy.iohub.metrics import MetricsRegistry
+    dsfile = _makeDataStore(tmpdir, write_buffer_size=10)
+    dsfile.metrics = MetricsRegistry()
+    for n in range(25):
+        dsfile._handleEvent(_messageEvent(n, u'msg'))
+    dsfile.flush()
+    sessionID = dsfile.active_session_id
+    dsfile.saveMetrics(sessionID, dsfile.metrics.asDict())
+    dsfile.close()
+
+    dataAccess = ExperimentDataAccessUtility(str(tmpdir), 'events.hdf5')
+    try:
+        metrics = dataAccess.getSessionMetrics(sessionID)
+        assert metrics['counters']['datastore.events_written'] == 25
+        assert metrics['histograms']['datastore.write']['count'] == 3
+        assert 'datastore.write.%s' % MessageEvent.IOHUB_DATA_TABLE in \
+            metrics['histograms']
+        assert dataAccess.getSessionMetrics(sessionID + 1) is None
+    finally:
+        dataAccess.close()
@@ -0,0 +1,126 @@
+"""Tests for the moving window event field filters used by ioHub device event
+filters."""
+import numpy as np
+
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.devices import eventfilters
+from psychopy.iohub.devices.eyetracker.eye_events import \
+    MonocularEyeSampleEvent
+from psychopy.iohub.devices.eventfilters import RunningMedian
+
+
+def _windowFilter(name, window):
+    if name == 'MovingWindowFilter':
+        return window.astype(np.float64).mean()
+    if name == 'MedianFilter':
+        return np.median(window)
+    if name == 'WeightedAverageFilter':
+        return np.convolve(window, np.array([1, 2, 5, 3, 1]) / 12.0,
+                           'valid')[0]
+    e1, e2, e3 = window
+    if e1 < e2 < e3 or e3 < e2 < e1:
+        return e2
+    return (e1 + e3) / 2.0
+
+
+FILTERS = [
+    ('MovingWindowFilter', dict(length=9, knot_pos='center')),
+    ('MedianFilter', dict(length=9, knot_pos='center')),
+    ('MedianFilter', dict(length=10, knot_pos=0)),
+    ('WeightedAverageFilter', dict(weights=[1, 2, 5, 3, 1],
+                                   knot_pos='center')),
+    ('StampFilter', dict(level=1)),
+]
+
+
+def test_addAndAddBatch():
+    rng = np.random.RandomState(0)
+    values = rng.normal(0, 10, 3000).astype(np.float32)
+    for name, kwargs in FILTERS:
+        filter_class = getattr(eventfilters, name)
+        length = filter_class(**kwargs)._filtering_buffer.max_size
+        expected = [_windowFilter(name, values[n - length + 1:n + 1])
+                    for n in range(length - 1, len(values))]
+
+        field_filter = filter_class(**kwargs)
+        results = [field_filter.add(v) for v in values]
+        assert results[:length - 1] == [None] * (length - 1)
+        assert np.allclose([r[1] for r in results[length - 1:]], expected,
+                           atol=1e-5)
+
+        # blocks of any size, including blocks smaller than the window
+        field_filter = filter_class(**kwargs)
+        filtered = []
+        start = 0
+        for size in (0, 1, 3, length - 2, 7, 100, 1000):
+            filtered.extend(field_filter.add_batch(values[start:start + size]))
+            start += size
+        filtered.extend(field_filter.add(v)[1] for v in values[start:])
+        assert np.allclose(filtered, expected, atol=1e-5)
+
+
+def test_addBatchEvents():
+    EventConstants.addClassMappings(
+        [MonocularEyeSampleEvent.EVENT_TYPE_ID],
+        {'MonocularEyeSampleEvent': MonocularEyeSampleEvent})
+    gaze_x = MonocularEyeSampleEvent.CLASS_ATTRIBUTE_NAMES.index('gaze_x')
+    events = []
+    for n in range(20):
+        evt = [0] * len(MonocularEyeSampleEvent.CLASS_ATTRIBUTE_NAMES)
+        evt[3] = n
+        evt[gaze_x] = float(n ** 2)
+        events.append(evt)
+    batch_events = [list(e) for e in events]
+
+    kwargs = dict(length=3, knot_pos=0, inplace=True,
+                  event_type=MonocularEyeSampleEvent.EVENT_TYPE_ID,
+                  event_field_name='gaze_x')
+    field_filter = eventfilters.MovingWindowFilter(**kwargs)
+    expected = [field_filter.add(e) for e in events]
+
+    field_filter = eventfilters.MovingWindowFilter(**kwargs)
+    results = field_filter.add_batch(batch_events[:5])
+    results += field_filter.add_batch(batch_events[5:])
+    assert results == [r for r in expected if r]
+    assert batch_events == events
+
+
+def test_runningMedian():
+    rng = np.random.RandomState(1)
+    values = rng.randint(0, 5, 500).astype(float)
+    median = RunningMedian()
+    for n, value in enumerate(values):
+        median.add(value)
+        if n >= 6:
+            median.remove(values[n - 6])
+        assert len(median) == min(n + 1, 6)
+        assert median.median() == np.median(values[max(0, n - 5):n + 1])
+    median.add(np.nan)
+    assert np.isnan(median.median())
+    median.remove(np.nan)
+    assert median.median() == np.median(values[-6:])
+
+
+def test_movingWindowNaN():
+    # the average recovers as soon as a missing (NaN) sample leaves the window
+    values = np.array([1, 2, np.nan, 1, 2, 3, 4, np.inf, 5, 6, 7, 8, 9],
+                      dtype=np.float32)
+    expected = [values[n - 2:n + 1].astype(np.float64).mean()
+                for n in range(2, len(values))]
+    field_filter = eventfilters.MovingWindowFilter(length=3, knot_pos=0)
+    results = [field_filter.add(v) for v in values]
+    filtered = [r[1] for r in results[2:]]
+    np.testing.assert_allclose(filtered, expected)
+    assert np.isnan(filtered[0])
+    assert filtered[3] == 2.0
+
+    field_filter = eventfilters.MovingWindowFilter(length=3, knot_pos=0)
+    filtered = list(field_filter.add_batch(values[:4]))
+    filtered.extend(field_filter.add_batch(values[4:]))
+    np.testing.assert_allclose(filtered, expected)
+    # the window left by add_batch still holds the NaN count
+    field_filter = eventfilters.MovingWindowFilter(length=3, knot_pos=0)
+    field_filter.add_batch(values[:3])
+    assert np.isnan(field_filter.add(1.0)[1])
+    assert np.isnan(field_filter.add(2.0)[1])
+    assert field_filter.add(3.0)[1] == 2.0
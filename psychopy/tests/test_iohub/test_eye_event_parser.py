@@ -0,0 +1,117 @@
+"""Tests for the batch eye event parser, which should create the same events
+as the live ioHub eye event parser for recorded samples."""
+import numpy as np
+
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.devices.eyetracker import eye_events
+from psychopy.iohub.devices.eyetracker.filters.parser import (
+    EyeTrackerEventParser, BatchEyeEventParser, parseSessions)
+
+EVENT_CLASSES = ('MonocularEyeSampleEvent', 'BinocularEyeSampleEvent',
+                 'FixationStartEvent', 'FixationEndEvent',
+                 'SaccadeStartEvent', 'SaccadeEndEvent', 'BlinkStartEvent',
+                 'BlinkEndEvent')
+
+
+def _parserSettings():
+    return dict(display_device=dict(mm_size=dict(width=500, height=280),
+                                    pixel_res=(1920, 1080),
+                                    eye_distance=550),
+                sampling_rate=500, adaptive_vel_thresh_history=1.0)
+
+
+def _binocularSamples(nSamples, session_id=1, seed=1, rate=500.0):
+    """Fixations at random positions, with saccades between them, blinks
+    and some samples with data from only one eye."""
+    rng = np.random.RandomState(seed)
+    samples = np.zeros(nSamples,
+                       dtype=eye_events.BinocularEyeSampleEvent.NUMPY_DTYPE)
+    samples['session_id'] = session_id
+    samples['event_id'] = np.arange(nSamples)
+    samples['type'] = EventConstants.BINOCULAR_EYE_SAMPLE
+    for field in ('device_time', 'logged_time', 'time'):
+        samples[field] = np.arange(nSamples) / rate
+
+    gaze = np.zeros((nSamples, 2))
+    position = np.zeros(2)
+    start = 0
+    while start < nSamples:
+        target = rng.uniform(-400, 400, 2)
+        nSaccade = rng.randint(5, 15)
+        steps = np.arange(1, nSaccade + 1)[:, None] / float(nSaccade)
+        gaze[start:start + nSaccade] = (position +
+                                        (target - position) * steps)[
+                                            :nSamples - start]
+        end = start + rng.randint(100, 200)
+        gaze[start + nSaccade:end] = target
+        position = target
+        start = end
+    gaze += rng.normal(0, 0.5, gaze.shape)
+    for eye, offset in (('left', 0.0), ('right', 2.0)):
+        samples[eye + '_gaze_x'] = gaze[:, 0] + offset
+        samples[eye + '_gaze_y'] = gaze[:, 1]
+        samples[eye + '_pupil_measure1'] = 4.0 + rng.normal(0, .01,
+                                                            nSamples)
+
+    status = np.zeros(nSamples, dtype=int)
+    for start in rng.randint(50, nSamples - 50, nSamples // 700):
+        status[start:start + rng.randint(20, 40)] = 22
+    for start in rng.randint(50, nSamples - 50, nSamples // 500):
+        status[start:start + 3] = rng.choice([2, 20])
+    status[:3] = 22
+    samples['status'] = status
+    return samples
+
+
+def _liveParserEvents(samples):
+    parser = EyeTrackerEventParser(**_parserSettings())
+    for sample in samples.tolist():
+        parser._addInputEvent(list(sample))
+    sample_types = (EventConstants.BINOCULAR_EYE_SAMPLE,
+                    EventConstants.MONOCULAR_EYE_SAMPLE)
+    return [e for e in parser._removeOutputEvents()
+            if e[4] not in sample_types]
+
+
+def _assertSameEvents(events, expected):
+    assert len(events) == len(expected)
+    for evt, expected_evt in zip(events, expected):
+        assert evt[4] == expected_evt[4]
+        assert len(evt) == len(expected_evt)
+        # event_id and filter_id are given by the ioHub Server
+        evt = np.array(evt[:3] + evt[4:10] + evt[11:], dtype=float)
+        expected_evt = np.array(expected_evt[:3] + expected_evt[4:10] +
+                                expected_evt[11:], dtype=float)
+        assert np.allclose(evt, expected_evt, rtol=1e-3, atol=1e-3,
+                           equal_nan=True)
+
+
+def test_batchParserMatchesLiveParser():
+    EventConstants.addClassMappings(
+        [getattr(eye_events, c).EVENT_TYPE_ID for c in EVENT_CLASSES],
+        dict((c, getattr(eye_events, c)) for c in EVENT_CLASSES))
+    samples = _binocularSamples(3000)
+    expected = _liveParserEvents(samples)
+
+    parser = BatchEyeEventParser(**_parserSettings())
+    events = parser.parse(samples, as_type='list')
+    _assertSameEvents(events, expected)
+    event_types = set(e[4] for e in events)
+    for event_type in ('FIXATION_START', 'FIXATION_END', 'SACCADE_START',
+                       'SACCADE_END', 'BLINK_START', 'BLINK_END'):
+        assert getattr(EventConstants, event_type) in event_types
+
+    arrays = parser.parse(samples)
+    for event_type, event_array in arrays.items():
+        assert len(event_array) == len([e for e in events
+                                        if e[4] == event_type])
+        assert (event_array['type'] == event_type).all()
+
+    # sessions are split, sorted by time and parsed in separate processes
+    sessions = np.concatenate([_binocularSamples(3000, 2, seed=2)[::-1],
+                               samples])
+    session_events = parseSessions(sessions, processes=2, as_type='list',
+                                   **_parserSettings())
+    assert list(session_events.keys()) == [1, 2]
+    _assertSameEvents(session_events[1], expected)
+    assert len(session_events[2])
@@ -0,0 +1,71 @@
+"""Tests for the ioHub Server metrics counters and histograms."""
+import numpy as np
+
+from psychopy.iohub.metrics import Histogram, MetricsRegistry
+
+
+def test_histogramPercentiles():
+    rng = np.random.RandomState(0)
+    values = rng.lognormal(-7, 1.5, 20000)
+    hist = Histogram()
+    for value in values:
+        hist.record(value)
+    stats = hist.asDict()
+    assert stats['count'] == len(values)
+    assert stats['min'] == values.min()
+    assert stats['max'] == values.max()
+    assert np.isclose(stats['mean'], values.mean())
+    ordered = np.sort(values)
+    for percent in Histogram.PERCENTILES:
+        # nearest rank percentile
+        expected = ordered[int(np.ceil(len(values) * percent / 100.0)) - 1]
+        # within the bucket resolution, or the 1 usec unit for small values
+        assert abs(stats['p%g' % percent] - expected) <= max(expected / 128.,
+                                                             1e-6)
+    # a few hundred buckets for values spanning many orders of magnitude
+    assert len(hist._counts) < 4000
+
+    hist.reset()
+    assert hist.asDict()['p50'] is None
+    hist.record(-0.001)
+    assert hist.asDict()['p50'] == -0.001
+
+
+def test_registry():
+    metrics = MetricsRegistry()
+    metrics.count('datastore.events_written', 20)
+    metrics.count('datastore.events_written')
+    for n in range(3):
+        with metrics.timer('request.GET_EVENTS'):
+            pass
+    metrics.record('datastore.write', 0.002)
+    metrics.histogram('unused')
+
+    stats = metrics.asDict()
+    assert stats['counters'] == {'datastore.events_written': 21}
+    assert sorted(stats['histograms']) == ['datastore.write',
+                                           'request.GET_EVENTS']
+    timing = stats['histograms']['request.GET_EVENTS']
+    assert timing['count'] == 3
+    assert 0.0 <= timing['min'] <= timing['p50'] <= timing['max'] < 0.1
+
+    metrics.reset()
+    assert metrics.asDict() == dict(counters={}, histograms={})
+
+
+def test_overlappingTimers(monkeypatch):
+    # e.g. requests handled in different greenlets
+    from psychopy.iohub import metrics as metricsModule
+    now = [0.0]
+    monkeypatch.setattr(metricsModule, 'getTime', lambda: now[0])
+    metrics = MetricsRegistry()
+    outer = metrics.timer('request.WAIT_FOR_EVENTS')
+    with outer:
+        now[0] = 1.0
+        with metrics.timer('request.WAIT_FOR_EVENTS'):
+            now[0] = 1.5
+        now[0] = 3.0
+    timing = metrics.asDict()['histograms']['request.WAIT_FOR_EVENTS']
+    assert timing['count'] == 2
+    assert timing['min'] == 0.5
+    assert timing['max'] == 3.0
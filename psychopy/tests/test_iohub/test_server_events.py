@@ -0,0 +1,169 @@
+"""Tests for event driven event processing by the ioHub Server."""
+import threading
+from collections import deque
+
+import pytest
+
+gevent = pytest.importorskip('gevent')
+
+from psychopy.iohub.constants import DeviceConstants, EventConstants
+from psychopy.iohub.devices import Computer, Device, DeviceEvent
+from psychopy.iohub.devices.keyboard import KeyboardPressEvent
+from psychopy.iohub.metrics import MetricsRegistry
+from psychopy.iohub.server import ioServer, udpServer
+
+
+class _Listener(object):
+    def __init__(self):
+        self.events = []
+
+    def _handleEvent(self, event):
+        self.events.append(event)
+
+
+class _Device(object):
+    """Just what ioServer.processDeviceEvents() needs from a device."""
+    _addNativeEventToBuffer = Device.__dict__['_addNativeEventToBuffer']
+
+    def __init__(self, listener):
+        self._native_event_buffer = deque()
+        self._filters = dict()
+        self.listener = listener
+
+    def isReportingEvents(self):
+        return True
+
+    def _getNativeEventBuffer(self):
+        return self._native_event_buffer
+
+    def _getIOHubEventObject(self, native_event):
+        return native_event
+
+    def _getEventListeners(self, event_type):
+        return [self.listener]
+
+    def _close(self):
+        pass
+
+
+def _event(event_time, event_type=0):
+    evt = [0] * 8
+    evt[DeviceEvent.EVENT_TYPE_ID_INDEX] = event_type
+    evt[DeviceEvent.EVENT_HUB_TIME_INDEX] = event_time
+    return evt
+
+
+def _server(devices):
+    server = ioServer.__new__(ioServer)
+    server._running = True
+    server.devices = devices
+    server.dsfile = None
+    server.metrics = None
+    server.eventBuffer = deque()
+    server.sharedEventBuffer = None
+    server._eventWaiters = []
+    server._eventDeviceTypes = dict()
+    server._eventsReadyWatcher = None
+    server._hookManager = None
+    server.deviceMonitors = []
+    return server
+
+
+def test_latencyMetrics():
+    listener = _Listener()
+    device = _Device(listener)
+    server = _server([device])
+    handler = udpServer.__new__(udpServer)
+    handler.iohub = server
+
+    # only recorded when metrics are enabled
+    device._addNativeEventToBuffer(_event(Computer.getTime()))
+    server.processDeviceEvents()
+    assert handler.getEventLatencyHistograms() is None
+
+    server.metrics = MetricsRegistry()
+    for delay in (0.002, 0.5):
+        device._addNativeEventToBuffer(_event(Computer.getTime() - delay))
+    server.processDeviceEvents()
+    assert len(listener.events) == 3
+    stats = handler.getEventLatencyHistograms()
+    assert list(stats) == ['_Device']
+    assert stats['_Device'] == \
+        server.metrics.asDict()['histograms']['device._Device.latency']
+    assert stats['_Device']['count'] == 2
+    assert 0.5 <= stats['_Device']['max'] < 1.0
+
+
+def test_eventDrivenProcessing():
+    listener = _Listener()
+    device = _Device(listener)
+    server = _server([device])
+    server.metrics = MetricsRegistry()
+    server._initEventsReadySignal()
+    try:
+        # the processing interval is much longer than the test
+        tasklet = gevent.spawn(server.processEventsTasklet, 30.0)
+        gevent.sleep(0.01)
+
+        # devices can add events from their own threads
+        event = _event(Computer.getTime())
+        thread = threading.Thread(target=device._addNativeEventToBuffer,
+                                  args=(event,))
+        thread.start()
+        thread.join()
+        stime = Computer.getTime()
+        while not listener.events and Computer.getTime() - stime < 5.0:
+            gevent.sleep(0.001)
+        assert listener.events == [event]
+        assert Computer.getTime() - stime < 1.0
+
+        stats = server.metrics.asDict()['histograms'][
+            'device._Device.latency']
+        assert stats['count'] == 1
+        assert 0.0 <= stats['max'] < 1.0
+
+        server._running = False
+        server._eventsReady.set()
+        tasklet.join(timeout=5.0)
+        assert tasklet.dead
+    finally:
+        Device._native_events_ready = None
+        server._eventsReadyWatcher.stop()
+
+
+def test_waitForEvents():
+    EventConstants.addClassMappings(
+        [KeyboardPressEvent.EVENT_TYPE_ID],
+        {'KeyboardPressEvent': KeyboardPressEvent})
+    device = _Device(None)
+    server = _server([device])
+    device.listener = server
+    replies = []
+    handler = udpServer.__new__(udpServer)
+    handler.iohub = server
+    handler.sendResponse = lambda data, address: replies.append(data)
+
+    # nothing arrives before the timeout
+    stime = Computer.getTime()
+    assert server.waitForEvents(None, 0.05) is False
+    assert Computer.getTime() - stime >= 0.04
+
+    # events from other device types do not end the wait
+    waiting = gevent.spawn(handler.handleWaitForEvents,
+                           [[DeviceConstants.KEYBOARD], 5.0], None)
+    gevent.sleep(0.01)
+    other = _event(Computer.getTime())
+    server._handleEvent(other)
+    gevent.sleep(0.01)
+    assert not replies and len(server._eventWaiters) == 1
+
+    key = _event(Computer.getTime(), KeyboardPressEvent.EVENT_TYPE_ID)
+    device._addNativeEventToBuffer(key)
+    server.processDeviceEvents()
+    waiting.join(timeout=1.0)
+    assert replies == [('WAIT_FOR_EVENTS_RESULT', True, [other, key])]
+    assert not server.eventBuffer and not server._eventWaiters
+
+    # events that are already waiting are returned right away
+    server._handleEvent(key)
+    assert server.waitForEvents([DeviceConstants.KEYBOARD], None) is True
@@ -0,0 +1,129 @@
+"""Tests for the shared memory event buffer used between the ioHub Server
+and the experiment process."""
+import pytest
+
+from psychopy.iohub.net import SharedEventBuffer
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.devices.experiment import MessageEvent
+
+pytestmark = pytest.mark.skipif(not SharedEventBuffer.isSupported(),
+                                reason="Requires multiprocessing.shared_memory")
+
+
+def _messageEvent(n, text):
+    return [0, 0, 0, n, MessageEvent.EVENT_TYPE_ID, 1.0 + n, 1.0 + n, 1.0 + n,
+            0.0, 0.0, 0, 0.0, u'cat', text]
+
+
+def test_writeRead():
+    EventConstants.addClassMappings([MessageEvent.EVENT_TYPE_ID],
+                                    {'MessageEvent': MessageEvent})
+    server = SharedEventBuffer(slots=8)
+    client = SharedEventBuffer(server.name)
+    try:
+        events = [_messageEvent(n, u'msg %d' % n) for n in range(5)]
+        for e in events:
+            assert server.write(e)
+        assert server.unreadEventTypes() == [MessageEvent.EVENT_TYPE_ID] * 5
+        assert client.read() == events
+        assert server.unreadEventTypes() == []
+        assert client.read() == []
+        assert not client.hasMissedEvents()
+
+        # text too long for the record layout is not written
+        assert not server.write(_messageEvent(5, u'x' * 200))
+        assert client.hasMissedEvents()
+        assert not client.hasMissedEvents()
+
+        # full buffer
+        for n in range(8):
+            assert server.write(_messageEvent(n, u'full'))
+        assert not server.write(_messageEvent(8, u'full'))
+        assert client.hasMissedEvents()
+        client.clear()
+        assert client.read() == []
+        assert server.write(_messageEvent(9, u'é'))
+        assert client.read()[0][-1] == u'é'
+    finally:
+        client.close()
+        server.close()
+
+
+def test_readArrays():
+    from psychopy.iohub.client import ioHubConnection
+    EventConstants.addClassMappings([MessageEvent.EVENT_TYPE_ID],
+                                    {'MessageEvent': MessageEvent})
+    server = SharedEventBuffer(slots=8)
+    client = SharedEventBuffer(server.name)
+    try:
+        # wrap around the end of the buffer
+        for n in range(6):
+            server.write(_messageEvent(n, u'skip'))
+        client.read()
+        events = [_messageEvent(n, u'msg %d' % n) for n in range(5)]
+        for e in events:
+            server.write(e)
+        arrays = client.readArrays()
+        expected = ioHubConnection.eventListsToNumPy(events)
+        assert list(arrays) == [MessageEvent.EVENT_TYPE_ID]
+        msgs = arrays[MessageEvent.EVENT_TYPE_ID]
+        assert (msgs == expected[MessageEvent.EVENT_TYPE_ID]).all()
+        assert msgs['text'][3] == b'msg 3'
+        assert client.readArrays() == {}
+    finally:
+        client.close()
+        server.close()
+
+
+def test_clearEvents():
+    from psychopy.iohub.client import ioHubConnection
+    EventConstants.addClassMappings([MessageEvent.EVENT_TYPE_ID],
+                                    {'MessageEvent': MessageEvent})
+    server = SharedEventBuffer(slots=8)
+    io = ioHubConnection.__new__(ioHubConnection)
+    io._shared_events = SharedEventBuffer(server.name)
+    io.allEvents = []
+
+    def sendToHubServer(request):
+        # the server processes pending device events before clearing, which
+        # shares them with the client
+        if request[:2] == ('RPC', 'clearEventBuffer'):
+            server.write(_messageEvent(1, u'pending'))
+        return request[0], None
+    io._sendToHubServer = sendToHubServer
+    try:
+        server.write(_messageEvent(0, u'unread'))
+        io.clearEvents()
+        assert io.getEvents(as_type='list') == []
+        server.write(_messageEvent(2, u'new'))
+        io.clearEvents('')  # the global event buffer only
+        assert io.getEvents(as_type='list') == []
+    finally:
+        io._shared_events.close()
+        server.close()
+
+
+def test_readArraysOrder():
+    # events written out of hub time order come back in the order of the
+    # list path of getEvents()
+    from psychopy.iohub.client import ioHubConnection
+    EventConstants.addClassMappings([MessageEvent.EVENT_TYPE_ID],
+                                    {'MessageEvent': MessageEvent})
+    server = SharedEventBuffer(slots=8)
+    io = ioHubConnection.__new__(ioHubConnection)
+    io._shared_events = SharedEventBuffer(server.name)
+    io.allEvents = []
+    try:
+        order = [3, 0, 4, 1, 2]
+        for n in order:
+            server.write(_messageEvent(n, u'msg %d' % n))
+        msgs = io.getEvents(as_type='numpy')[MessageEvent.EVENT_TYPE_ID]
+        assert list(msgs['event_id']) == sorted(order)
+        assert (msgs['time'][1:] >= msgs['time'][:-1]).all()
+        for n in order:
+            server.write(_messageEvent(n, u'msg %d' % n))
+        listed = io.getEvents(as_type='list')
+        assert [e[3] for e in listed] == list(msgs['event_id'])
+    finally:
+        io._shared_events.close()
+        server.close()
@@ -0,0 +1,55 @@
+"""Tests for ioHubConnection.waitForEvents() on the experiment process side."""
+import socket
+import threading
+import time
+
+import msgpack
+import pytest
+
+gevent = pytest.importorskip('gevent')
+
+from psychopy.iohub.net import UDPClientConnection
+
+
+class _SlowServer(threading.Thread):
+    """Replies to each request after a delay, like the ioHub Server holding
+    a WAIT_FOR_EVENTS request until its timeout."""
+
+    def __init__(self, replies, delay):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.replies = replies
+        self.delay = delay
+        self.requests = []
+
+    def run(self):
+        for reply in self.replies:
+            data, address = self.sock.recvfrom(64 * 1024)
+            self.requests.append(msgpack.unpackb(data, raw=False))
+            time.sleep(self.delay)
+            self.sock.sendto(msgpack.packb(reply), address)
+
+
+def test_waitLongerThanSocketTimeout():
+    from psychopy.iohub.client import ioHubConnection
+    server = _SlowServer([('WAIT_FOR_EVENTS_RESULT', False, None),
+                          ('GET_EVENTS_RESULT', None)], delay=0.3)
+    server.start()
+    io = ioHubConnection.__new__(ioHubConnection)
+    io.udp_client = UDPClientConnection(remote_port=server.port, timeout=0.1)
+    io._shared_events = None
+    io.allEvents = []
+    try:
+        assert io.waitForEvents(['keyboard'], timeout=0.3) == []
+        assert io.udp_client.sock.gettimeout() == 0.1
+        assert server.requests[0][0] == 'WAIT_FOR_EVENTS'
+        # the next request gets its own reply
+        io.udp_client.sock.settimeout(1.0)
+        assert io._sendToHubServer(('GET_EVENTS',)) == [
+            'GET_EVENTS_RESULT', None]
+    finally:
+        io.udp_client.close()
+        server.sock.close()
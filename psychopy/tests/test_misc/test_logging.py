@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for psychopy.logging
+
+"""
+from __future__ import print_function
+
+import io
+import threading
+import pytest
+
+from psychopy import logging
+
+
+def _makeLogger(level=logging.DEBUG):
+    logger = logging._Logger(format="%(levelname)s %(message)s")
+    stream = io.StringIO()
+    logging.LogFile(stream, level=level, logger=logger)
+    return logger, stream
+
+
+class TestLogger(object):
+    def test_flush(self):
+        logger, stream = _makeLogger(level=logging.EXP)
+        logger.log('hidden', level=logging.DEBUG, t=0)
+        logger.log('one', level=logging.EXP, t=0)
+        logger.log('two', level=logging.DATA, t=0)
+        assert stream.getvalue() == ''
+        logger.flush()
+        assert stream.getvalue() == 'EXP one\nDATA two\n'
+        assert len(logger.flushed) == 2
+        assert logger.toFlush == []
+
+
+class TestBackgroundWriter(object):
+    def test_writesInOrder(self):
+        logger, stream = _makeLogger()
+        logger.startBackgroundWriter(interval=0.01)
+        assert logger.backgroundWriting
+        for ii in range(500):
+            logger.log('msg %i' % ii, level=logging.EXP, t=ii)
+        logger.flush()  # must not block or write from this thread
+        logger.stopBackgroundWriter()
+        assert not logger.backgroundWriting
+        lines = stream.getvalue().splitlines()
+        assert lines == ['EXP msg %i' % ii for ii in range(500)]
+        assert len(logger.flushed) == 500
+
+    def test_writesFromOtherThread(self):
+        writerThreads = set()
+
+        class _Stream(io.StringIO):
+            def write(self, txt):
+                writerThreads.add(threading.current_thread().name)
+                return io.StringIO.write(self, txt)
+
+        logger = logging._Logger()
+        logging.LogFile(_Stream(), level=logging.DEBUG, logger=logger)
+        logger.startBackgroundWriter(interval=0.01)
+        logger.log('hello', level=logging.DATA, t=0)
+        logger.stopBackgroundWriter()
+        assert writerThreads == {'PsychoPyLogWriter'}
+
+    def test_logWhileStopping(self):
+        logger, stream = _makeLogger()
+        logger.startBackgroundWriter(maxQueueSize=1, overflow='dropOldest',
+                                     interval=0.01)
+        logger.log('first', level=logging.EXP, t=0)
+        # stop the writer after log() has picked up the queue but before it
+        # adds the entry, as another thread could
+        logger._handleOverflow = lambda queue: logger.stopBackgroundWriter()
+        logger.log('second', level=logging.EXP, t=1)
+        assert not logger.backgroundWriting
+        logger.flush()
+        lines = stream.getvalue().splitlines()
+        assert lines == ['EXP first', 'EXP second']
+
+    def test_dropNewest(self):
+        logger, stream = _makeLogger()
+        logger.startBackgroundWriter(maxQueueSize=10, overflow='dropNewest',
+                                     interval=60)
+        writer = logger._writer
+        # stop the thread consuming so that the queue fills up
+        writer._keepWriting = False
+        writer.wakeEvent.set()
+        writer.join()
+        for ii in range(25):
+            logger.log('msg %i' % ii, level=logging.EXP, t=ii)
+        assert logger.nDropped == 15
+        logger.stopBackgroundWriter()
+        logger.flush()
+        lines = stream.getvalue().splitlines()
+        assert lines == ['EXP msg %i' % ii for ii in range(10)]
+
+    def test_dropOldest(self):
+        logger, stream = _makeLogger()
+        logger.startBackgroundWriter(maxQueueSize=10, overflow='dropOldest',
+                                     interval=60)
+        writer = logger._writer
+        writer._keepWriting = False
+        writer.wakeEvent.set()
+        writer.join()
+        for ii in range(25):
+            logger.log('msg %i' % ii, level=logging.EXP, t=ii)
+        assert logger.nDropped == 15
+        logger.stopBackgroundWriter()
+        logger.flush()
+        lines = stream.getvalue().splitlines()
+        assert lines == ['EXP msg %i' % ii for ii in range(15, 25)]
+
+    def test_block(self):
+        logger, stream = _makeLogger()
+        logger.startBackgroundWriter(maxQueueSize=5, overflow='block',
+                                     interval=0.01)
+        for ii in range(200):
+            logger.log('msg %i' % ii, level=logging.EXP, t=ii)
+        logger.stopBackgroundWriter()
+        assert logger.nDropped == 0
+        assert len(stream.getvalue().splitlines()) == 200
+
+    def test_badOverflow(self):
+        logger, stream = _makeLogger()
+        with pytest.raises(ValueError):
+            logger.startBackgroundWriter(overflow='explode')
+        assert not logger.backgroundWriting
+
+
+class TestLogHistory(object):
+    def test_unlimited(self):
+        logger, stream = _makeLogger()
+        for ii in range(1000):
+            logger.log('msg %i' % ii, level=logging.EXP, t=ii)
+        logger.flush()
+        assert len(logger.flushed) == 1000
+        assert [e.message for e in logger.flushed][-1] == 'msg 999'
+
+    def test_maxEntries(self):
+        logger, stream = _makeLogger()
+        logger.setHistoryLimits(maxEntries=100)
+        for chunk in range(7):
+            for ii in range(chunk * 30, (chunk + 1) * 30):
+                logger.log('msg %i' % ii, level=logging.EXP, t=ii)
+            logger.flush()
+        assert len(logger.flushed) == 100
+        assert [e.t for e in logger.flushed] == list(range(110, 210))
+        # everything was still written
+        assert len(stream.getvalue().splitlines()) == 210
+
+    def test_maxAge(self):
+        logger, stream = _makeLogger()
+        logger.setHistoryLimits(maxAge=5.0)
+        for ii in range(20):
+            logger.log('msg %i' % ii, level=logging.EXP, t=ii * 0.5)
+            logger.flush()
+        assert [e.t for e in logger.flushed] == [ii * 0.5
+                                                 for ii in range(9, 20)]
+
+    def test_maxAgeClockReset(self):
+        logger, stream = _makeLogger()
+        logger.setHistoryLimits(maxAge=5.0)
+        for t in (100., 101., 0., 102.):
+            logger.log('msg %g' % t, level=logging.EXP, t=t)
+            logger.flush()
+        # entries more than 5 s older than the last one, wherever they are
+        assert [e.t for e in logger.flushed] == [100., 101., 102.]
+        for t in (1., 50.):
+            logger.log('msg %g' % t, level=logging.EXP, t=t)
+            logger.flush()
+        assert [e.t for e in logger.flushed] == [100., 101., 102., 50.]
+
+    def test_index(self):
+        logger, stream = _makeLogger()
+        logger.setHistoryLimits(maxEntries=10)
+        for ii in range(25):  # wraps around the ring buffer
+            logger.log('msg %i' % ii, level=logging.EXP, t=ii)
+            logger.flush()
+        history = logger.flushed
+        assert [history[ii].t for ii in range(len(history))] == \
+            list(range(15, 25))
+        assert history[-1].t == 24
+        assert history[-10].t == 15
+        assert [e.t for e in history[2:5]] == [17, 18, 19]
+        with pytest.raises(IndexError):
+            history[10]
+        with pytest.raises(IndexError):
+            history[-11]
+
+    def test_select(self):
+        logger, stream = _makeLogger()
+        logger.setHistoryLimits(maxEntries=50)
+        levels = [logging.DATA, logging.EXP, logging.WARNING]
+        for ii in range(120):
+            logger.log('msg %i' % ii, level=levels[ii % 3], t=float(ii))
+        logger.flush()
+        data = logger.getHistory(level=logging.DATA)
+        assert [e.t for e in data] == [float(ii) for ii in range(72, 120, 3)]
+        important = logger.getHistory(minLevel=logging.DATA, tStart=100,
+                                      tStop=110)
+        assert [e.t for e in important] == [101., 102., 104., 105., 107.,
+                                            108.]
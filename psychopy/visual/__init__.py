@@ -38,9 +38,11 @@ from .text import TextStim
 from .form import Form
 from .brush import Brush
 from .textbox2.textbox2 import TextBox2
+from .textbox2.batch import TextBox2Batch
 from .button import ButtonStim
 # window, should always be loaded first
 from .window import Window, getMsPerFrame, openWindows
+from .frametiming import FrameTimingRecorder
 
 # needed for backwards-compatibility
 
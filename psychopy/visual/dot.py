@@ -40,6 +40,8 @@ from psychopy import logging
 # (JWP has no idea why!)
 from psychopy.tools.attributetools import attributeSetter, setAttribute
 from psychopy.tools.arraytools import val2array
+from psychopy.tools import gltools
+from psychopy.visual import shaders as _shaders
 from psychopy.visual.basevisual import (BaseVisualStim, ColorMixin,
                                         ContainerMixin)
 
@@ -51,6 +53,15 @@ _piOver180 = np.pi / 180.
 _2pi = 2 * np.pi
 
 
+def _fillRandom(out):
+    """Fill `out` with uniform random values in [0, 1) from numpy's global
+    random state and return it. These are the values `numpy.random.uniform()`
+    would draw, so seeded experiments keep getting the same dots.
+    """
+    np.copyto(out, np.random.random_sample(out.shape))
+    return out
+
+
 class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
     """This stimulus class defines a field of dots with an update rule that
     determines how they change on every call to the .draw() method.
@@ -124,6 +135,9 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
     speed : float
         Speed of the dots (in *units*/frame). :ref:`operations
         <attrib-operations>` are supported.
+    instanced : bool
+        Draw all the dots with a single instanced call from a buffer on the
+        graphics card. Only used when `element` is `None`.
 
     """
     def __init__(self,
@@ -147,6 +161,7 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
                  element=None,
                  signalDots='same',
                  noiseDots='direction',
+                 instanced=False,
                  name=None,
                  autoLog=None):
         """
@@ -223,6 +238,13 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
             random, but constant direction. For 'walk' noise dots vary their
             direction every frame, but keep a constant speed. This value can be
             set using the `noiseDots` property after initialization.
+        instanced : bool
+            If `True` the dot positions are streamed into a vertex buffer on
+            the graphics card and all dots are drawn with one instanced draw
+            call, which is much faster for large numbers of dots. Requires
+            OpenGL 3.3 (or the equivalent extensions), otherwise a warning is
+            given and the dots are drawn as usual. Ignored if `element` is
+            given.
         name : str, optional
             Optional name to use for logging.
         autoLog : bool
@@ -254,6 +276,9 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         self.element = element
         self.dotLife = dotLife
         self.signalDots = signalDots
+        self.instanced = instanced
+        # GL objects for instanced drawing, created on first draw
+        self._dotsVBO = self._dotsVAO = self._dotsProgram = None
 
         self.useShaders = False  # not needed for dots?
         if rgb != None:
@@ -273,8 +298,13 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         self.coherence = coherence  # using the attributeSetter
         self.noiseDots = noiseDots
 
-        # initialise a random array of X,Y
-        self._verticesBase = self._dotsXY = self._newDotsXY(self.nDots)
+        # work arrays for updating the dots on each frame
+        self._allocScratch()
+
+        # initialise a random array of X,Y (column-major, so that the X and Y
+        # columns can each be updated in place)
+        self._verticesBase = self._dotsXY = np.asfortranarray(
+            self._newDotsXY(self.nDots))
         # all dots have the same speed
         self._dotsSpeed = np.ones(self.nDots, dtype=float) * self.speed
         # abs() means we can ignore the -1 case (no life)
@@ -505,13 +535,16 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
             GL.glEnable(GL.GL_TEXTURE_2D)
             GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
 
-            CPCD = ctypes.POINTER(ctypes.c_double)
-            GL.glVertexPointer(2, GL.GL_DOUBLE, 0,
-                               self.verticesPix.ctypes.data_as(CPCD))
-            GL.glColor4f(*self._foreColor.render('rgba1'))
-            GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
-            GL.glDrawArrays(GL.GL_POINTS, 0, self.nDots)
-            GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+            if self.instanced and self._setupInstancing():
+                self._drawInstanced()
+            else:
+                CPCD = ctypes.POINTER(ctypes.c_double)
+                GL.glVertexPointer(2, GL.GL_DOUBLE, 0,
+                                   self.verticesPix.ctypes.data_as(CPCD))
+                GL.glColor4f(*self._foreColor.render('rgba1'))
+                GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+                GL.glDrawArrays(GL.GL_POINTS, 0, self.nDots)
+                GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
         else:
             # we don't want to do the screen scaling twice so for each dot
             # subtract the screen centre
@@ -524,6 +557,84 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
             self.element.setDepth(initialDepth)
         GL.glPopMatrix()
 
+    def _setupInstancing(self):
+        """Create the vertex buffer, vertex array and shader program used to
+        draw the dots with one instanced call (or re-create them if the
+        number of dots has changed).
+
+        Returns
+        -------
+        bool
+            `False` if instanced drawing isn't supported, in which case
+            `instanced` is also set to `False`.
+
+        """
+        if self._dotsVBO is not None:
+            if self._dotsVBO.shape[0] == self.nDots:
+                return True
+            self._deleteInstancing()
+
+        info = GL.gl_info
+        if not (info.have_version(3, 3) or
+                (info.have_extension('GL_ARB_instanced_arrays') and
+                 info.have_extension('GL_ARB_draw_instanced') and
+                 info.have_extension('GL_ARB_vertex_array_object'))):
+            logging.warning("Instanced drawing isn't supported by this "
+                            "graphics card. DotStim will draw dots the usual "
+                            "way instead.")
+            self.instanced = False
+            return False
+
+        self._dotsProgram = _shaders.compileProgram(
+            _shaders.vertInstancedPoints, _shaders.fragColor)
+        posLoc = GL.glGetAttribLocation(self._dotsProgram, b'instancePos')
+        # one row per dot, refilled every frame
+        self._dotsVBO = gltools.createVBO(
+            np.zeros((self.nDots, 2), dtype=np.float32),
+            usage=GL.GL_STREAM_DRAW)
+        self._dotsVAO = gltools.createVAO(
+            {posLoc: self._dotsVBO}, attribDivisors={posLoc: 1})
+
+        return True
+
+    def _drawInstanced(self):
+        """Stream the current dot positions to the graphics card and draw all
+        dots as instances of a single point.
+        """
+        vbo = self._dotsVBO
+        # orphan the previous storage so we never have to wait for the GPU to
+        # finish drawing the last frame before we can write the next one
+        gltools.bindVBO(vbo)
+        GL.glBufferData(vbo.target, vbo.size, None, vbo.usage)
+        dotsXY = gltools.mapBuffer(vbo, read=False, noSync=True)
+        dotsXY[:, :] = self.verticesPix
+        gltools.unmapBuffer(vbo)
+        gltools.unbindVBO(vbo)
+        del dotsXY  # never touch the mapped memory after unmapping
+
+        GL.glColor4f(*self._foreColor.render('rgba1'))
+        GL.glUseProgram(self._dotsProgram)
+        gltools.drawVAO(self._dotsVAO, GL.GL_POINTS, count=1,
+                        instanceCount=self.nDots)
+        GL.glUseProgram(0)
+
+    def _deleteInstancing(self):
+        """Free the GL objects used for instanced drawing.
+        """
+        if self._dotsVAO is not None:
+            gltools.deleteVAO(self._dotsVAO)
+        if self._dotsVBO is not None:
+            gltools.deleteVBO(self._dotsVBO)
+        if self._dotsProgram is not None:
+            gltools.deleteObjectARB(self._dotsProgram)
+        self._dotsVBO = self._dotsVAO = self._dotsProgram = None
+
+    def __del__(self):
+        try:
+            self._deleteInstancing()
+        except Exception:
+            pass  # the GL context has probably gone already
+
     def _newDotsXY(self, nDots):
         """Returns a uniform spread of dots, according to the `fieldShape` and
         `fieldSize`.
@@ -561,26 +672,92 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
 
     def refreshDots(self):
         """Callable user function to choose a new set of dots."""
-        self._verticesBase = self._dotsXY = self._newDotsXY(self.nDots)
+        self._verticesBase = self._dotsXY = np.asfortranarray(
+            self._newDotsXY(self.nDots))
 
         # Don't allocate another array if the new number of dots is equal to
         # the last.
         if self.nDots != len(self._deadDots):
             self._deadDots = np.zeros(self.nDots, dtype=bool)
+            self._allocScratch()
+
+    def _allocScratch(self):
+        """Allocate the work arrays used by `_update_dotsXY()` so that
+        updating the dots on each frame doesn't need to create any new
+        arrays.
+        """
+        n = self.nDots
+        self._scratch1 = np.zeros(n)
+        self._scratch2 = np.zeros(n)
+        # column-major, like _verticesBase, so that each column is contiguous
+        self._newXY = np.zeros((n, 2), order='F')
+        self._noiseMask = np.zeros(n, dtype=bool)
+        self._outOfBounds = np.zeros(n, dtype=bool)
+        self._boundsMask = np.zeros(n, dtype=bool)
+
+    def _newDotsXYInPlace(self, out):
+        """As `_newDotsXY()` but writes the new positions into `out` (an Nx2
+        array whose columns are contiguous) rather than returning a new array.
+        """
+        if type(self)._newDotsXY is not DotStim._newDotsXY:
+            # respect subclasses that define their own distribution
+            out[:, :] = self._newDotsXY(len(out))
+            return
+
+        # the same draws and arithmetic as _newDotsXY()
+        nDots = len(out)
+        if self.fieldShape == 'circle':
+            length = _fillRandom(self._scratch1[:nDots])
+            np.sqrt(length, out=length)
+            angle = _fillRandom(self._scratch2[:nDots])
+            angle *= _2pi
+            np.cos(angle, out=out[:, 0])
+            np.sin(angle, out=out[:, 1])
+            out[:, 0] *= length
+            out[:, 1] *= length
+            out *= self.fieldSize * .5
+        else:
+            # x and y of each dot are drawn in turn
+            _fillRandom(out)
+            out -= 0.5
+            out *= self.fieldSize
+
+    def _replaceDots(self, mask, nDots):
+        """Give the `nDots` dots in `mask` new positions in the field.
+        """
+        newXY = self._newXY[:nDots]
+        self._newDotsXYInPlace(newXY)
+        np.place(self._verticesBase[:, 0], mask, newXY[:, 0])
+        np.place(self._verticesBase[:, 1], mask, newXY[:, 1])
 
     def _update_dotsXY(self):
         """The user shouldn't call this - its gets done within draw().
+
+        All the work is done in place, in preallocated arrays, so that
+        updating large numbers of dots doesn't churn memory on every frame.
         """
+        if len(self._scratch1) != self.nDots:
+            self._allocScratch()
+        if not self._verticesBase.flags.f_contiguous:
+            self._verticesBase = self._dotsXY = \
+                np.asfortranarray(self._verticesBase)
+        x = self._verticesBase[:, 0]
+        y = self._verticesBase[:, 1]
+        dead = self._deadDots
+        noise = self._noiseMask
+        dx = self._scratch1
+        dy = self._scratch2
+
         # Find dead dots, update positions, get new positions for
         # dead and out-of-bounds
         # renew dead dots
         if self.dotLife > 0:  # if less than zero ignore it
             # decrement. Then dots to be reborn will be negative
             self._dotsLife -= 1
-            self._deadDots[:] = (self._dotsLife <= 0)
-            self._dotsLife[self._deadDots] = self.dotLife
+            np.less_equal(self._dotsLife, 0, out=dead)
+            np.copyto(self._dotsLife, self.dotLife, where=dead)
         else:
-            self._deadDots[:] = False
+            dead.fill(False)
 
         # update XY based on speed and dir
         # NB self._dotsDir is in radians, but self.dir is in degs
@@ -591,60 +768,60 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
             # noise and signal dots change identity constantly
             np.random.shuffle(self._dotsDir)
             # and then update _signalDots from that
-            self._signalDots = (self._dotsDir == (self.dir * _piOver180))
+            np.equal(self._dotsDir, self.dir * _piOver180,
+                     out=self._signalDots)
+        np.logical_not(self._signalDots, out=noise)
 
         # update the locations of signal and noise; 0 radians=East!
-        reshape = np.reshape
-        if self.noiseDots == 'walk':
-            # noise dots are ~self._signalDots
-            sig = np.random.rand(np.sum(~self._signalDots))
-            self._dotsDir[~self._signalDots] = sig * _2pi
-            # then update all positions from dir*speed
-            cosDots = reshape(np.cos(self._dotsDir), (self.nDots,))
-            sinDots = reshape(np.sin(self._dotsDir), (self.nDots,))
-            self._verticesBase[:, 0] += self.speed * cosDots
-            self._verticesBase[:, 1] += self.speed * sinDots
-        elif self.noiseDots == 'direction':
-            # simply use the stored directions to update position
-            cosDots = reshape(np.cos(self._dotsDir), (self.nDots,))
-            sinDots = reshape(np.sin(self._dotsDir), (self.nDots,))
-            self._verticesBase[:, 0] += self.speed * cosDots
-            self._verticesBase[:, 1] += self.speed * sinDots
-        elif self.noiseDots == 'position':
-            # update signal dots
-            sd = self._signalDots
-            sdSum = self._signalDots.sum()
-            cosDots = reshape(np.cos(self._dotsDir[sd]), (sdSum,))
-            sinDots = reshape(np.sin(self._dotsDir[sd]), (sdSum,))
-            self._verticesBase[sd, 0] += self.speed * cosDots
-            self._verticesBase[sd, 1] += self.speed * sinDots
-            # update noise dots
-            self._deadDots[:] = self._deadDots + (~self._signalDots)
+        if self.noiseDots in ('walk', 'direction', 'position'):
+            if self.noiseDots == 'walk':
+                # noise dots get a new random direction every frame
+                newDir = _fillRandom(dx[:np.count_nonzero(noise)])
+                newDir *= _2pi
+                np.place(self._dotsDir, noise, newDir)
+            # then update positions from dir*speed
+            np.cos(self._dotsDir, out=dx)
+            np.sin(self._dotsDir, out=dy)
+            dx *= self.speed
+            dy *= self.speed
+            if self.noiseDots == 'position':
+                # only signal dots move, noise dots get replaced (below)
+                np.copyto(dx, 0., where=noise)
+                np.copyto(dy, 0., where=noise)
+                np.logical_or(dead, noise, out=dead)
+            x += dx
+            y += dy
 
         # handle boundaries of the field
+        outofbounds = self._outOfBounds
         if self.fieldShape in (None, 'square', 'sqr'):
-            out0 = (np.abs(self._verticesBase[:, 0]) > .5 * self.fieldSize[0])
-            out1 = (np.abs(self._verticesBase[:, 1]) > .5 * self.fieldSize[1])
-            outofbounds = out0 + out1
+            np.greater(np.abs(x, out=dx), .5 * self.fieldSize[0],
+                       out=outofbounds)
+            np.greater(np.abs(y, out=dy), .5 * self.fieldSize[1],
+                       out=self._boundsMask)
+            np.logical_or(outofbounds, self._boundsMask, out=outofbounds)
         else:
             # transform to a normalised circle (radius = 1 all around)
             # then to polar coords to check
             # the normalised XY position (where radius should be < 1)
-            normXY = self._verticesBase / .5 / self.fieldSize
+            np.divide(x, .5, out=dx)
+            np.divide(y, .5, out=dy)
+            dx /= self.fieldSize[0]
+            dy /= self.fieldSize[1]
             # add out-of-bounds to those that need replacing
-            outofbounds = np.hypot(normXY[:, 0], normXY[:, 1]) > 1.
+            np.greater(np.hypot(dx, dy, out=dx), 1., out=outofbounds)
 
         # update any dead dots
-        nDead = self._deadDots.sum()
+        nDead = np.count_nonzero(dead)
         if nDead:
-            self._verticesBase[self._deadDots, :] = self._newDotsXY(nDead)
+            self._replaceDots(dead, nDead)
 
         # Reposition any dots that have gone out of bounds. Net effect is to
         # place dot one step inside the boundary on the other side of the
         # aperture.
-        nOutOfBounds = outofbounds.sum()
+        nOutOfBounds = np.count_nonzero(outofbounds)
         if nOutOfBounds:
-            self._verticesBase[outofbounds, :] = self._newDotsXY(nOutOfBounds)
+            self._replaceDots(outofbounds, nOutOfBounds)
 
         # update the pixel XY coordinates in pixels (using _BaseVisual class)
         self._updateVertices()
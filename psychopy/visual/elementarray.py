@@ -18,6 +18,7 @@ from past.utils import old_div
 # other calls to pyglet or pyglet submodules, otherwise it may not get picked
 # up by the pyglet GL engine and have no effect.
 # Shaders will work but require OpenGL2.0 drivers AND PyOpenGL3.0+
+import warnings
 import pyglet
 
 from ..colors import Color
@@ -33,10 +34,12 @@ from psychopy.visual import Window
 # tools must only be imported *after* event or MovieStim breaks on win32
 # (JWP has no idea why!)
 from psychopy.tools.arraytools import val2array
+from psychopy.tools import gltools
 from psychopy.tools.attributetools import attributeSetter, logAttrib, setAttribute
 from psychopy.tools.monitorunittools import convertToPix
 from psychopy.visual.helpers import setColor
 from psychopy.visual.basevisual import MinimalStim, TextureMixin, ColorMixin
+from psychopy.visual import shaders as _shaders
 from . import globalVars
 
 import numpy
@@ -51,7 +54,20 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
     but in order to achieve this performance, uses several OpenGL extensions
     only available on modern graphics cards (supporting OpenGL2.0).
     See the ElementArray demo.
+
+    With `useVBOs=True` the per-element values are kept in vertex buffers on
+    the graphics card and each element is drawn as an instance of a single
+    quad, with its size, orientation and texture coordinates applied in a
+    vertex shader. Changing one attribute (e.g. drifting the `phases` every
+    frame) then only re-uploads that one small buffer rather than rebuilding
+    all the vertices. This needs OpenGL 3.3 (or the equivalent extensions)
+    and units that map linearly to pixels (i.e. not 'degFlat' or
+    'degFlatPos'), otherwise the elements are drawn the usual way.
     """
+    # buffers for the per-element values drawn with `useVBOs`, and their
+    # number of components, in order of their vertex attribute index
+    _bufferStreams = (('elementPos', 3), ('elementSizeOri', 3),
+                      ('elementTexParams', 4), ('elementColor', 4))
 
     def __init__(self,
                  win,
@@ -78,7 +94,8 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
                  interpolate=True,
                  name=None,
                  autoLog=None,
-                 maskParams=None):
+                 maskParams=None,
+                 useVBOs=False):
         """
         :Parameters:
 
@@ -92,6 +109,10 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
 
             nElements :
                 number of elements in the array.
+
+            useVBOs : True or **False**
+                keep the element values in buffers on the graphics card
+                and only re-upload the ones that change (see above).
         """
         # what local vars are defined (these are the init params) for use by
         # __repr__
@@ -101,6 +122,12 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
 
         self.autoLog = False  # until all params are set
         self.win = win
+        self.useVBOs = useVBOs
+        # GL objects for useVBOs, created on first draw
+        self._vao = None
+        self._vbos = {}
+        self._bufferProgs = {}
+        self._dirtyStreams = set(name for name, n in self._bufferStreams)
 
         # Not pretty (redefined later) but it works!
         self.__dict__['texRes'] = texRes
@@ -264,6 +291,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         # to keep a record if we are to alter things later.
         self._xysAsNone = value is None
         self._needVertexUpdate = True
+        self._dirtyStreams.add('elementPos')
 
     def setXYs(self, value=None, operation='', log=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
@@ -293,6 +321,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         """
         self.__dict__['oris'] = self._makeNx1(value)  # set self.oris
         self._needVertexUpdate = True
+        self._dirtyStreams.add('elementSizeOri')
 
     def setOris(self, value, operation='', log=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
@@ -318,6 +347,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         """
         self.__dict__['sfs'] = self._makeNx2(value)  # set self.sfs
         self._needTexCoordUpdate = True
+        self._dirtyStreams.add('elementTexParams')
 
     def setSfs(self, value, operation='', log=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
@@ -337,6 +367,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         """
         self.__dict__['opacities'] = self._makeNx1(value)
         self._needColorUpdate = True
+        self._dirtyStreams.add('elementColor')
 
     def setOpacities(self, value, operation='', log=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
@@ -358,6 +389,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         self.__dict__['sizes'] = self._makeNx2(value)
         self._needVertexUpdate = True
         self._needTexCoordUpdate = True
+        self._dirtyStreams.update(('elementSizeOri', 'elementTexParams'))
 
     def setSizes(self, value, operation='', log=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
@@ -380,6 +412,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         """
         self.__dict__['phases'] = self._makeNx2(value)
         self._needTexCoordUpdate = True
+        self._dirtyStreams.add('elementTexParams')
 
     def setPhases(self, value, operation='', log=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
@@ -417,6 +450,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         # Create blank array of colors
         self._colors = Color(value, self.colorSpace, self.contrast)
         self._needColorUpdate = True
+        self._dirtyStreams.add('elementColor')
 
     def setColors(self, colors, colorSpace=None, operation='', log=None):
         """See ``color`` for more info on the color parameter  and
@@ -435,6 +469,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         if hasattr(self, "_colors"):
             # Set the alpha value of each color to be the desired opacity
             self._colors.alpha = value
+            self._dirtyStreams.add('elementColor')
 
 
     @attributeSetter
@@ -448,6 +483,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         """
         self.__dict__['contrs'] = self._makeNx1(value)
         self._needColorUpdate = True
+        self._dirtyStreams.add('elementColor')
 
     def setContrs(self, value, operation='', log=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
@@ -464,6 +500,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         """
         self.__dict__['fieldPos'] = val2array(value, False, False)
         self._needVertexUpdate = True
+        self._dirtyStreams.add('elementPos')
 
     def setFieldPos(self, value, operation='', log=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
@@ -505,6 +542,10 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
             win = self.win
         self._selectWindow(win)
 
+        if self.useVBOs and self._setupBuffers():
+            self._drawBuffers(win)
+            return
+
         if self._needVertexUpdate:
             self._updateVertices()
         if self._needColorUpdate:
@@ -668,6 +709,166 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         self._texCoords = numpy.ascontiguousarray(self._texCoords)
         self._needTexCoordUpdate = False
 
+    # ----------------------------------------------------------------------
+    def _setupBuffers(self):
+        """Create the vertex buffers and vertex array used when `useVBOs` is
+        True (or re-create them if the number of elements has changed).
+
+        Returns False, and sets `useVBOs` to False, if they can't be used.
+        """
+        if self._vao is not None:
+            if self._vao.userData['nElements'] == self.nElements:
+                return True
+            self._deleteBuffers()
+
+        info = GL.gl_info
+        if not (info.have_version(3, 3) or
+                (info.have_extension('GL_ARB_instanced_arrays') and
+                 info.have_extension('GL_ARB_draw_instanced') and
+                 info.have_extension('GL_ARB_vertex_array_object'))):
+            logging.warning("ElementArrayStim: instanced drawing isn't "
+                            "supported by this graphics card so useVBOs "
+                            "has been turned off.")
+            self.useVBOs = False
+            return False
+        if self.units in ('degFlat', 'degFlatPos'):
+            logging.warning("ElementArrayStim: useVBOs can't be used with "
+                            "units='%s' so has been turned off." % self.units)
+            self.useVBOs = False
+            return False
+
+        # the corners of each element are the only per-vertex values
+        corners = numpy.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], 'f')
+        self._vbos['corner'] = gltools.createVBO(corners)
+        attribs = {0: self._vbos['corner']}
+        divisors = {}
+        for index, (name, size) in enumerate(self._bufferStreams, 1):
+            self._vbos[name] = gltools.createVBO(
+                numpy.zeros((self.nElements, size), 'f'),
+                usage=GL.GL_DYNAMIC_DRAW)
+            attribs[index] = self._vbos[name]
+            divisors[index] = 1
+        with warnings.catch_warnings():
+            # we know the per-element buffers have more rows than corners
+            warnings.simplefilter('ignore')
+            self._vao = gltools.createVAO(attribs, attribDivisors=divisors)
+        self._vao.count = 4  # vertices per instance
+        self._vao.userData['nElements'] = self.nElements
+        self._dirtyStreams.update(name for name, n in self._bufferStreams)
+
+        return True
+
+    def _bufferProgram(self, win):
+        """The shader program for drawing from buffers in the window's current
+        blend mode (compiled the first time it's needed).
+        """
+        blendMode = win.blendMode
+        if blendMode not in self._bufferProgs:
+            if blendMode == 'add':
+                fragSource = _shaders.fragSignedColorTexMask_adding
+            else:
+                fragSource = _shaders.fragSignedColorTexMask
+            locations = {'corner': 0}
+            for index, (name, size) in enumerate(self._bufferStreams, 1):
+                locations[name] = index
+            self._bufferProgs[blendMode] = _shaders.compileProgram(
+                _shaders.vertElementArray, fragSource,
+                attribLocations=locations)
+        return self._bufferProgs[blendMode]
+
+    def _streamData(self, name):
+        """The values for one of the `_bufferStreams`, one row per element.
+        """
+        N = self.nElements
+        if name == 'elementPos':
+            positions = self.xys + self.fieldPos
+            data = numpy.zeros([N, 3], 'f')
+            data[:, :2] = convertToPix(vertices=numpy.zeros([N, 2]),
+                                       pos=positions, units=self.units,
+                                       win=self.win)
+            data[:, 2] = self.depths + self.fieldDepth
+        elif name == 'elementSizeOri':
+            data = numpy.zeros([N, 3], 'f')
+            data[:, :2] = self.sizes
+            data[:, 2] = self.oris
+        elif name == 'elementTexParams':
+            data = numpy.zeros([N, 4], 'f')
+            data[:, :2] = self.sfs
+            if self.units not in ['norm', 'pix', 'height']:
+                # scale to become independent of size (as for _texCoords)
+                data[:, :2] *= self.sizes
+            data[:, 2:] = self.phases
+        elif name == 'elementColor':
+            data = numpy.zeros([N, 4], 'f')
+            data[:, :] = self._colors.render('rgba1')
+            data[:, 3] = self.opacities.reshape([N, ])
+        return data
+
+    def _drawBuffers(self, win):
+        """Upload any values that have changed since the last frame and draw
+        all the elements with one instanced call.
+        """
+        for name in self._dirtyStreams:
+            vbo = self._vbos[name]
+            # orphan the previous storage so we don't wait for the GPU to
+            # finish drawing from it
+            gltools.bindVBO(vbo)
+            GL.glBufferData(vbo.target, vbo.size, None, vbo.usage)
+            values = gltools.mapBuffer(vbo, read=False, noSync=True)
+            values[:, :] = self._streamData(name)
+            gltools.unmapBuffer(vbo)
+            gltools.unbindVBO(vbo)
+            del values  # never touch the mapped memory after unmapping
+        self._dirtyStreams.clear()
+
+        GL.glPushMatrix()  # push before drawing, pop after
+        self.win.setScale('pix')
+
+        _prog = self._bufferProgram(win)
+        GL.glUseProgram(_prog)
+        GL.glUniform1i(GL.glGetUniformLocation(_prog, b"texture"), 0)
+        GL.glUniform1i(GL.glGetUniformLocation(_prog, b"mask"), 1)
+        # stim units to pix (for linear units this is just a scaling)
+        unitScale = convertToPix(vertices=numpy.ones([1, 2]),
+                                 pos=numpy.zeros(2), units=self.units,
+                                 win=self.win)
+        unitScale = numpy.asarray(unitScale, dtype=float).reshape(-1)
+        GL.glUniform2f(GL.glGetUniformLocation(_prog, b"unitScale"),
+                       unitScale[0], unitScale[1])
+
+        # bind textures
+        GL.glActiveTexture(GL.GL_TEXTURE1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._maskID)
+        GL.glEnable(GL.GL_TEXTURE_2D)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texID)
+        GL.glEnable(GL.GL_TEXTURE_2D)
+
+        gltools.drawVAO(self._vao, GL.GL_TRIANGLE_FAN,
+                        instanceCount=self.nElements)
+
+        # unbind the textures
+        GL.glActiveTexture(GL.GL_TEXTURE1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        GL.glDisable(GL.GL_TEXTURE_2D)
+        # main texture
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        GL.glDisable(GL.GL_TEXTURE_2D)
+
+        GL.glUseProgram(0)
+        GL.glPopMatrix()
+
+    def _deleteBuffers(self):
+        """Free the GL objects used when `useVBOs` is True.
+        """
+        if self._vao is not None:
+            gltools.deleteVAO(self._vao)
+            self._vao = None
+        for vbo in self._vbos.values():
+            gltools.deleteVBO(vbo)
+        self._vbos = {}
+
     @attributeSetter
     def elementTex(self, value):
         """The texture, to be used by all elements (e.g. 'sin', 'sqr',.. ,
@@ -695,6 +896,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         :ref:`operations <attrib-operations>` are supported.
         """
         self.__dict__['depth'] = value
+        self._dirtyStreams.add('elementPos')
         self._updateVertices()
 
     @attributeSetter
@@ -705,6 +907,7 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         :ref:`operations <attrib-operations>` are supported.
         """
         self.__dict__['fieldDepth'] = value
+        self._dirtyStreams.add('elementPos')
         self._updateVertices()
 
     @attributeSetter
@@ -720,5 +923,8 @@ class ElementArrayStim(MinimalStim, TextureMixin, ColorMixin):
         # remove textures from graphics card to prevent OpenGl memory leak
         try:
             self.clearTextures()
+            self._deleteBuffers()
+            for prog in self._bufferProgs.values():
+                gltools.deleteObjectARB(prog)
         except (ImportError, ModuleNotFoundError, TypeError):
             pass  # has probably been garbage-collected already
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Part of the PsychoPy library
+# Copyright (C) 2002-2018 Jonathan Peirce (C) 2019-2021 Open Science Tools Ltd.
+# Distributed under the terms of the GNU General Public License (GPL).
+
+"""Recording of the timing of every frame drawn by a Window
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+# fields of each frame's record (times in seconds)
+frameTimingDtype = np.dtype([
+    ('frameN', np.int64),  # number of the frame since recording started
+    ('flipTime', np.float64),  # as returned by flip (logging.defaultClock)
+    ('interval', np.float64),  # since the previous recorded flip
+    ('drawTime', np.float64),  # CPU, from end of previous flip to the swap
+    ('swapTime', np.float64),  # CPU, swapping the buffers (and waitBlanking)
+    ('callbackTime', np.float64),  # CPU, callOnFlip functions and logging
+    ('gpuTime', np.float64),  # GPU, executing the GL commands of the frame
+])
+
+_durations = ('interval', 'drawTime', 'swapTime', 'callbackTime', 'gpuTime')
+
+
+class FrameTimingRecorder(object):
+    """Records the timing of each frame flipped by a Window, to audit the
+    timing of a whole session.
+
+    The times of the last `bufferSize` frames are kept in a NumPy array that
+    is allocated when the recorder is created, so recording adds only a few
+    clock reads and an array assignment to each :py:attr:`~Window.flip()`.
+    For each frame the recorder stores:
+
+    * `flipTime`, the time the flip completed (as returned by `flip()`)
+    * `interval`, the time since the previous recorded flip
+    * `drawTime`, the CPU time from the end of the previous flip until the
+      buffers are swapped, i.e. drawing the frame (and anything else the
+      script does in between)
+    * `swapTime`, the CPU time taken to swap the buffers, including waiting
+      for the blank if :py:attr:`~Window.waitBlanking` is `True`
+    * `callbackTime`, the CPU time spent after the swap calling the
+      :py:attr:`~Window.callOnFlip()` functions and logging
+    * `gpuTime`, the time the GPU spent executing the GL commands of the
+      frame, if `gpu=True` (otherwise NaN)
+
+    Parameters
+    ----------
+    win : Window
+        The window to record the frames of. Recording starts when the recorder
+        is assigned to the :py:attr:`~Window.frameTiming` attribute of `win`.
+    bufferSize : int
+        The number of frames kept. When more frames have been recorded the
+        oldest are overwritten. The default is an hour at 60Hz.
+    gpu : bool
+        Also measure the GPU time of each frame, with a `GL_TIME_ELAPSED`
+        query around its drawing. The time of a frame is read (without
+        stalling the GPU) at the end of the next flip. Can't be used if
+        `GL_TIME_ELAPSED` queries are used elsewhere during the frame.
+    refreshThreshold : float or None
+        Intervals longer than this are dropped frames. If `None` the
+        :py:attr:`~Window.refreshThreshold` of `win` is used.
+
+    Examples
+    --------
+    Record the timing of every frame of the session and save it next to the
+    data file::
+
+        win.frameTiming = visual.FrameTimingRecorder(win)
+        ...
+        for trial in trials:
+            ...  # frames of the trial
+            win.frameTiming.addToExperiment(thisExp)  # summary of the trial
+            thisExp.nextEntry()
+        win.frameTiming.saveAsText(filename + '_frameTiming.tsv')
+        print(win.frameTiming.summary())
+
+    """
+
+    def __init__(self, win, bufferSize=216000, gpu=False,
+                 refreshThreshold=None):
+        if bufferSize < 2:
+            raise ValueError("FrameTimingRecorder needs bufferSize >= 2")
+        self.bufferSize = int(bufferSize)
+        self.refreshThreshold = refreshThreshold or win.refreshThreshold
+        self._data = np.zeros(self.bufferSize, dtype=frameTimingDtype)
+        self._data['gpuTime'] = np.nan
+        self.nFrames = 0  # frames recorded since creation (or reset)
+        self.recording = True
+        self._lastFlipTime = None
+        self._lastEndTime = None
+        self.gpu = bool(gpu)
+        self._queries = None
+        self._queryFrames = [None, None]  # frameN each query was begun for
+        self._activeQuery = None  # index of the query measuring the frame
+        if self.gpu:
+            from psychopy.tools import gltools
+            self._queries = [gltools.createQueryObject(),
+                             gltools.createQueryObject()]
+
+    def pause(self):
+        """Stop recording (e.g. while the window isn't being updated) until
+        :py:meth:`resume` is called. The interval (and draw time) of the first
+        frame after resuming are not measured (NaN).
+        """
+        self.recording = False
+        self._lastFlipTime = self._lastEndTime = None
+        if self._activeQuery is not None:
+            # the frame it measures won't be recorded (but the previous
+            # frame is still read after resuming)
+            from psychopy.tools import gltools
+            gltools.endQuery(self._queries[self._activeQuery])
+            self._queryFrames[self._activeQuery] = None
+            self._activeQuery = None
+
+    def resume(self):
+        """Resume recording after :py:meth:`pause`."""
+        self.recording = True
+
+    def reset(self):
+        """Discard the frames recorded so far."""
+        self._data[:] = 0
+        self._data['gpuTime'] = np.nan
+        self.nFrames = 0
+        # the frame being measured is now the first one, and the result of
+        # the previous frame is discarded
+        self._queryFrames = [None, None]
+        if self._activeQuery is not None:
+            self._queryFrames[self._activeQuery] = 0
+
+    def _beforeSwap(self):
+        """Called by flip() just before the buffers are swapped"""
+        if self._activeQuery is not None:
+            from psychopy.tools import gltools
+            gltools.endQuery(self._queries[self._activeQuery])
+
+    def _record(self, flipTime, tSwap, tFlipped, tEnd):
+        """Called by flip() when done. flipTime is the time flip() returns,
+        tSwap when the swap started, tFlipped when it was done and tEnd the
+        end of flip() (on the same clock as tSwap)"""
+        n = self.nFrames
+        if self._lastFlipTime is None:
+            interval = drawTime = np.nan
+        else:
+            interval = flipTime - self._lastFlipTime
+            drawTime = tSwap - self._lastEndTime
+        self._data[n % self.bufferSize] = (
+            n, flipTime, interval, drawTime, tFlipped - tSwap, tEnd - tFlipped,
+            np.nan)
+        if self.gpu:
+            from psychopy.tools import gltools
+            for i, frameN in enumerate(self._queryFrames):
+                if frameN == n - 1:
+                    # the GPU has finished the previous frame since this one
+                    # was swapped
+                    self._data['gpuTime'][(n - 1) % self.bufferSize] = \
+                        gltools.getQuery(self._queries[i]) * 1e-9
+                    self._queryFrames[i] = None
+            # the next frame is measured with a query that isn't still
+            # waiting for the result of this frame
+            i = 0 if self._queryFrames[0] != n else 1
+            self._queryFrames[i] = n + 1
+            self._activeQuery = i
+            gltools.beginQuery(self._queries[i])
+        self.nFrames = n + 1
+        self._lastFlipTime = flipTime
+        self._lastEndTime = tEnd
+
+    def getData(self):
+        """The frames recorded (up to the last `bufferSize` of them), oldest
+        first.
+
+        Returns
+        -------
+        ndarray
+            A copy of the records, as a structured array with fields
+            `frameN`, `flipTime`, `interval`, `drawTime`, `swapTime`,
+            `callbackTime` and `gpuTime`.
+
+        """
+        n = self.nFrames
+        if n <= self.bufferSize:
+            return self._data[:n].copy()
+        i = n % self.bufferSize
+        return np.concatenate((self._data[i:], self._data[:i]))
+
+    def droppedFrameRuns(self, data=None):
+        """Runs of consecutive dropped frames (intervals longer than
+        `refreshThreshold`).
+
+        Returns
+        -------
+        ndarray
+            The `frameN` of the first dropped frame of each run and the
+            number of dropped frames in the run, as an array with 2 columns.
+
+        """
+        if data is None:
+            data = self.getData()
+        dropped = np.zeros(len(data) + 2, dtype=np.int8)
+        dropped[1:-1] = data['interval'] > self.refreshThreshold
+        changes = np.diff(dropped)
+        starts = np.flatnonzero(changes == 1)
+        ends = np.flatnonzero(changes == -1)
+        return np.column_stack((data['frameN'][starts], ends - starts))
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """Summary of the timing of the frames recorded.
+
+        Parameters
+        ----------
+        percentiles : sequence of float
+            The percentiles of each duration to include.
+
+        Returns
+        -------
+        dict
+            `nFrames`, `nDropped` (frames), `nDroppedRuns`,
+            `longestDroppedRun` and, for each of `interval`, `drawTime`,
+            `swapTime`, `callbackTime` and `gpuTime`, its mean, max and
+            percentiles (e.g. `'interval.mean'`, `'interval.p95'`), in
+            seconds. Durations that weren't measured are NaN.
+
+        """
+        data = self.getData()
+        runs = self.droppedFrameRuns(data)
+        result = {
+            'nFrames': len(data),
+            'nDropped': int(runs[:, 1].sum()),
+            'nDroppedRuns': len(runs),
+            'longestDroppedRun': int(runs[:, 1].max()) if len(runs) else 0,
+        }
+        for name in _durations:
+            values = data[name]
+            values = values[np.isfinite(values)]
+            if len(values):
+                result[name + '.mean'] = float(values.mean())
+                result[name + '.max'] = float(values.max())
+                for p, value in zip(percentiles,
+                                    np.percentile(values, percentiles)):
+                    result['%s.p%g' % (name, p)] = float(value)
+            else:
+                result[name + '.mean'] = result[name + '.max'] = np.nan
+                for p in percentiles:
+                    result['%s.p%g' % (name, p)] = np.nan
+        return result
+
+    def addToExperiment(self, exp, prefix='frameTiming.', reset=True,
+                        percentiles=(50, 95, 99)):
+        """Add the :py:meth:`summary` of the frames recorded to the current
+        entry of an :class:`~psychopy.data.ExperimentHandler` (e.g. at the
+        end of each trial), as columns named `prefix` + key.
+
+        Parameters
+        ----------
+        exp : ExperimentHandler
+            The experiment to add the data to.
+        prefix : str
+            Prefix of the column names.
+        reset : bool
+            Discard the frames recorded after adding them, so that the next
+            entry summarizes the frames recorded from now on.
+        percentiles : sequence of float
+            The percentiles to add (see :py:meth:`summary`).
+
+        """
+        for key, value in sorted(self.summary(percentiles).items()):
+            exp.addData(prefix + key, value)
+        if reset:
+            self.reset()
+
+    def saveAsText(self, fileName, delim='\t'):
+        """Save the record of each frame (see :py:meth:`getData`) to a text
+        file, one frame per row (times in seconds).
+
+        Parameters
+        ----------
+        fileName : str
+            The name of the file (including path if necessary).
+        delim : str
+            The delimiter between the columns.
+
+        """
+        data = self.getData()
+        fmt = ['%d'] + ['%.6f'] * (len(frameTimingDtype.names) - 1)
+        np.savetxt(fileName, data, fmt=fmt, delimiter=delim,
+                   header=delim.join(frameTimingDtype.names), comments='')
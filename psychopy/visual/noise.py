@@ -26,6 +26,9 @@ try:
     from PIL import Image
 except ImportError:
     import Image
+import os
+import multiprocessing
+
 import psychopy  # so we can get the __path__
 from psychopy import logging
 from psychopy.visual import filters
@@ -236,6 +239,10 @@ class NoiseStim(GratingStim):
         self.local_p = self.local.ctypes
         self._sideLength=1.0   
         self._size=512         # in unlikely case where it does not get set anywhere else before use.
+        self._noiseBank = []  # texture IDs of pre-generated samples
+        self._noiseBankSamples = None
+        self._bankIndex = 0
+        self._ownTexID = self._texID
         self.buildNoise()
         self._needBuild = False
 
@@ -477,7 +484,10 @@ class NoiseStim(GratingStim):
             self.buildNoise()
         # remake textures if necessary
         if self._needTextureUpdate:
-            self.setTex(value=self.tex, log=False)
+            if self._noiseBank:
+                self._uploadNoiseBank()
+            else:
+                self.setTex(value=self.tex, log=False)
         if self._needUpdate:
             self._updateList()
         GL.glCallList(self._listID)
@@ -571,8 +581,19 @@ class NoiseStim(GratingStim):
     def updateNoise(self):
         """Updates the noise sample. Does not change any of the noise parameters 
             but choses a new random sample given the previously set parameters.
+
+            If a noise bank has been built (see buildNoiseBank) this just
+            moves on to the next sample in the bank.
         """
+        if self._noiseBank:
+            self._showBankSample(self._bankIndex + 1)
+        else:
+            self.tex = self._newNoiseSample()
 
+    def _newNoiseSample(self):
+        """Returns a new random sample of noise (as a texture array) given
+        the previously set parameters.
+        """
         if not(self.noiseType in ['binary','Binary','normal','Normal','uniform','Uniform']):
             if (self.noiseType in ['image', 'Image']) and (self.imageComponent in ['amplitude','Amplitude']):
                 self.noiseTex = numpy.random.uniform(0,1,int(self._size**2))
@@ -595,7 +616,7 @@ class NoiseStim(GratingStim):
             gsd = filters.getRMScontrast(Im)
             factor = gsd*self.noiseClip
             numpy.clip(Im, -factor, factor, Im)
-            self.tex = Im / factor
+            return Im / factor
         elif self.noiseType in ['normal','Normal']:
             self.noiseTex = numpy.random.randn(int(self._sideLength[1]),int(self._sideLength[0])) / self.noiseClip
         elif self.noiseType in ['uniform','Uniform']:
@@ -641,16 +662,19 @@ class NoiseStim(GratingStim):
                 gsd = filters.getRMScontrast(Im)
                 factor = gsd*self.noiseClip
                 numpy.clip(Im, -factor, factor, Im)
-                self.tex = Im / factor
+                return Im / factor
             else:
-                if not(self.noiseType in ['image','Image']):
-                    self.tex = self.noiseTex
+                return self.noiseTex
                 
     
             
     def buildNoise(self):
         """build a new noise sample. Required to act on changes to any noise parameters or texRes.
         """
+        if self._noiseBank:
+            logging.warning("NoiseStim: noise parameters changed so the "
+                            "noise bank has been discarded")
+            self.clearNoiseBank()
 
         if self.units == 'pix':
             if not (self.noiseType in ['Binary','binary','Normal','normal','uniform','Uniform']):
@@ -723,3 +747,170 @@ class NoiseStim(GratingStim):
         self._needBuild = False # prevent noise from being re-built at next draw() unless a parameter is changed in the mean time.
         self.updateNoise()  # now choose the initial random sample.
 
+    def buildNoiseBank(self, nSamples, nProcesses=1, fileName=None):
+        """Pre-generate a bank of noise samples with the current parameters
+        and upload them all to the graphics card, so that moving on to a new
+        sample (with updateNoise) is just a change of texture rather than a
+        new FFT and upload. Useful for dynamic noise that changes every
+        frame.
+
+        Samples are used in turn, going back to the first after the last.
+        Changing any of the noise parameters discards the bank.
+
+        :parameters:
+
+            nSamples : int
+                number of samples to make. Each takes texture memory on the
+                graphics card (roughly 12 bytes per texel)
+
+            nProcesses : int
+                number of processes to make the samples in (1 means make
+                them in this process). Samples only depend on the random
+                seed, so `numpy.random.seed()` still makes them reproducible.
+                On Windows the script needs an
+                ``if __name__ == '__main__':`` guard to use this
+
+            fileName : str or None
+                if given, the samples are saved to this (.npz) file, or
+                loaded from it instead of being made again if it was saved
+                with the same noise parameters and number of samples
+        """
+        nSamples = int(nSamples)
+        if nSamples < 1:
+            raise ValueError("NoiseStim.buildNoiseBank needs at least one "
+                             "sample")
+        if self._needBuild:
+            self.buildNoise()
+        self.clearNoiseBank()
+
+        samples = None
+        if fileName is not None and not fileName.endswith('.npz'):
+            fileName += '.npz'
+        if fileName is not None and os.path.isfile(fileName):
+            samples = self._loadNoiseBank(fileName, nSamples)
+        if samples is None:
+            sampler = _NoiseSampler(self)
+            nProcesses = min(nProcesses, nSamples)
+            if nProcesses > 1:
+                seeds = numpy.random.randint(0, 2**31 - 1, nProcesses)
+                counts = [len(chunk) for chunk in
+                          numpy.array_split(range(nSamples), nProcesses)]
+                pool = multiprocessing.Pool(nProcesses)
+                try:
+                    chunks = pool.map(_makeNoiseSamples,
+                                      list(zip([sampler] * nProcesses,
+                                               counts, seeds)))
+                finally:
+                    pool.close()
+                    pool.join()
+                samples = numpy.concatenate(chunks)
+            else:
+                samples = _makeNoiseSamples((sampler, nSamples, None))
+            if fileName is not None:
+                numpy.savez(fileName, samples=samples,
+                            params=self._noiseBankParams())
+
+        self._noiseBankSamples = samples
+        self._noiseBank = [GL.GLuint() for sample in samples]
+        for texID in self._noiseBank:
+            GL.glGenTextures(1, ctypes.byref(texID))
+        self._uploadNoiseBank()
+        self._showBankSample(0)
+
+    def clearNoiseBank(self):
+        """Remove any noise bank (see buildNoiseBank) from the graphics card.
+        New samples are then made by updateNoise as usual.
+        """
+        for texID in self._noiseBank:
+            GL.glDeleteTextures(1, texID)
+        self._noiseBank = []
+        self._noiseBankSamples = None
+        self._bankIndex = 0
+        if self._texID is not self._ownTexID:
+            self._texID = self._ownTexID
+            self._needUpdate = True
+            self._needTextureUpdate = True
+
+    def _noiseBankParams(self):
+        """A string describing the parameters the noise bank depends on
+        (used to check that a saved bank can be reused).
+        """
+        params = [repr(getattr(self, name, None))
+                  for name in _NoiseSampler._sampleAttribs
+                  if name not in ('noiseTex', 'noisePh')]
+        params.append(repr(self.noiseImage))
+        return '; '.join(params)
+
+    def _loadNoiseBank(self, fileName, nSamples):
+        """Samples from a saved noise bank if it was made with the same
+        parameters, otherwise None.
+        """
+        with numpy.load(fileName) as saved:
+            if (str(saved['params']) == self._noiseBankParams() and
+                    len(saved['samples']) == nSamples):
+                return saved['samples']
+        logging.info("NoiseStim: %s was made with different parameters so "
+                     "the noise bank will be made again" % fileName)
+        return None
+
+    def _uploadNoiseBank(self):
+        """(Re-)create the textures for all the samples in the noise bank.
+        """
+        for texID, sample in zip(self._noiseBank, self._noiseBankSamples):
+            self._createTexture(sample, id=texID, pixFormat=GL.GL_RGB,
+                                stim=self, res=self.texRes,
+                                maskParams=self.maskParams)
+        self._needTextureUpdate = False
+
+    def _showBankSample(self, index):
+        """Use sample `index` of the noise bank (this only swaps textures).
+        """
+        self._bankIndex = index % len(self._noiseBank)
+        self._texID = self._noiseBank[self._bankIndex]
+        self.__dict__['tex'] = self._noiseBankSamples[self._bankIndex]
+        self._needUpdate = True
+
+    def clearTextures(self):
+        """Clear all textures associated with the stimulus, including any
+        noise bank.
+        """
+        self.clearNoiseBank()
+        super(NoiseStim, self).clearTextures()
+
+
+class _NoiseSampler(object):
+    """The parts of a NoiseStim needed to make new samples of noise, without
+    any window or OpenGL objects, so that it can be sent to other processes.
+    """
+    _sampleAttribs = ('noiseType', 'noiseTex', 'noisePh', 'filter',
+                      'imageComponent', 'units', 'noiseClip',
+                      'noiseFractalPower', 'noiseFilterOrder', 'noiseBW',
+                      'noiseBWO', 'noiseOri', '_size', '_sideLength', '_sf',
+                      '_lowsf', '_upsf')
+
+    # the same methods that NoiseStim uses
+    _newNoiseSample = NoiseStim.__dict__['_newNoiseSample']
+    _filter = NoiseStim.__dict__['_filter']
+    _isotropic = NoiseStim.__dict__['_isotropic']
+    _gabor = NoiseStim.__dict__['_gabor']
+
+    def __init__(self, stim):
+        for name in self._sampleAttribs:
+            if hasattr(stim, name):
+                value = getattr(stim, name)
+                if isinstance(value, numpy.ndarray):
+                    value = value.copy()  # binary noise is shuffled in place
+                setattr(self, name, value)
+
+
+def _makeNoiseSamples(args):
+    """Make a stack of noise samples from a (sampler, nSamples, seed) tuple
+    (a single argument so that this can be used with `Pool.map`)
+    """
+    sampler, nSamples, seed = args
+    if seed is not None:
+        numpy.random.seed(seed)
+    samples = [numpy.array(sampler._newNoiseSample(), dtype=numpy.float32)
+               for ii in range(nSamples)]
+    return numpy.array(samples)
+
@@ -105,13 +105,18 @@ class Shader:
                              .format(name, len(value)))
 
 
-def compileProgram(vertexSource=None, fragmentSource=None):
+def compileProgram(vertexSource=None, fragmentSource=None,
+                   attribLocations=None):
     """Create and compile a vertex and fragment shader pair from their sources.
 
     Parameters
     ----------
     vertexSource, fragmentSource : str or list of str
         Vertex and fragment shader GLSL sources.
+    attribLocations : dict or None
+        Generic vertex attribute indices to bind attribute names to before
+        linking, so that several programs can share one vertex array object.
+        Keys are attribute names and values are indices.
 
     Returns
     -------
@@ -131,6 +136,12 @@ def compileProgram(vertexSource=None, fragmentSource=None):
             fragmentSource, GL.GL_FRAGMENT_SHADER_ARB)
         gltools.attachObjectARB(program, fragmentShader)
 
+    if attribLocations:
+        for name, index in attribLocations.items():
+            if type(name) != bytes:
+                name = name.encode()
+            GL.glBindAttribLocationARB(program, index, name)
+
     gltools.linkProgramObjectARB(program)
     # gltools.validateProgramARB(program)
 
@@ -284,6 +295,47 @@ vertSimple = """
     }
     """
 
+# for drawing many points with one instanced call (e.g. DotStim), there is
+# one instance per point and its position comes from a per-instance attribute
+vertInstancedPoints = """
+    attribute vec2 instancePos;
+    void main() {
+            gl_FrontColor = gl_Color;
+            gl_Position = gl_ModelViewProjectionMatrix *
+                vec4(instancePos, 0.0, 1.0);
+    }
+    """
+# for ElementArrayStim drawn from buffers: one instance per element, with the
+# corners, orientation and texture coords of each element worked out here
+vertElementArray = """
+    attribute vec2 corner;  // (+/-1, +/-1), per vertex
+    attribute vec3 elementPos;  // x, y (pix) and depth
+    attribute vec3 elementSizeOri;  // width, height (stim units), ori (deg)
+    attribute vec4 elementTexParams;  // texture cycles in x, y; phase x, y
+    attribute vec4 elementColor;
+    uniform vec2 unitScale;  // pix per stim unit
+    void main() {
+            float ori = radians(elementSizeOri.z);
+            vec2 wVec = 0.5 * elementSizeOri.x * vec2(-cos(ori), sin(ori));
+            vec2 hVec = 0.5 * elementSizeOri.y * vec2(sin(ori), cos(ori));
+            vec2 offset = (corner.x * wVec + corner.y * hVec) * unitScale;
+            gl_Position = gl_ModelViewProjectionMatrix *
+                vec4(elementPos.xy + offset, elementPos.z, 1.0);
+            gl_FrontColor = elementColor;
+            gl_TexCoord[0] = vec4(
+                0.5 - elementTexParams.z - 0.5 * corner.x * elementTexParams.x,
+                0.5 - elementTexParams.w + 0.5 * corner.y * elementTexParams.y,
+                0.0, 1.0);
+            gl_TexCoord[1] = vec4(
+                0.5 - 0.5 * corner.x, 0.5 + 0.5 * corner.y, 0.0, 1.0);
+    }
+    """
+fragColor = """
+    void main() {
+            gl_FragColor = gl_Color;
+    }
+    """
+
 vertPhongLighting = """
 // Vertex shader for the Phong Shading Model
 // 
@@ -13,7 +13,9 @@ from __future__ import absolute_import, division, print_function
 from builtins import str
 import os
 import glob
+import weakref
 import warnings
+from collections import OrderedDict
 
 # Ensure setting pyglet.options['debug_gl'] to False is done prior to any
 # other calls to pyglet or pyglet submodules, otherwise it may not get picked
@@ -72,11 +74,102 @@ defaultWrapWidth = {'cm': 15.0,
                     'pix': 500,
                     'pixels': 500}
 
+# rough memory use of a pyglet Label (its vertex lists), used to limit the
+# size of the TextCache. The glyphs are in pyglet's shared font textures.
+_labelBytes = 1024
+_labelBytesPerChar = 256
+
+
+class TextCache(object):
+    """Least recently used cache of rendered text (pyglet Labels, or pygame
+    textures), so that showing a text that has been shown before (with the
+    same font, height, color, wrap width and alignment) doesn't need it to be
+    laid out and rendered again. Each window has its own cache, which all its
+    TextStims use (see :meth:`TextStim.prewarm`).
+
+    :Parameters:
+
+        maxBytes : int
+            (Approximate) memory limit of the cache. When it is full the
+            least recently used texts are dropped.
+    """
+
+    def __init__(self, maxBytes=64 * 2 ** 20):
+        self.maxBytes = maxBytes
+        self.nBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key: (rendered text, nBytes)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        """Returns the rendered text for key (and marks it as recently used)
+        or None if it isn't in the cache"""
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def add(self, key, value, nBytes):
+        """Add a rendered text that takes up about nBytes of memory"""
+        if key in self._items:
+            self.nBytes -= self._items.pop(key)[1]
+        if nBytes > self.maxBytes:
+            return  # would just empty the cache
+        self._items[key] = (value, nBytes)
+        self.nBytes += nBytes
+        while self.nBytes > self.maxBytes:
+            key, (value, n) = self._items.popitem(last=False)
+            self.nBytes -= n
+
+    def clear(self):
+        self._items.clear()
+        self.nBytes = 0
+
+
+_textCaches = weakref.WeakKeyDictionary()  # Window: TextCache
+
+
+def getTextCache(win):
+    """The TextCache of the TextStims of a window"""
+    cache = _textCaches.get(win)
+    if cache is None:
+        cache = _textCaches[win] = TextCache(TextStim.textCacheMaxBytes)
+    return cache
+
+
+class _TextTexture(object):
+    """A texture with pygame rendered text, deleted along with the object
+    (so it can be shared by TextStims and the TextCache)"""
+
+    def __init__(self):
+        self.id = GL.GLuint()
+        GL.glGenTextures(1, ctypes.byref(self.id))
+        self.width = self.height = 0
+
+    def __del__(self):
+        try:
+            GL.glDeleteTextures(1, ctypes.byref(self.id))
+        except Exception:  # e.g. pyglet no longer exists
+            pass
+
 
 class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
     """Class of text stimuli to be displayed in a
     :class:`~psychopy.visual.Window`
     """
+    # keep rendered texts in the TextCache of the window, so that texts that
+    # are shown again (in later trials or by other TextStims) are fast to set
+    useTextCache = True
+    textCacheMaxBytes = 64 * 2 ** 20
 
     def __init__(self, win,
                  text="Hello World",
@@ -114,7 +207,9 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
         These make the next .draw() slower because that sets the text again.
         You can make the draw() quick by calling re-setting the text
         (``myTextStim.text = myTextStim.text``) when you've changed the
-        parameters.
+        parameters. Rendered texts are kept in a cache, so setting a text
+        that has been shown before (with the same settings) is fast, and
+        :meth:`prewarm` can render the texts of all trials in advance.
 
         In general, other attributes which merely affect the presentation of
         unchanged shapes are as fast as usual. This includes ``pos``,
@@ -204,8 +299,9 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
         self._listID = GL.glGenLists(1)
         # pygame text needs a surface to render to:
         if not self.win.winType in ["pyglet", "glfw"]:
-            self._texID = GL.GLuint()
-            GL.glGenTextures(1, ctypes.byref(self._texID))
+            self._textTexture = _TextTexture()
+            self._texID = self._textTexture.id
+            self._textTextureShared = False  # i.e. also in the TextCache
 
         # Color stuff
         self.colorSpace = colorSpace
@@ -344,21 +440,7 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
         if text == self.text: # only update for a change
             return
         if text is not None:
-            text = str(text)  # make sure we have unicode object to render
-
-            # deal with some international text issues. Only relevant for Python:
-            # online experiments use web technologies and handle this seamlessly.
-            style = self.languageStyle.lower()  # be flexible with case
-            if style == 'arabic' and haveArabic:
-                # reshape Arabic characters from their isolated form so that
-                # they flow and join correctly to their neighbours:
-                text = arabic_reshaper.reshape(text)
-            if style == 'rtl' or style == 'arabic' and haveArabic:
-                # deal with right-to-left text presentation by applying the
-                # bidirectional algorithm:
-                text = bidi_algorithm.get_display(text)
-            # no action needed for default 'ltr' (left-to-right) option
-
+            text = self._displayText(text)
             self.__dict__['text'] = text
 
         if self.useShaders:
@@ -373,45 +455,159 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
         """
         setAttribute(self, 'text', text, log)
 
-    def _setTextShaders(self, value=None):
-        """Set the text to be rendered using the current font
+    def _displayText(self, text):
+        """The text as it will be rendered (e.g. reshaped for Arabic)
         """
-        if self.win.winType in ["pyglet", "glfw"]:
-            rgba255 = self._foreColor.rgba255
-            rgba255[3] = rgba255[3]*255
-            rgba255 = [int(c) for c in rgba255]
-            self._pygletTextObj = pyglet.text.Label(
-                self.text, self.font, int(self._heightPix*0.75),
+        text = str(text)  # make sure we have unicode object to render
+
+        # deal with some international text issues. Only relevant for Python:
+        # online experiments use web technologies and handle this seamlessly.
+        style = self.languageStyle.lower()  # be flexible with case
+        if style == 'arabic' and haveArabic:
+            # reshape Arabic characters from their isolated form so that
+            # they flow and join correctly to their neighbours:
+            text = arabic_reshaper.reshape(text)
+        if style == 'rtl' or style == 'arabic' and haveArabic:
+            # deal with right-to-left text presentation by applying the
+            # bidirectional algorithm:
+            text = bidi_algorithm.get_display(text)
+        # no action needed for default 'ltr' (left-to-right) option
+        return text
+
+    @property
+    def textCache(self):
+        """The :class:`TextCache` of rendered texts of the window (or None if
+        this stim doesn't use it)"""
+        if not self.useTextCache:
+            return None
+        return getTextCache(self.win)
+
+    def prewarm(self, texts, key=None):
+        """Render texts into the :class:`TextCache` of the window, with the
+        current font, height, color, wrap width and alignment of this stim,
+        so that setting them as the text later is fast (e.g. render the
+        words of all trials before the first trial starts).
+
+        `texts` is a list of str, or a list of dicts (e.g. conditions from
+        :func:`~psychopy.data.importConditions`) with `key` giving the text
+        in each of them. The text currently shown by the stim isn't changed.
+
+        Example::
+
+            conditions = data.importConditions('stroop.xlsx')
+            word = visual.TextStim(win, color='red')
+            word.prewarm(conditions, 'word')
+        """
+        if not self.useTextCache:
+            return
+        for text in texts:
+            if key is not None:
+                text = text[key]
+            text = self._displayText(text)
+            if self.win.winType in ["pyglet", "glfw"]:
+                self._getLabel(text)
+            else:
+                self._getTextTexture(text, self.useShaders)
+
+    def _getLabel(self, text):
+        """A pyglet Label of the text with the current settings, from the
+        TextCache if it has been made before
+        """
+        rgba255 = self._foreColor.rgba255
+        rgba255[3] = rgba255[3]*255
+        rgba255 = [int(c) for c in rgba255]
+        key = ('label', text, self.font, int(self._heightPix*0.75),
+               self.anchorHoriz, self.anchorVert, self.alignText,
+               tuple(rgba255), float(self._wrapWidthPix))
+        cache = self.textCache
+        label = cache.get(key) if cache is not None else None
+        if label is None:
+            label = pyglet.text.Label(
+                text, self.font, int(self._heightPix*0.75),
                 anchor_x=self.anchorHoriz,
                 anchor_y=self.anchorVert,  # the point we rotate around
                 align=self.alignText,
                 color=rgba255,
                 multiline=True, width=self._wrapWidthPix)  # width of the frame
-            self.width = self._pygletTextObj.width
-            self._fontHeightPix = self._pygletTextObj.height
+            if cache is not None:
+                cache.add(key, label,
+                          _labelBytes + _labelBytesPerChar * len(text))
+        return label
+
+    def _getTextTexture(self, text, mipmap):
+        """A _TextTexture of the text rendered by pygame with the current
+        settings, from the TextCache if it has been made before. With
+        mipmap (for shaders) the text is white, and colored when drawn
+        """
+        if mipmap:
+            color = [255, 255, 255]
+        else:
+            color = self._foreColor.render('rgba255')
+        key = ('texture', text, self.font, int(self._heightPix), self.bold,
+               self.italic, self.antialias, mipmap,
+               tuple(float(c) for c in color))
+        cache = self.textCache
+        if cache is not None:
+            texture = cache.get(key)
+            if texture is not None:
+                return texture
+            texture = _TextTexture()
+        elif self._textTextureShared:
+            texture = _TextTexture()
         else:
-            self._surf = self._font.render(value, self.antialias,
-                                           [255, 255, 255])
-            self.width, self._fontHeightPix = self._surf.get_size()
+            texture = self._textTexture  # just render into our own again
 
-            if self.antialias:
-                smoothing = GL.GL_LINEAR
-            else:
-                smoothing = GL.GL_NEAREST
-            # generate the textures from pygame surface
-            GL.glEnable(GL.GL_TEXTURE_2D)
-            # bind that name to the target
-            GL.glBindTexture(GL.GL_TEXTURE_2D, self._texID)
-            GL.gluBuild2DMipmaps(GL.GL_TEXTURE_2D, 4, self.width,
-                                 self._fontHeightPix,
+        surf = self._font.render(text, self.antialias, color)
+        texture.width, texture.height = surf.get_size()
+        if self.antialias:
+            smoothing = GL.GL_LINEAR
+        else:
+            smoothing = GL.GL_NEAREST
+        # generate the textures from pygame surface
+        GL.glEnable(GL.GL_TEXTURE_2D)
+        # bind that name to the target
+        GL.glBindTexture(GL.GL_TEXTURE_2D, texture.id)
+        if mipmap:
+            GL.gluBuild2DMipmaps(GL.GL_TEXTURE_2D, 4, texture.width,
+                                 texture.height,
                                  GL.GL_RGBA, GL.GL_UNSIGNED_BYTE,
-                                 pygame.image.tostring(self._surf, "RGBA", 1))
-            # linear smoothing if texture is stretched?
-            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER,
-                               smoothing)
-            # but nearest pixel value if it's compressed?
-            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER,
-                               smoothing)
+                                 pygame.image.tostring(surf, "RGBA", 1))
+        else:
+            GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA,
+                            texture.width, texture.height, 0,
+                            GL.GL_RGBA, GL.GL_UNSIGNED_BYTE,
+                            pygame.image.tostring(surf, "RGBA", 1))
+        # linear smoothing if texture is stretched?
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER,
+                           smoothing)
+        # but nearest pixel value if it's compressed?
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER,
+                           smoothing)
+        if cache is not None:
+            nBytes = texture.width * texture.height * 4
+            if mipmap:
+                nBytes = nBytes * 4 // 3
+            cache.add(key, texture, nBytes)
+        return texture
+
+    def _setTextTexture(self, mipmap):
+        """Use the texture of the current text (rendered by pygame)
+        """
+        texture = self._getTextTexture(self.text, mipmap)
+        self._textTextureShared = self.useTextCache
+        self._textTexture = texture
+        self._texID = texture.id
+        self.width, self._fontHeightPix = texture.width, texture.height
+
+    def _setTextShaders(self, value=None):
+        """Set the text to be rendered using the current font
+        """
+        if self.win.winType in ["pyglet", "glfw"]:
+            self._pygletTextObj = self._getLabel(self.text)
+            self.width = self._pygletTextObj.width
+            self._fontHeightPix = self._pygletTextObj.height
+        else:
+            self._setTextTexture(mipmap=True)
 
         self._needSetText = False
         self._needUpdate = True
@@ -504,39 +700,10 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
         """Set the text to be rendered using the current font
         """
         if self.win.winType in ["pyglet", "glfw"]:
-            rgba255 = self._foreColor.rgba255
-            rgba255[3] = rgba255[3]*255
-            rgba255 = [int(c) for c in rgba255]
-            self._pygletTextObj = pyglet.text.Label(
-                self.text, self.font, int(self._heightPix*0.75),
-                anchor_x=self.anchorHoriz,
-                anchor_y=self.anchorVert,  # the point we rotate around
-                align=self.alignText,
-                color = rgba255,
-                multiline=True, width=self._wrapWidthPix)  # width of the frame
+            self._pygletTextObj = self._getLabel(self.text)
             self.width = self._pygletTextObj.width
         else:
-            self._surf = self._font.render(value, self.antialias,
-                                           self._foreColor.render('rgba255'))
-            self.width, self._fontHeightPix = self._surf.get_size()
-            if self.antialias:
-                smoothing = GL.GL_LINEAR
-            else:
-                smoothing = GL.GL_NEAREST
-            # generate the textures from pygame surface
-            GL.glEnable(GL.GL_TEXTURE_2D)
-            # bind that name to the target
-            GL.glBindTexture(GL.GL_TEXTURE_2D, self._texID)
-            GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA,
-                            self.width, self._fontHeightPix, 0,
-                            GL.GL_RGBA, GL.GL_UNSIGNED_BYTE,
-                            pygame.image.tostring(self._surf, "RGBA", 1))
-            # linear smoothing if texture is stretched?
-            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER,
-                               smoothing)
-            # but nearest pixel value if it's compressed?
-            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER,
-                               smoothing)
+            self._setTextTexture(mipmap=False)
         self._needUpdate = True
 
     def _updateListNoShaders(self):
@@ -1,4 +1,5 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from .textbox2 import TextBox2, allFonts
\ No newline at end of file
+from .textbox2 import TextBox2, allFonts
+from .batch import TextBox2Batch
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Part of the PsychoPy library
+# Copyright (C) 2002-2018 Jonathan Peirce (C) 2019-2021 Open Science Tools Ltd.
+# Distributed under the terms of the GNU General Public License (GPL).
+
+"""Draw many TextBox2 stimuli with one draw call per font (glyph atlas)
+"""
+
+import ctypes
+
+import numpy as np
+from pyglet import gl
+
+from psychopy.tools import gltools
+
+# columns of the vertex data: x, y (pix), u, v (texcoords), r, g, b, a
+_nCols = 8
+_rowBytes = _nCols * 4  # float32
+
+
+class _AtlasBatch(object):
+    """The vertex data (in a VBO) of the boxes that use one GLFont"""
+
+    def __init__(self, glFont):
+        self.glFont = glFont
+        self.boxes = []  # in the order of their vertices in the VBO
+        self.nChars = []
+        self.versions = []
+        self.data = np.zeros((0, _nCols), dtype=np.float32)
+        self.nVerts = 0
+        self.vbo = None
+
+    def _fill(self, box, start):
+        """Copy the vertices of box into self.data from row start on"""
+        rows = self.data[start:start + len(box._text) * 4]
+        rows[:, 0:2] = box.verticesPix
+        rows[:, 2:4] = box._texcoords
+        rows[:, 4:8] = box._colors
+
+    def update(self, boxes):
+        """Update the VBO for the boxes (only the boxes that have changed if
+        the same boxes, with the same number of chars, were drawn before)"""
+        nChars = [len(box._text) for box in boxes]
+        if boxes == self.boxes and nChars == self.nChars:
+            start = 0
+            for ii, box in enumerate(boxes):
+                nRows = nChars[ii] * 4
+                if box._vertexVersion != self.versions[ii]:
+                    self._fill(box, start)
+                    self.versions[ii] = box._vertexVersion
+                    gltools.bindVBO(self.vbo)
+                    gl.glBufferSubData(
+                        self.vbo.target, start * _rowBytes, nRows * _rowBytes,
+                        self.data[start:].ctypes.data_as(ctypes.c_void_p))
+                    gltools.unbindVBO(self.vbo)
+                start += nRows
+            return
+
+        # boxes added, removed or with a different number of chars
+        self.boxes = list(boxes)
+        self.nChars = nChars
+        self.versions = [box._vertexVersion for box in boxes]
+        self.nVerts = sum(nChars) * 4
+        if len(self.data) < self.nVerts:
+            self.data = np.zeros((max(self.nVerts, 2 * len(self.data)),
+                                  _nCols), dtype=np.float32)
+        start = 0
+        for box in boxes:
+            self._fill(box, start)
+            start += len(box._text) * 4
+        if self.vbo is None or self.vbo.shape[0] < len(self.data):
+            self.delete()
+            self.vbo = gltools.createVBO(self.data, usage=gl.GL_DYNAMIC_DRAW)
+        else:
+            gltools.bindVBO(self.vbo)
+            gl.glBufferSubData(
+                self.vbo.target, 0, self.nVerts * _rowBytes,
+                self.data.ctypes.data_as(ctypes.c_void_p))
+            gltools.unbindVBO(self.vbo)
+
+    def draw(self):
+        """Draw the text of all the boxes (in pix units)"""
+        if not self.nVerts:
+            return
+        shader = self.boxes[0].shader
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.glFont.textureID)
+        gl.glEnable(gl.GL_TEXTURE_2D)
+        gl.glDisable(gl.GL_DEPTH_TEST)
+
+        gltools.setVertexAttribPointer(
+            gl.GL_VERTEX_ARRAY, self.vbo, size=2, offset=0, legacy=True)
+        gltools.setVertexAttribPointer(
+            gl.GL_TEXTURE_COORD_ARRAY, self.vbo, size=2, offset=2,
+            legacy=True)
+        gltools.setVertexAttribPointer(
+            gl.GL_COLOR_ARRAY, self.vbo, size=4, offset=4, legacy=True)
+
+        shader.bind()
+        shader.setInt('texture', 0)
+        shader.setFloat('pixel', [1.0 / 512, 1.0 / 512])
+        gl.glDrawArrays(gl.GL_QUADS, 0, self.nVerts)
+        shader.unbind()
+
+        gltools.disableVertexAttribArray(gl.GL_COLOR_ARRAY, legacy=True)
+        gltools.disableVertexAttribArray(gl.GL_TEXTURE_COORD_ARRAY,
+                                         legacy=True)
+        gltools.disableVertexAttribArray(gl.GL_VERTEX_ARRAY, legacy=True)
+
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+        gl.glDisable(gl.GL_TEXTURE_2D)
+
+    def delete(self):
+        if self.vbo is not None:
+            gltools.deleteVBO(self.vbo)
+            self.vbo = None
+
+
+class TextBox2Batch(object):
+    """Draws a set of TextBox2 stimuli together, much faster than calling
+    draw() for each of them when there are many (e.g. the labels of a
+    rating form).
+
+    The text of all the boxes that use the same font (glyph atlas) is drawn
+    with a single draw call, from a vertex buffer on the graphics card that
+    is only updated for the boxes that changed since the last draw(). Borders
+    and fills (if the boxes have them) and the caret of the box that has the
+    focus are drawn as usual, but all of them before the text, so the boxes
+    shouldn't overlap.
+
+    Parameters
+    ----------
+    win : Window
+        The window the boxes are drawn in
+    boxes : list of TextBox2
+        The boxes to draw. Boxes can also be added (or removed) later.
+
+    Examples
+    --------
+    Draw 60 labels::
+
+        labels = [visual.TextBox2(win, "label %i" % n, "Open Sans",
+                                  pos=(-0.4 + (n % 6) * 0.16,
+                                       0.45 - (n // 6) * 0.1),
+                                  size=(0.15, 0.08), letterHeight=0.03)
+                  for n in range(60)]
+        batch = visual.TextBox2Batch(win, labels)
+        while True:
+            batch.draw()
+            win.flip()
+    """
+
+    def __init__(self, win, boxes=()):
+        self.win = win
+        self.boxes = []
+        self._atlases = {}  # GLFont: _AtlasBatch
+        for box in boxes:
+            self.add(box)
+
+    def add(self, box):
+        """Add a TextBox2 to the boxes that are drawn."""
+        if box not in self.boxes:
+            self.boxes.append(box)
+
+    def remove(self, box):
+        """Stop drawing a TextBox2 with the batch."""
+        if box in self.boxes:
+            self.boxes.remove(box)
+
+    def draw(self):
+        """Draw all the boxes to the back buffer"""
+        byFont = {}
+        for box in self.boxes:
+            box._drawBox()  # also updates its vertices if needed
+            byFont.setdefault(box.glFont, []).append(box)
+        # free the buffers of fonts that are no longer used
+        for glFont in list(self._atlases):
+            if glFont not in byFont:
+                self._atlases.pop(glFont).delete()
+
+        gl.glPushMatrix()
+        self.win.setScale('pix')
+        for glFont, boxes in byFont.items():
+            atlas = self._atlases.get(glFont)
+            if atlas is None:
+                atlas = self._atlases[glFont] = _AtlasBatch(glFont)
+            atlas.update(boxes)
+            atlas.draw()
+        for box in self.boxes:
+            if box.hasFocus:  # draw caret line
+                box.caret.draw()
+        gl.glPopMatrix()
+
+    def __del__(self):
+        for atlas in self._atlases.values():
+            try:
+                atlas.delete()
+            except Exception:  # e.g. the GL context is already gone
+                pass
@@ -17,6 +17,9 @@
 import re
 import sys, os
 import math
+import json
+import atexit
+import hashlib
 import numpy as np
 import ctypes
 import freetype as ft
@@ -70,6 +73,34 @@ _weightMap = {
 
 supportedExtensions = ['ttf', 'otf', 'ttc', 'dfont', 'truetype']
 
+# format of the glyph cache files written by GLFont.saveToCache()
+_glyphCacheVersion = 1
+_glyphCacheDtype = np.dtype([('charcode', np.uint32), ('size', np.int32, 2),
+                             ('offset', np.int32, 2),
+                             ('advance', np.float64, 2),
+                             ('texcoords', np.float64, 4)])
+_fontFileHashes = {}  # (path, mtime, file size): hash
+
+
+def getFontCacheDir():
+    """The folder where GLFont glyph caches are stored"""
+    return os.path.join(prefs.paths['userPrefsDir'], 'fontCache')
+
+
+def fontFileHash(filename):
+    """Return a hash of the contents of a font file, so that cached glyphs
+    are not used if the font file changes."""
+    filename = str(filename)
+    stat = os.stat(filename)
+    key = (filename, stat.st_mtime, stat.st_size)
+    if key not in _fontFileHashes:
+        sha = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        _fontFileHashes[key] = sha.hexdigest()[:16]
+    return _fontFileHashes[key]
+
 
 def unicode(s, fmt='utf-8'):
     """Force to unicode if bytes"""
@@ -359,6 +390,10 @@ class GLFont:
         self.height = metrics.height / self.scale
         self.linegap = self.height - self.ascender + self.descender
         self.format = self.atlas.format
+        # glyphs in the cache file loaded by loadFromCache() (sorted by
+        # charcode) and the number rendered since the cache was loaded/saved
+        self._cachedGlyphs = None
+        self._nNewGlyphs = 0
 
     def __getitem__(self, charcode):
         """
@@ -428,6 +463,8 @@ class GLFont:
         for charcode in charcodes:
             if charcode in self.glyphs:
                 continue
+            if self._cachedGlyphs is not None and self._glyphFromCache(charcode):
+                continue
             face.set_pixel_sizes(int(self.size), int(self.size))
 
             self._dirty = True
@@ -482,6 +519,7 @@ class GLFont:
             texcoords = (u0, v0, u1, v1)
             glyph = TextureGlyph(charcode, size, offset, advance, texcoords)
             self.glyphs[charcode] = glyph
+            self._nNewGlyphs += 1
 
             # Generate kerning
             # for g in self.glyphs.values():
@@ -498,19 +536,132 @@ class GLFont:
         logging.debug("TextBox2 loaded {} chars with {} blanks and {} valid"
                      .format(len(charcodes), nBlanks, len(charcodes) - nBlanks))
 
-    def saveToCache(self):
-        """Store the current font texture as an image file.
-
-        As yet we aren't storing the offset, advance and texcoords as needed to
-        retrieve the necessary chars, but it's a start!
-            (see  TextureGlyph(charcode, size, offset, advance, texcoords) )
-
+    @property
+    def cacheKey(self):
+        """Identifies the font file contents, size and atlas layout that a
+        glyph cache is valid for"""
+        return "{}_{}_{}_{}".format(fontFileHash(self.filename), self.size,
+                                    self.format, self.atlas.width)
+
+    def _cachePath(self, cacheDir=None):
+        if cacheDir is None:
+            cacheDir = getFontCacheDir()
+        return os.path.join(str(cacheDir),
+                            "{}_{}".format(self.info, self.cacheKey))
+
+    def saveToCache(self, cacheDir=None):
+        """Store the font texture and the size, offset, advance and texcoords
+        of every glyph, so that later GLFonts of the same font file and size
+        can use them (see loadFromCache) instead of rendering each glyph again.
+
+        The cache is made up of three files in cacheDir (by default the
+        fontCache folder of the user prefs): the texture (.npy), the glyph
+        table (_glyphs.npy) and the texture packing info (.json). Caches of
+        previous versions of the font file are removed.
+
+        Returns the path of the cache files (without the extension).
         """
-        from PIL import Image
-        im = Image.fromarray(self.atlas.data)
-        fname = "{}/.psychopy3/{}_{}_texture.png".format(
-            os.path.expanduser("~"), self.name, self.size)
-        im.save(fname)
+        path = self._cachePath(cacheDir)
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        table = np.zeros(len(self.glyphs), dtype=_glyphCacheDtype)
+        for i, (charcode, glyph) in enumerate(self.glyphs.items()):
+            table[i] = (ord(charcode), glyph.size, glyph.offset,
+                        glyph.advance, glyph.texcoords)
+        if self._cachedGlyphs is not None:
+            table = np.concatenate((table, self._cachedGlyphs))
+        # sorted by charcode, without the glyphs that were in both
+        table = table[np.unique(table['charcode'], return_index=True)[1]]
+        info = dict(version=_glyphCacheVersion, name=self.name,
+                    key=self.cacheKey, nodes=self.atlas.nodes,
+                    used=self.atlas.used, nGlyphs=len(table))
+
+        # write to temporary files first so that a reader never finds a
+        # partly written cache (the json file is checked on load)
+        try:
+            for data, ext in ((np.asarray(self.atlas.data), '.npy'),
+                              (table, '_glyphs.npy')):
+                with open(path + ext + '.tmp', 'wb') as f:
+                    np.save(f, data)
+                os.replace(path + ext + '.tmp', path + ext)
+            with open(path + '.json', 'w') as f:
+                json.dump(info, f)
+        except OSError as err:
+            # e.g. the cache files are memory-mapped by this process on Windows
+            logging.warning("Failed to save glyph cache for Texture Font {}: {}"
+                            .format(self.name, err))
+            return None
+        self._nNewGlyphs = 0
+
+        # same font, size and format but another version of the font file
+        prefix = "{}_".format(self.info)
+        suffix = "_{}_{}_{}.json".format(self.size, self.format,
+                                         self.atlas.width)
+        for fname in os.listdir(folder):
+            stale = os.path.join(folder, fname[:-5])
+            if (fname.startswith(prefix) and fname.endswith(suffix)
+                    and len(fname) == len(prefix) + 16 + len(suffix)
+                    and stale != path):
+                for ext in ('.json', '.npy', '_glyphs.npy'):
+                    try:
+                        os.remove(stale + ext)
+                    except OSError:
+                        pass
+        logging.debug("Saved {} glyphs of Texture Font {} to {}"
+                      .format(len(table), self.name, path))
+        return path
+
+    def loadFromCache(self, cacheDir=None):
+        """Use the glyphs saved by saveToCache, if a cache exists for this
+        version of the font file and this size. The texture and glyph table
+        are memory-mapped (copy-on-write, so glyphs can still be added), and
+        a TextureGlyph is only created when a character is first used.
+
+        Returns True if the cache was loaded.
+        """
+        path = self._cachePath(cacheDir)
+        try:
+            with open(path + '.json') as f:
+                info = json.load(f)
+            if (info['version'] != _glyphCacheVersion
+                    or info['key'] != self.cacheKey):
+                return False
+            data = np.load(path + '.npy', mmap_mode='c')
+            table = np.load(path + '_glyphs.npy', mmap_mode='r')
+            if (data.shape != self.atlas.data.shape
+                    or table.dtype != _glyphCacheDtype
+                    or len(table) != info['nGlyphs']):
+                return False
+        except (OSError, ValueError, KeyError):
+            return False
+        self.atlas.data = data
+        self.atlas.nodes = [tuple(node) for node in info['nodes']]
+        self.atlas.used = info['used']
+        self.glyphs = {}
+        self._cachedGlyphs = table
+        self._nNewGlyphs = 0
+        self._dirty = True
+        logging.debug("Loaded {} cached glyphs for Texture Font {}"
+                      .format(len(table), self.name))
+        return True
+
+    def _glyphFromCache(self, charcode):
+        """Create the glyph for charcode from the cached glyph table, if it
+        is there"""
+        table = self._cachedGlyphs
+        code = ord(charcode)
+        i = np.searchsorted(table['charcode'], code)
+        if i == len(table) or table['charcode'][i] != code:
+            return None
+        row = table[i]
+        glyph = TextureGlyph(charcode, tuple(row['size'].tolist()),
+                             tuple(row['offset'].tolist()),
+                             tuple(row['advance'].tolist()),
+                             tuple(row['texcoords'].tolist()))
+        self.glyphs[charcode] = glyph
+        return glyph
 
     def upload(self):
         """Upload the font data into graphics card memory.
@@ -643,6 +794,8 @@ class FontManager(object):
     """
     freetype_import_error = None
     _glFonts = {}
+    # load GLFonts from, and save new glyphs to, the glyph cache
+    useGlyphCache = True
     fontStyles = []
     _fontInfos = {}  # JWP: dict of name:FontInfo objects
 
@@ -875,10 +1028,20 @@ class FontManager(object):
         glFont = self._glFonts.get(identifier)
         if glFont is None:
             glFont = GLFont(fontInfo.path, size)
+            if self.useGlyphCache:
+                glFont.loadFromCache()
             self._glFonts[identifier] = glFont
 
         return glFont
 
+    @classmethod
+    def saveGlyphCaches(cls, cacheDir=None):
+        """Save the glyph cache of each loaded GLFont that has rendered new
+        glyphs since its cache was loaded (called at exit)"""
+        for glFont in list(cls._glFonts.values()):
+            if glFont._nNewGlyphs:
+                glFont.saveToCache(cacheDir)
+
     def updateFontInfo(self, monospaceOnly=False):
         self._fontInfos.clear()
         del self.fontStyles[:]
@@ -933,6 +1096,14 @@ class FontManager(object):
             self._fontInfos = None
 
 
+def _saveGlyphCaches():
+    if FontManager.useGlyphCache:
+        FontManager.saveGlyphCaches()
+
+
+atexit.register(_saveGlyphCaches)
+
+
 class FontInfo(object):
 
     def __init__(self, fp, face):
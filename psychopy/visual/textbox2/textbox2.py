@@ -67,6 +67,48 @@ defaultBoxWidth = {'cm': 15.0,
 
 wordBreaks = " -\n"  # what about ",."?
 
+# columns of the layout checkpoints saved at the start of each word (see
+# TextBox2._layout): char index, x, y, lineN, charsThisLine, wordsThisLine,
+# fakeItalic, fakeBold
+_nCheckpointCols = 8
+
+
+def _growBuffer(buf, nRows):
+    """Returns buf if it has at least nRows rows, otherwise a copy of it
+    with at least twice the rows (so that adding text one char at a time only
+    needs O(log n) reallocations)"""
+    if len(buf) >= nRows:
+        return buf
+    newBuf = np.zeros((max(nRows, 2 * len(buf)),) + buf.shape[1:],
+                      dtype=buf.dtype)
+    newBuf[:len(buf)] = buf
+    return newBuf
+
+
+def _commonPrefixLen(a, b):
+    """Length of the common start of two strings or lists (comparing slices
+    so that long texts are compared at C speed)"""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _textEdit(oldText, oldStyles, newText, newStyles):
+    """Returns (start, oldEnd, newEnd) such that oldText[start:oldEnd] was
+    replaced by newText[start:newEnd] (with the same for the styles)"""
+    start = min(_commonPrefixLen(oldText, newText),
+                _commonPrefixLen(oldStyles, newStyles))
+    maxEnd = min(len(oldText), len(newText)) - start
+    end = min(_commonPrefixLen(oldText[::-1], newText[::-1]),
+              _commonPrefixLen(oldStyles[::-1], newStyles[::-1]),
+              maxEnd)
+    return start, len(oldText) - end, len(newText) - end
+
 
 END_OF_THIS_LINE = 983349843
 
@@ -197,6 +239,20 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
         self._lines = None  # np.array the line numbers for each char
         self._colors = None
         self._styles = None
+        # preallocated (capacity doubling) arrays that the layout views
+        self._vertexBuffer = np.zeros((0, 2), dtype=np.float32)
+        self._colorBuffer = np.zeros((0, 4), dtype=np.double)
+        self._texcoordBuffer = np.zeros((0, 2), dtype=np.double)
+        self._lineNBuffer = np.zeros(0, dtype=int)
+        # state saved by the last layout so it can be continued from an edit
+        self._checkpoints = None
+        self._layoutParams = None
+        self._vertexVersion = 0  # incremented whenever verticesPix change
+        self._lineNs = None
+        self._lineTops = []
+        self._lineBottoms = []
+        self._lineLenChars = []
+        self._lineWidths = []
         self.flipHoriz = flipHoriz
         self.flipVert = flipVert
         # params about positioning (after layout has occurred)
@@ -381,6 +437,7 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
         text = text.replace('<b>', codes['BOLD_START'])
         text = text.replace('</b>', codes['BOLD_END'])      
         visible_text = ''.join([c for c in text if c not in codes.values()])
+        oldText, oldStyles = self._text, self._styles
         self._styles = [0,]*len(visible_text)
         self._text = visible_text
         
@@ -398,8 +455,12 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
             else:
                 self._styles[ci]=current_style
                 ci+=1
-                
-        self._layout()
+
+        # only lay out the changed part again (e.g. when streaming text)
+        edit = None
+        if oldStyles is not None and self._checkpoints is not None:
+            edit = _textEdit(oldText, oldStyles, self._text, self._styles)
+        self._layout(edit)
 
     def addCharAtCaret(self, char):
         txt = self._text
@@ -410,7 +471,8 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
         self._styles.insert(self.caret.index, cstyle)
         self.caret.index += 1
         self._text = txt
-        self._layout()
+        self._layout((self.caret.index - 1, self.caret.index - 1,
+                      self.caret.index))
 
     def deleteCaretLeft(self):
         if self.caret.index > 0:
@@ -420,7 +482,7 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
             self._styles = self._styles[:ci-1]+self._styles[ci:]
             self.caret.index -= 1
             self._text = txt
-            self._layout()
+            self._layout((ci - 1, ci, ci - 1))
 
     def deleteCaretRight(self):
         ci = self.caret.index
@@ -429,10 +491,21 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
             txt = txt[:ci] + txt[ci+1:]
             self._styles = self._styles[:ci]+self._styles[ci+1:]
             self._text = txt
-            self._layout()
+            self._layout((ci, ci + 1, ci))
         
-    def _layout(self):
+    def _layout(self, edit=None):
         """Layout the text, calculating the vertex locations
+
+        Parameters
+        ----------
+        edit : tuple or None
+            (start, oldEnd, newEnd) if the only change since the last layout
+            is that chars [start:oldEnd] of the text were replaced by
+            [start:newEnd] of self._text (e.g. typing into an editable box).
+            With the default lineBreaking, the text is then only laid out
+            again from the start of the word containing the edit, until the
+            layout reaches a word that starts where it did before the edit.
+            The remaining lines are then just moved up or down.
         """
         def getLineWidthFromPix(pixVal):
             return pixVal / self._pixelScaling + self.padding * 2
@@ -444,19 +517,8 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
         # then we convert them to the requested units for self._vertices
         # then they are converted back during rendering using standard BaseStim
         visible_text = self._text
-        vertices = np.zeros((len(visible_text) * 4, 2), dtype=np.float32)
-        self._charIndices = np.zeros((len(visible_text)), dtype=int)
-        self._colors = np.zeros((len(visible_text) * 4, 4), dtype=np.double)
-        self._texcoords = np.zeros((len(visible_text) * 4, 2), dtype=np.double)
-        self._glIndices = np.zeros((len(visible_text) * 4), dtype=int)
-
-        # the following are used internally for layout
-        self._lineNs = np.zeros(len(visible_text), dtype=int)
-        self._lineTops = []  # just length of nLines
-        self._lineBottoms = []
-        self._lineLenChars = []  #
-        self._lineWidths = []  # width in stim units of each line
-
+        nChars = len(visible_text)
+        oldNChars = len(self._lineNs) if self._lineNs is not None else 0
         self._lineHeight = font.height * self.lineSpacing
 
         if np.isnan(self._requestedSize[0]):
@@ -473,14 +535,82 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
         else:
             alphaCorrection = 1
 
+        # anything else that changed means the whole text needs laying out
+        layoutParams = (font, self._lineHeight, lineMax, self.padding,
+                        self._pixelScaling, tuple(np.ravel(rgb)),
+                        self._lineBreaking, showWhiteSpace)
+        if (edit is None or self._checkpoints is None
+                or layoutParams != self._layoutParams):
+            edit = None
+        self._layoutParams = layoutParams
+
+        # the arrays are views of buffers that are only reallocated when the
+        # text outgrows them
+        self._vertexBuffer = _growBuffer(self._vertexBuffer, nChars * 4)
+        self._colorBuffer = _growBuffer(self._colorBuffer, nChars * 4)
+        self._texcoordBuffer = _growBuffer(self._texcoordBuffer, nChars * 4)
+        self._lineNBuffer = _growBuffer(self._lineNBuffer, nChars)
+        if edit is not None:
+            # move the chars after the edit to their new index
+            start, oldEnd, newEnd = edit
+            if newEnd != oldEnd and oldEnd < oldNChars:
+                for buf in (self._vertexBuffer, self._colorBuffer,
+                            self._texcoordBuffer):
+                    buf[newEnd * 4:(nChars * 4)] = buf[oldEnd * 4:oldNChars * 4]
+                self._lineNBuffer[newEnd:nChars] = \
+                    self._lineNBuffer[oldEnd:oldNChars]
+        vertices = self._vertexBuffer[:nChars * 4]
+        self._colors = self._colorBuffer[:nChars * 4]
+        self._texcoords = self._texcoordBuffer[:nChars * 4]
+
+        # the following are used internally for layout
+        self._lineNs = self._lineNBuffer[:nChars]
+        oldLineTops = self._lineTops
+        oldLineBottoms = self._lineBottoms
+        oldLineLenChars = self._lineLenChars
+        oldLineWidths = self._lineWidths
+        self._lineTops = []  # just length of nLines
+        self._lineBottoms = []
+        self._lineLenChars = []  #
+        self._lineWidths = []  # width in stim units of each line
+
         if self._lineBreaking == 'default':
 
             wordLen = 0
             charsThisLine = 0
             wordsThisLine = 0
             lineN = 0
-
-            for i, charcode in enumerate(self._text):
+            startIndex = 0
+            checkpoints = [np.zeros((1, _nCheckpointCols))]
+            oldCheckpoints = None
+            if edit is not None:
+                # continue from the start of the word containing the edit
+                # (laying out later chars never moves the earlier words)
+                cpIndex = np.searchsorted(self._checkpoints[:, 0], start,
+                                          side='right') - 1
+                cp = self._checkpoints[cpIndex]
+                (startIndex, current[0], current[1], lineN, charsThisLine,
+                 wordsThisLine, fakeItalic, fakeBold) = cp.tolist()
+                startIndex, lineN = int(startIndex), int(lineN)
+                charsThisLine = int(charsThisLine)
+                # the tops/bottoms stored by the (full) layout of the chars
+                # before startIndex, which stores one per char at most
+                nTops = min(startIndex, lineN + 1)
+                self._lineTops = oldLineTops[:nTops]
+                self._lineBottoms = oldLineBottoms[:nTops]
+                self._lineLenChars = oldLineLenChars[:lineN]
+                self._lineWidths = oldLineWidths[:lineN]
+                checkpoints = [self._checkpoints[:cpIndex + 1]]
+                # the old layout from the end of the edit on may be reused
+                oldCheckpoints = self._checkpoints[
+                    self._checkpoints[:, 0] >= oldEnd]
+                oldCheckpoints[:, 0] += newEnd - oldEnd
+                nextOld = 0
+            newCheckpoints = []
+            converged = False
+
+            for i in range(startIndex, nChars):
+                charcode = visible_text[i]
                 printable = True  # unless we decide otherwise
                 # handle formatting codes
                 if self._styles[i] == NONE:
@@ -579,12 +709,68 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
                     self._lineBottoms.append(current[1] + font.descender)
                     self._lineTops.append(current[1] + self._lineHeight
                                           + font.descender/2)
-                
-            # finally add length of this (unfinished) line
-            self._lineWidths.append(getLineWidthFromPix(current[0]))
-            self._lineLenChars.append(charsThisLine)
+
+                if wordLen:
+                    continue
+                # at the start of a word, so save where we are in the layout
+                k = i + 1
+                newCheckpoints.append((k, current[0], current[1], lineN,
+                                       charsThisLine, wordsThisLine,
+                                       fakeItalic, fakeBold))
+                if oldCheckpoints is None or k < newEnd:
+                    continue
+                while (nextOld < len(oldCheckpoints)
+                       and oldCheckpoints[nextOld, 0] < k):
+                    nextOld += 1
+                if nextOld == len(oldCheckpoints):
+                    oldCheckpoints = None  # nothing left to reuse
+                    continue
+                old = oldCheckpoints[nextOld]
+                if (old[0] != k or old[1] != current[0]
+                        or old[4] != charsThisLine
+                        or bool(old[5]) != bool(wordsThisLine)
+                        or old[6] != fakeItalic or old[7] != fakeBold):
+                    continue
+                if (len(self._lineTops) != lineN + 1
+                        or len(oldLineTops) <= old[3]
+                        or k - (newEnd - oldEnd) < old[3] + 1):
+                    # the tops of the lines lag behind (only while every
+                    # char so far has been a new line), so lay out on
+                    continue
+                # the rest of the text is laid out as before the edit, but
+                # maybe on different lines
+                dy = current[1] - old[2]
+                oldLineN = int(old[3])
+                dLines = lineN - oldLineN
+                if dy:
+                    vertices[k * 4:, 1] += dy
+                if dLines:
+                    self._lineNs[k:] += dLines
+                self._lineTops.extend(
+                    [top + dy for top in oldLineTops[oldLineN + 1:]])
+                self._lineBottoms.extend(
+                    [bottom + dy for bottom in oldLineBottoms[oldLineN + 1:]])
+                self._lineLenChars.extend(oldLineLenChars[oldLineN:])
+                self._lineWidths.extend(oldLineWidths[oldLineN:])
+                reusedCheckpoints = oldCheckpoints[nextOld + 1:]
+                reusedCheckpoints[:, 2] += dy
+                reusedCheckpoints[:, 3] += dLines
+                lineN = len(self._lineLenChars) - 1
+                converged = True
+                break
+
+            if not converged:
+                # finally add length of this (unfinished) line
+                self._lineWidths.append(getLineWidthFromPix(current[0]))
+                self._lineLenChars.append(charsThisLine)
+            if newCheckpoints:
+                checkpoints.append(np.array(newCheckpoints, dtype=np.double))
+            if converged:
+                checkpoints.append(reusedCheckpoints)
+            self._checkpoints = np.concatenate(checkpoints)
 
         elif self._lineBreaking == 'uax14':
+            self._checkpoints = None  # always laid out in full
 
             # get a list of line-breakable points according to UAX#14
             breakable_points = list(get_breakable_points(self._text))
@@ -758,21 +944,7 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
 
     def draw(self):
         """Draw the text to the back buffer"""
-        # Border width
-        self.box.setLineWidth(self.pallette['lineWidth']) # Use 1 as base if border width is none
-        #self.borderWidth = self.box.lineWidth
-        # Border colour
-        self.box.setLineColor(self.pallette['lineColor'], colorSpace='rgb')
-        #self.borderColor = self.box.lineColor
-        # Background
-        self.box.setFillColor(self.pallette['fillColor'], colorSpace='rgb')
-        #self.fillColor = self.box.fillColor
-
-        if self._needVertexUpdate:
-            #print("Updating vertices...")
-            self._updateVertices()
-        if self.fillColor is not None or self.borderColor is not None:
-            self.box.draw()
+        self._drawBox()
 
         # self.boundingBox.draw()  # could draw for debug purposes
         gl.glPushMatrix()
@@ -815,6 +987,25 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
 
         gl.glPopMatrix()
 
+    def _drawBox(self):
+        """Update the vertices if needed and draw the border and fill of the
+        box (the part of draw() that isn't the text itself)"""
+        # Border width
+        self.box.setLineWidth(self.pallette['lineWidth']) # Use 1 as base if border width is none
+        #self.borderWidth = self.box.lineWidth
+        # Border colour
+        self.box.setLineColor(self.pallette['lineColor'], colorSpace='rgb')
+        #self.borderColor = self.box.lineColor
+        # Background
+        self.box.setFillColor(self.pallette['fillColor'], colorSpace='rgb')
+        #self.fillColor = self.box.fillColor
+
+        if self._needVertexUpdate:
+            #print("Updating vertices...")
+            self._updateVertices()
+        if self.fillColor is not None or self.borderColor is not None:
+            self.box.draw()
+
     def reset(self):
         # Reset contents
         self.text = self.startText
@@ -944,6 +1135,7 @@ class TextBox2(BaseVisualStim, ContainerMixin, ColorMixin):
         self.box.size = self.size  # this might have changed from _requested
 
         self._needVertexUpdate = False
+        self._vertexVersion += 1  # e.g. TextBox2Batch needs to upload them
 
     def _onText(self, chr):
         """Called by the window when characters are received"""
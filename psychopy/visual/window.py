@@ -565,6 +565,7 @@ class Window(object):
         self.nDroppedFrames = 0
         self.frameIntervals = []
         self._frameTimes = deque(maxlen=1000)  # 1000 keeps overhead low
+        self.frameTiming = None  # a FrameTimingRecorder to audit every frame
 
         self._toDraw = []
         self._toDrawDepths = []
@@ -727,6 +728,10 @@ class Window(object):
 
             win.saveFrameIntervals()
 
+        To record the timing of every frame of a session (draw, swap and GPU
+        times as well as the intervals) assign a
+        :class:`~psychopy.visual.FrameTimingRecorder` to `win.frameTiming`.
+
         """
         # was off, and now turning it on
         self.recordFrameIntervalsJustTurnedOn = bool(
@@ -1127,6 +1132,13 @@ class Window(object):
         # call this before flip() whether FBO was used or not
         self._afterFBOrender()
 
+        frameTiming = self.frameTiming
+        if frameTiming is not None and frameTiming.recording:
+            tSwap = core.getTime()
+            frameTiming._beforeSwap()
+        else:
+            frameTiming = None
+
         self.backend.swapBuffers(flipThisFrame)
 
         if self.useFBO and flipThisFrame:
@@ -1187,6 +1199,8 @@ class Window(object):
         # get timestamp
         self._frameTime = now = logging.defaultClock.getTime()
         self._frameTimes.append(self._frameTime)
+        if frameTiming is not None:
+            tFlipped = core.getTime()
 
         # run other functions immediately after flip completes
         for callEntry in self._toCall:
@@ -1223,6 +1237,9 @@ class Window(object):
                         obj=logEntry['obj'])
         del self._toLog[:]
 
+        if frameTiming is not None:
+            frameTiming._record(now, tSwap, tFlipped, core.getTime())
+
         # keep the system awake (prevent screen-saver or sleep)
         platform_specific.sendStayAwake()
 